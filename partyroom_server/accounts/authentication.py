@@ -0,0 +1,70 @@
+import binascii
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+from utils.utils import now
+
+
+def get_token_cache_key(digest: str) -> str:
+    return f'auth:token:{digest}'
+
+
+def get_token_cache():
+    return caches[settings.AUTH_TOKEN_CACHE['CACHE']]
+
+
+def invalidate_token_digests(digests: Iterable[str], using=None) -> None:
+    keys = [get_token_cache_key(digest) for digest in digests]
+    if not keys:
+        return
+    get_token_cache().delete_many(keys)
+    # again after commit, a concurrent request may have cached the old rows in between
+    transaction.on_commit(lambda: get_token_cache().delete_many(keys), using=using)
+
+
+def invalidate_user_tokens(user, using=None) -> None:
+    """drop the cached authentications of all the tokens of the user"""
+    digests = AuthToken.objects.using(using).filter(user=user).values_list('digest', flat=True)
+    invalidate_token_digests(list(digests), using)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """knox token authentication with the resolved user cached by token digest
+
+    A cached token skips the token and user queries. The entries are dropped
+    when the token is deleted (logout, expiry) or the user is saved (password
+    change, verification), and live for settings.AUTH_TOKEN_CACHE['TIMEOUT']
+    at most. With a cache per process, the other processes keep a revoked
+    token until the timeout.
+    """
+    def authenticate_credentials(self, token):
+        if knox_settings.AUTO_REFRESH:
+            # every request moves the expiry of the token
+            return super().authenticate_credentials(token)
+        try:
+            digest = hash_token(token.decode('utf-8'))
+        except (TypeError, binascii.Error, UnicodeDecodeError):
+            return super().authenticate_credentials(token)
+
+        cache = get_token_cache()
+        key = get_token_cache_key(digest)
+        cached = cache.get(key)
+        if cached is not None:
+            user, auth_token = cached
+            if auth_token.expiry is None or auth_token.expiry > now():
+                return user, auth_token
+
+        user, auth_token = super().authenticate_credentials(token)
+        timeout = settings.AUTH_TOKEN_CACHE['TIMEOUT']
+        if auth_token.expiry is not None:
+            timeout = min(timeout, (auth_token.expiry - now()).total_seconds())
+        if timeout > 0:
+            cache.set(key, (user, auth_token), timeout)
+        return user, auth_token
@@ -1,9 +1,17 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional, Tuple
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
 
-from .models import OTP, CustomUser
+from utils.utils import now
+
+from .models import OTP, CustomUser, OutboundEmail
+from .utils import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENT
 
 logger = logging.getLogger(__name__)
 
@@ -16,27 +24,112 @@ def get_email_subject(email_type: str):
         raise ValueError(f'unknown type {email_type=}')
     return subject
 
-def _send_email(subject, message, email):
-    email_from = settings.EMAIL_HOST
-    if 'example' not in email and 'email' not in email:
-        send_mail(subject, message, email_from, [email])
-    else:
-        logger.info(f'Not send to {email=}')
-    
+def enqueue_email(subject, message, email) -> Optional[OutboundEmail]:
+    """store the email for the send_queued_emails command instead of sending it in the request"""
+    if 'example' in email or 'email' in email:
+        logger.info('Not send to email=%r', email)
+        return None
+    from_email = settings.EMAIL_HOST_USER or settings.DEFAULT_FROM_EMAIL
+    return OutboundEmail.objects.create(subject=subject, message=message, from_email=from_email, to=email)
+
 def send_otp_via_email(email, email_type, otp_code):
     subject = get_email_subject(email_type)
     message = f'Your otp is {otp_code}'
-    
-    _send_email(subject, message, email)
+
+    enqueue_email(subject, message, email)
 
 
 def resend_otp_via_email(otp_obj: OTP):
-    
+
     email_type = otp_obj.otp_type
     email = otp_obj.user.email
     subject = get_email_subject(email_type)
-    
+
     message = f'Your otp is {otp_obj.otp_code}'
-    
-    _send_email(subject, message, email)
-    return otp_obj
\ No newline at end of file
+
+    enqueue_email(subject, message, email)
+    return otp_obj
+
+
+def claim_due_emails(batch_size: int) -> List[OutboundEmail]:
+    """take the pending emails that are due and lease them to this worker
+
+    The lease pushes next_attempt_at forward, so the other workers skip the
+    emails until they are sent or the worker dies.
+    """
+    lease_until = now() + timedelta(seconds=settings.OUTBOUND_EMAIL['LEASE'])
+    with transaction.atomic():
+        emails = list(OutboundEmail.objects.select_for_update(skip_locked=True)
+                      .filter(status=EMAIL_PENDING, next_attempt_at__lte=now())
+                      .order_by('next_attempt_at')[:batch_size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]) \
+            .update(next_attempt_at=lease_until, attempts=F('attempts') + 1)
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def send_emails(emails: List[OutboundEmail]) -> List[Tuple[OutboundEmail, Optional[str]]]:
+    """send the emails over one connection
+
+    Returns:
+        List[Tuple[OutboundEmail, Optional[str]]]: each email with its error, None if it was sent
+    """
+    results = []
+    connection = get_connection(settings.OUTBOUND_EMAIL['BACKEND'])
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                EmailMessage(email.subject, email.message, email.from_email, [email.to],
+                             connection=connection).send()
+                results.append((email, None))
+            except Exception as e:
+                logger.warning('failed to send email %s: %s', email.pk, e)
+                results.append((email, repr(e)))
+    except Exception as e:
+        # the connection could not be opened
+        logger.warning('failed to connect to the email backend: %s', e)
+        sent = {email.pk for email, _ in results}
+        results += [(email, repr(e)) for email in emails if email.pk not in sent]
+    finally:
+        connection.close()
+    return results
+
+
+def record_results(results: List[Tuple[OutboundEmail, Optional[str]]]) -> None:
+    sent_ids = [email.pk for email, error in results if error is None]
+    OutboundEmail.objects.filter(pk__in=sent_ids).update(status=EMAIL_SENT, sent_at=now(), last_error='')
+
+    options = settings.OUTBOUND_EMAIL
+    for email, error in results:
+        if error is None:
+            continue
+        if email.attempts >= options['MAX_ATTEMPTS']:
+            logger.error('giving up email %s after %d attempts', email.pk, email.attempts)
+            OutboundEmail.objects.filter(pk=email.pk).update(status=EMAIL_FAILED, last_error=error)
+        else:
+            # exponential backoff
+            retry_at = now() + timedelta(seconds=options['RETRY_DELAY'] * 2 ** (email.attempts - 1))
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=retry_at, last_error=error)
+
+
+def process_email_queue(batch_size: int, threads: int = 1) -> Tuple[int, int]:
+    """send one batch of due emails, each thread with its own connection
+
+    Returns:
+        Tuple[int, int]: number of sent and failed emails
+    """
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0, 0
+    if threads <= 1:
+        results = send_emails(emails)
+    else:
+        # the threads only talk to the email backend, the database is updated here
+        chunks = [emails[i::threads] for i in range(min(threads, len(emails)))]
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            results = [result for chunk_results in executor.map(send_emails, chunks) for result in chunk_results]
+    record_results(results)
+    failed = sum(1 for _, error in results if error is not None)
+    return len(results) - failed, failed
@@ -0,0 +1,28 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.otp import purge_otps
+
+
+class Command(BaseCommand):
+    help = 'Delete the OTPs that expired more than OTP_RETENTION seconds ago, once or periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true',
+                            help='keep purging every interval')
+        parser.add_argument('--interval', type=float, default=60 * 60,
+                            help='seconds between the purges')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            deleted = purge_otps(timedelta(seconds=settings.OTP_RETENTION), options['batch_size'])
+            self.stdout.write(f'Deleted {deleted} expired OTPs')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.emails import process_email_queue
+
+
+class Command(BaseCommand):
+    help = 'Send the queued outbound emails, once or in a loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--threads', type=int, default=1,
+                            help='number of connections to the email backend')
+        parser.add_argument('--loop', action='store_true',
+                            help='keep polling the queue')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sent, failed = process_email_queue(options['batch_size'], options['threads'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed')
+            if not options['loop']:
+                break
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
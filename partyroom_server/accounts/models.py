@@ -1,10 +1,12 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Exists, OuterRef
 from django.utils.translation import gettext_lazy as _
 from main.models import PartyRoom
 from phonenumber_field.modelfields import PhoneNumberField
 from shortuuidfield import ShortUUIDField
+from typing import Dict, Iterable
 
 from utils.utils import now
 
@@ -13,21 +15,11 @@ from .utils import *
 MAX_FAVOURITES = 1000
 
 
-def increment_user_id():
-    last_user = CustomUser.objects.all().order_by('id').last()
-    return 1 if not last_user else last_user.id + 1 
-
-def increment_OTP_id():
-    last_otp = OTP.objects.all().order_by('id').last()
-    return 100000 if not last_otp else last_otp.id + 1
-
-
 class CustomUser(AbstractUser):
     REQUIRED_FIELDS = ['phone_number', 'email']
-    id = models.PositiveIntegerField(
+    id = models.AutoField(
         primary_key=True,
         editable=False,
-        auto_created=True,
     )
     uid = ShortUUIDField(
         unique=True, 
@@ -58,15 +50,25 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        if not self.id:
-            self.id = increment_user_id()
-        super(CustomUser, self).save(force_insert=False, force_update=False, using=None,
-                                    update_fields=None)
+    def get_favourite_states(self, partyroom_uids: Iterable[str]) -> Dict[int, bool]:
+        """whether each partyroom is a favourite of the user, in one query
+
+        Args:
+            partyroom_uids (Iterable[str]): uids of the partyrooms
+
+        Returns:
+            Dict[int, bool]: partyroom id to favourite state, unknown uids are left out
+        """
+        favourite = self.favourites.through.objects.filter(customuser_id=self.pk, partyroom_id=OuterRef('pk'))
+        partyrooms = PartyRoom.objects.filter(uid__in=set(partyroom_uids)).annotate(is_favourite=Exists(favourite))
+        return dict(partyrooms.values_list('pk', 'is_favourite'))
 
 
 class OTP(models.Model):
-    id = models.PositiveIntegerField(
+    # the database assigns the id, starting from this value (see utils.db)
+    ID_START_OFFSET = 100000
+
+    id = models.AutoField(
         primary_key=True,
         editable=False,
     )
@@ -108,19 +110,64 @@ class OTP(models.Model):
         verbose_name='last request time',
         auto_now=True
     )
+
+    class Meta:
+        indexes = [
+            # expired otps for the purge_otps command
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
+
     @property
     def allow_resend(self):
-        return self.last_request - now() >  RESEND_SEPERATION_MIN
+        return now() - self.last_request > RESEND_SEPERATION_MIN
     
     @property
     def is_expired(self):
         return self.expires_at < now()
     
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        if not self.id:
-            self.id = increment_OTP_id()
-        super(OTP, self).save(force_insert=False, force_update=False, using=None,
-                                    update_fields=None)
-    
     def __str__(self):
         return f'{self.otp_code}_user={self.user}'
+
+
+class OutboundEmail(models.Model):
+    """an email waiting to be sent by the send_queued_emails command (see accounts/emails.py)
+    """
+    subject = models.CharField(
+        max_length=255,
+    )
+    message = models.TextField()
+    from_email = models.CharField(
+        max_length=255,
+    )
+    to = models.EmailField()
+    status = models.PositiveSmallIntegerField(
+        choices=EMAIL_STATUS_CHOICES,
+        default=EMAIL_PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+    )
+    # also pushed forward while a worker is sending it, so that other workers skip it
+    next_attempt_at = models.DateTimeField(
+        default=now,
+    )
+    last_error = models.TextField(
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        indexes = [
+            # pending emails that are due, oldest first
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='email_status_next_attempt_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject}_to={self.to}'
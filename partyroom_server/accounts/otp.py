@@ -0,0 +1,67 @@
+from datetime import timedelta
+from typing import Dict, Optional
+
+from error_code_list import *
+
+from utils.utils import now
+
+from .models import OTP
+from .utils import FAIL, UNUSED, USED
+
+
+def get_otp(context: Dict, uid: str) -> Optional[OTP]:
+    """the OTP with the uid, loaded once per serializer context
+
+    The uid field, the serializer validation and the view of a request share
+    the loaded OTP instead of querying it again.
+    """
+    otps = context.setdefault('otps', {})
+    if uid not in otps:
+        otps[uid] = OTP.objects.filter(uid=uid).first()
+    return otps[uid]
+
+
+def use_otp(otp: OTP, otp_code: str) -> Optional[str]:
+    """mark the unused OTP as used if the code is right and it hasn't expired
+
+    The status is changed by a conditional UPDATE, so that two concurrent
+    requests can't both use the same OTP.
+
+    Returns:
+        Optional[str]: the error code, None if the OTP is used now
+    """
+    current_time = now()
+    used = OTP.objects.filter(pk=otp.pk, status=UNUSED, otp_code=otp_code, expires_at__gte=current_time) \
+        .update(status=USED)
+    if used:
+        otp.status = USED
+        return None
+
+    # find out why, from the row as it is now
+    otp.refresh_from_db(fields=['status', 'otp_code', 'expires_at'])
+    if otp.otp_code != otp_code:
+        return OTP_INCORRECT_ERROR_CODE
+    if otp.expires_at < current_time:
+        OTP.objects.filter(pk=otp.pk, status=UNUSED).update(status=FAIL)
+        otp.status = FAIL
+        return OTP_EXPIRES_ERROR_CODE
+    if int(otp.status) == USED:
+        return OTP_ALREADY_USED_ERROR_CODE
+    # failed before and not requested again
+    return OTP_EXPIRES_ERROR_CODE
+
+
+def purge_otps(retention: timedelta, batch_size: int = 1000) -> int:
+    """delete the OTPs that expired more than retention ago, in batches
+
+    Returns:
+        int: number of deleted OTPs
+    """
+    expired = OTP.objects.filter(expires_at__lt=now() - retention)
+    deleted = 0
+    while True:
+        ids = list(expired.order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        # no relation points at the OTPs, this is a single DELETE
+        deleted += OTP.objects.filter(pk__in=ids).delete()[0]
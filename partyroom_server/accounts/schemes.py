@@ -11,6 +11,8 @@ from drf_spectacular.types import OpenApiTypes
 class KnoxTokenScheme(OpenApiAuthenticationExtension):
     # ref: https://github.com/tfranzel/drf-spectacular/issues/264
     target_class = 'knox.auth.TokenAuthentication'
+    # also accounts.authentication.CachedTokenAuthentication
+    match_subclasses = True
     name = 'knoxTokenAuth'
 
     def get_security_definition(self, auto_schema):        
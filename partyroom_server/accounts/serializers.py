@@ -5,13 +5,13 @@ from django.contrib.auth.password_validation import validate_password
 from drf_spectacular.utils import extend_schema_serializer
 from error_code_list import *
 from main.models import PartyRoom
-from main.serializers import PartyRoomSerializer
 from phonenumber_field.serializerfields import \
     PhoneNumberField as PPhoneNumberField
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from .models import OTP
+from .models import MAX_FAVOURITES, OTP
+from .otp import get_otp, use_otp
 from .utils import *
 
 logger = logging.getLogger(__name__)
@@ -52,7 +52,7 @@ class EmailCreateField(serializers.EmailField):
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
-    favourites = PartyRoomSerializer(read_only=True, many=True)
+    # the favourites are listed by UserFavouriteListView
     username = serializers.CharField(validators=[UniqueValidator(queryset=User.objects.all(),
                                                                  message=USER_NAME_EXIST_ERROR_CODE), ],
                                      error_messages={
@@ -71,7 +71,6 @@ class CustomUserSerializer(serializers.ModelSerializer):
             'email',
             'is_roomer',
             'is_verified',
-            'favourites',
             'icon_num',
         )
 
@@ -138,22 +137,15 @@ class RegisterErrorResponseSerializer(serializers.ModelSerializer):
         fields = ('status',)
 
 
-class UserfavouritesSerializer(serializers.ModelSerializer):
-    # a serializer for getting the user favourites
-    favourites = PartyRoomSerializer(read_only=True, many=True)
-
-    class Meta:
-        model = User
-        fields = ('favourites',)
-
-
 class UserfavouritesUpdateSerializer(serializers.ModelSerializer):
     # a serializer for updating the user favourites
     favourites = serializers.ListField(
         child=serializers.CharField(default='ABC'),
         required=True,
+        max_length=MAX_FAVOURITES,
         error_messages={
             "required": PARTY_ROOM_UID_DOES_NOT_INCLUDE_ERROR,
+            "max_length": PARTY_ROOM_TOO_MANY_UIDS_ERROR,
         }
     )
 
@@ -177,26 +169,25 @@ class UserfavouritesUpdateSerializer(serializers.ModelSerializer):
         if len(value) == 0:
             raise serializers.ValidationError(PARTY_ROOM_UID_FIELD_EMPTY_ERROR)
 
-        for partyroom_uid in value:
-            if not PartyRoom.objects.filter(uid=partyroom_uid).exists():
-                raise serializers.ValidationError(
-                    PARTY_ROOM_DOES_NOT_EXIST_ERROR)
+        # one query for all the uids, with whether each partyroom is already a favourite
+        user = self.context['request'].user
+        self.partyrooms = user.get_favourite_states(value)
+        if len(self.partyrooms) != len(set(value)):
+            raise serializers.ValidationError(
+                PARTY_ROOM_DOES_NOT_EXIST_ERROR)
         return value
 
+    def update(self, instance, validated_data):
+        Favourite = User.favourites.through
+        new_favourites = [Favourite(customuser_id=instance.pk, partyroom_id=partyroom_id)
+                          for partyroom_id, is_favourite in self.partyrooms.items() if not is_favourite]
+        # a concurrent request may have added the same favourite
+        Favourite.objects.bulk_create(new_favourites, ignore_conflicts=True)
+        return instance
 
-class UserfavouritesDeleteSerializer(serializers.ModelSerializer):
-    # a serializer for updating the user favourites
-    favourites = serializers.ListField(
-        child=serializers.CharField(default='ABC'),
-        required=True,
-        error_messages={
-            "required": PARTY_ROOM_UID_DOES_NOT_INCLUDE_ERROR,
-        }
-    )
 
-    class Meta:
-        model = User
-        fields = ('favourites',)
+class UserfavouritesDeleteSerializer(UserfavouritesUpdateSerializer):
+    # a serializer for removing partyrooms from the user favourites
 
     def validate_favourites(self, value):
         """check the partyroom uid in favourites list is exist
@@ -212,20 +203,17 @@ class UserfavouritesDeleteSerializer(serializers.ModelSerializer):
         Returns:
             List[str]: a validated list of partyroom uid
         """
-        if len(value) == 0:
-            raise serializers.ValidationError(PARTY_ROOM_UID_FIELD_EMPTY_ERROR)
-
-        user = self.context['request'].user
-
-        for partyroom_uid in value:
-            if not PartyRoom.objects.filter(uid=partyroom_uid).exists():
-                raise serializers.ValidationError(
-                    PARTY_ROOM_DOES_NOT_EXIST_ERROR)
-            elif not PartyRoom.objects.get(uid=partyroom_uid) in user.favourites.all():
-                raise serializers.ValidationError(
-                    PARTY_ROOM_UID_NOT_IN_USER_FAVOURITES_ERROR)
+        value = super().validate_favourites(value)
+        if not all(self.partyrooms.values()):
+            raise serializers.ValidationError(
+                PARTY_ROOM_UID_NOT_IN_USER_FAVOURITES_ERROR)
         return value
 
+    def update(self, instance, validated_data):
+        User.favourites.through.objects.filter(customuser_id=instance.pk,
+                                               partyroom_id__in=self.partyrooms).delete()
+        return instance
+
 
 class ChangePasswordSerializer(serializers.ModelSerializer):
     old_password = serializers.CharField(required=True,
@@ -290,8 +278,7 @@ class OTPUidField(serializers.CharField):
                               }
 
     def is_existing_otp_uid(self, value):
-        otp_objs = OTP.objects.filter(uid=value)
-        if not otp_objs.exists():
+        if get_otp(self.context, value) is None:
             raise serializers.ValidationError(self.error_messages['invalid'])
         return value
 
@@ -336,11 +323,11 @@ class OTPBaseSerializer(serializers.Serializer):
 
     def verifiy_otp(self, data):
         otp_code = data.get('otp_code')
-        otp_uid = data.get('otp_uid')
         otp_type = data.get('otp_type')
         fields = self.get_fields()
 
-        otp_obj = OTP.objects.get(uid=otp_uid)
+        # loaded by the otp_uid field
+        otp_obj = get_otp(self.context, data.get('otp_uid'))
 
         if otp_obj.otp_code != otp_code:
             fields['otp_code'].fail("invalid")
@@ -348,17 +335,9 @@ class OTPBaseSerializer(serializers.Serializer):
         if otp_obj.otp_type != otp_type:
             fields['otp_type'].fail('not_match')
 
-        if otp_obj.is_expired:
-            otp_obj.status = FAIL
-            otp_obj.save()
-            fields['otp_code'].fail('expired')
-        
-        if otp_obj.status == USED:
-            # OTP can only use once
-            raise serializers.ValidationError(OTP_ALREADY_USED_ERROR_CODE)
-
-        otp_obj.status = USED
-        otp_obj.save()
+        error_code = use_otp(otp_obj, otp_code)
+        if error_code is not None:
+            raise serializers.ValidationError(error_code)
         return data
 
     def validate(self, data):
@@ -372,10 +351,9 @@ class VerifyOTPBaseSerializer(OTPBaseSerializer):
 
     def validate(self, data):
         user = data.get('user')
-        otp_uid = data.get('otp_uid')
-        otp_obj = OTP.objects.get(uid=otp_uid)
+        otp_obj = get_otp(self.context, data.get('otp_uid'))
 
-        if otp_obj.user != user:
+        if otp_obj.user_id != user.pk:
             # should be the same user that create this otp
             raise serializers.ValidationError(NOT_USER_OWN_OTP_ERROR_CODE)
 
@@ -415,8 +393,8 @@ class ResendOTPSerializer(serializers.ModelSerializer):
     uid = serializers.CharField()  # uid field in model is read only
 
     def validate_uid(self, value):
-        otp_obj = OTP.objects.filter(uid=value)
-        if not otp_obj.exists():
+        otp_obj = get_otp(self.context, value)
+        if otp_obj is None:
             raise serializers.ValidationError(OTP_INEXIST_ERROR_CODE)
         elif otp_obj.otp_type == 'FP':
             # forgot password FP cannot resend
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from knox.models import AuthToken
+
+from .authentication import invalidate_token_digests, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, using, **kwargs):
+    invalidate_token_digests([instance.digest], using)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user_tokens(sender, instance, created, using, update_fields, **kwargs):
+    # the cached authentications hold the old user, e.g. its password or is_verified,
+    # the last_login saved by every login doesn't matter to them
+    if not created and update_fields != {'last_login'}:
+        invalidate_user_tokens(instance, using)
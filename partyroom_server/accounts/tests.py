@@ -1,18 +1,32 @@
 import json
 from datetime import timedelta
+from io import StringIO
 from logging import getLogger
 
+from django.contrib.auth.models import update_last_login
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from error_code_list import *
+from knox.models import AuthToken
 from main.models import PartyRoom
-from main.serializers import PartyRoomSerializer
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
+from utils.testing import QueryBudgetTestMixin, Seeder
+from utils.throttling import get_buckets, take_token
 
 from utils.utils import now
 
-from .models import OTP, CustomUser
+from .emails import enqueue_email, process_email_queue
+from .models import OTP, CustomUser, OutboundEmail
+from .otp import purge_otps
+from .utils import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENT, FAIL, UNUSED, USED
 from .serializers import CustomUserSerializer
 
 logger = getLogger('account_test')
@@ -219,12 +233,12 @@ class UserFavoritesTests(APITestCase):
         self.assertEqual(response.data, {'status': 'Success'})
         
         # check getting favourite from user        
-        serialized_partyroom1_data = PartyRoomSerializer(instance=self.partyroom1).data
-        serialized_partyroom2_data = PartyRoomSerializer(instance=self.partyroom2).data
         response = self.client.get(self.url)
                                      
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, {'favourites': [serialized_partyroom1_data, serialized_partyroom2_data]})
+        self.assertEqual([partyroom['uid'] for partyroom in response.data['results']],
+                         [self.partyroom1.uid, self.partyroom2.uid])
+        self.assertEqual(set(response.data['results'][0]), {'uid', 'name', 'district', 'rating', 'image_cover_url'})
 
         # check delete favourite from user
         data = {'favourites': [self.partyroom1.uid]}
@@ -233,7 +247,7 @@ class UserFavoritesTests(APITestCase):
         
         # check it is correctly deleted
         response = self.client.get(self.url)
-        self.assertEqual(response.data, {'favourites': [serialized_partyroom2_data]})
+        self.assertEqual([partyroom['uid'] for partyroom in response.data['results']], [self.partyroom2.uid])
     
     def test_user_favourite_error(self):
         data = {'favourites': [self.partyroom1.uid]}
@@ -254,6 +268,89 @@ class UserFavoritesTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class UserFavouritesBulkTests(APITestCase):
+    url = reverse('user_favourite')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer_tester3',
+                                              password='password123',
+                                              phone_number='+85291234561',
+                                              email='user@example.com',
+                                              is_verified=True)
+        PartyRoom.objects.bulk_create([PartyRoom(owner=self.user, name=f'room_{i}', uid=f'{i:03d}')
+                                       for i in range(500)])
+        self.uids = list(PartyRoom.objects.order_by('pk').values_list('uid', flat=True))
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_favourites(self):
+        self.user.favourites.add(PartyRoom.objects.get(uid=self.uids[0]))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(self.url, {'favourites': self.uids}, format='json')
+        self.assertEqual(response.data, {'status': 'Success'})
+        # one validation query and the inserts, not a query per uid
+        self.assertLessEqual(len(context.captured_queries), 5)
+        self.assertEqual(self.user.favourites.count(), 500)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(self.url, {'favourites': self.uids[:300]}, format='json')
+        self.assertEqual(response.data, {'status': 'Success'})
+        self.assertLessEqual(len(context.captured_queries), 3)
+        self.assertEqual(set(self.user.favourites.values_list('uid', flat=True)), set(self.uids[300:]))
+
+    def test_bulk_favourites_errors(self):
+        response = self.client.put(self.url, {'favourites': [self.uids[0], 'ABCD']}, format='json')
+        self.assertEqual(response.data, {'error_code_list': [PARTY_ROOM_DOES_NOT_EXIST_ERROR]})
+        self.assertEqual(self.user.favourites.count(), 0)
+
+        self.client.put(self.url, {'favourites': [self.uids[0]]}, format='json')
+        response = self.client.delete(self.url, {'favourites': [self.uids[0], self.uids[1]]}, format='json')
+        self.assertEqual(response.data, {'error_code_list': [PARTY_ROOM_UID_NOT_IN_USER_FAVOURITES_ERROR]})
+        self.assertEqual(self.user.favourites.count(), 1)
+
+        response = self.client.put(self.url, {'favourites': ['ABC'] * 1001}, format='json')
+        self.assertEqual(response.data, {'error_code_list': [PARTY_ROOM_TOO_MANY_UIDS_ERROR]})
+
+
+class UserFavouriteListTests(APITestCase):
+    url = reverse('user_favourite_list')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer_tester3',
+                                              password='password123',
+                                              phone_number='+85291234561',
+                                              email='user@example.com',
+                                              is_verified=True)
+        PartyRoom.objects.bulk_create([PartyRoom(owner=self.user, name=f'room_{i}', uid=f'{i:03d}', district='YL')
+                                       for i in range(15)])
+        self.user.favourites.set(PartyRoom.objects.all())
+        PartyRoom.objects.filter(uid='000').update(rating_sum=9, rating_count=2)
+        self.client.force_authenticate(self.user)
+
+    def test_favourite_list(self):
+        # the favourites of the retrieve action are the same pages
+        for url in (self.url, reverse('user_favourite')):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(context.captured_queries), 1)
+                self.assertEqual(len(response.data['results']), 10)
+                partyroom_data = response.data['results'][0]
+                self.assertEqual(set(partyroom_data), {'uid', 'name', 'district', 'rating', 'image_cover_url'})
+                self.assertEqual((partyroom_data['uid'], partyroom_data['district'], partyroom_data['rating']),
+                                 ('000', 'Yuen Long', 4.5))
+                self.assertEqual(response.data['results'][1]['rating'], 0)
+
+                response = self.client.get(response.data['next'])
+                self.assertEqual(len(response.data['results']), 5)
+                self.assertIsNone(response.data['next'])
+
+    def test_user_detail_without_favourites(self):
+        response = self.client.get(reverse('user_detail'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('favourites', response.data)
+
+
 class OTPtests(APITestCase):
     data = {'username': 'some_user',
             'password': 'password123',
@@ -306,12 +403,334 @@ class OTPtests(APITestCase):
         response = self.client.post(self.verify_url, data=data, format='json')
         self.assertEqual(response.data, {'error_code_list': [OTP_EXPIRES_ERROR_CODE]})  
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        
 
-        
-        
-         
-                        
-    
 
+class OTPIdTests(APITestCase):
+    def test_otp_id_start_offset(self):
+        user = CustomUser.objects.create(username='some_user',
+                                         password='password123',
+                                         phone_number='+85291234566',
+                                         email='user3@example.com')
+        otps = [OTP.objects.create(user=user, otp_type=otp_type) for otp_type in ('VE', 'VI')]
+        self.assertEqual([otp.id for otp in otps], [100000, 100001])
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('smtp server is down')
+
+
+class OutboundEmailQueueTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='some_user',
+                                              password='password123',
+                                              phone_number='+85291234566',
+                                              email='user3@test.com')
+
+    def test_request_otp_enqueues_email(self):
+        data = {'user': {'email': self.user.email}, 'otp_type': 'VI'}
+        response = self.client.post(reverse('otp-requests_otp'), data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # nothing is sent in the request
+        self.assertEqual(len(mail.outbox), 0)
+
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, self.user.email)
+        self.assertEqual(email.status, EMAIL_PENDING)
+        otp = OTP.objects.get(user=self.user)
+        self.assertIn(otp.otp_code, email.message)
+
+    def test_process_email_queue(self):
+        for i in range(3):
+            enqueue_email('subject', f'message {i}', f'user{i}@test.com')
+
+        self.assertEqual(process_email_queue(10), (3, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['user0@test.com', 'user1@test.com', 'user2@test.com'])
+        self.assertFalse(OutboundEmail.objects.exclude(status=EMAIL_SENT).exists())
+        # sent emails are not sent again
+        self.assertEqual(process_email_queue(10), (0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_process_email_queue_with_threads(self):
+        for i in range(5):
+            enqueue_email('subject', f'message {i}', f'user{i}@test.com')
+
+        self.assertEqual(process_email_queue(10, threads=3), (5, 0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(OutboundEmail.objects.filter(status=EMAIL_SENT).count(), 5)
+
+    def test_skip_example_email(self):
+        self.assertIsNone(enqueue_email('subject', 'message', 'user@example.com'))
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    @override_settings(OUTBOUND_EMAIL={'BACKEND': 'accounts.tests.FailingEmailBackend', 'MAX_ATTEMPTS': 2,
+                                       'RETRY_DELAY': 60, 'LEASE': 300})
+    def test_failed_email_retries_with_backoff(self):
+        email = enqueue_email('subject', 'message', 'user@test.com')
+
+        self.assertEqual(process_email_queue(10), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('smtp server is down', email.last_error)
+        self.assertGreater(email.next_attempt_at, now() + timedelta(seconds=50))
+        # not due yet
+        self.assertEqual(process_email_queue(10), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=now())
+        self.assertEqual(process_email_queue(10), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_FAILED)
+        self.assertEqual(email.attempts, 2)
+
+
+class UserFavouriteQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        self.seeder = Seeder()
+        self.user = self.seeder.create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_user_favourite(self):
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('user_favourite')),
+                               lambda count: self.seeder.favourites(self.user, count))
+
+    def test_user_favourite_list(self):
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('user_favourite_list')),
+                               lambda count: self.seeder.favourites(self.user, count))
+
+
+class OTPStoreTests(APITestCase):
+    requests_url = reverse('otp-requests_otp')
+    verify_url = reverse('otp-verify_otp')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='some_user',
+                                              password='password123',
+                                              phone_number='+85291234566',
+                                              email='user3@test.com')
+        self.otp = OTP.objects.create(user=self.user, otp_type='VE')
+
+    def verify(self, otp_code=None):
+        data = {'user': {'email': self.user.email}, 'otp_type': 'VE',
+                'otp_uid': self.otp.uid, 'otp_code': otp_code or self.otp.otp_code}
+        return self.client.post(self.verify_url, data=data, format='json')
+
+    def test_verify_loads_otp_once(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.verify()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('SELECT') and 'accounts_otp' in query['sql']]), 1)
+        self.otp.refresh_from_db()
+        self.assertEqual(int(self.otp.status), USED)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+
+    def test_otp_used_once(self):
+        self.assertEqual(self.verify().status_code, status.HTTP_200_OK)
+        response = self.verify()
+        self.assertEqual(response.data, {'error_code_list': [OTP_ALREADY_USED_ERROR_CODE]})
+
+    def test_wrong_code_does_not_use_otp(self):
+        wrong_code = '000000' if self.otp.otp_code != '000000' else '111111'
+        response = self.verify(wrong_code)
+        self.assertEqual(response.data, {'error_code_list': [OTP_INCORRECT_ERROR_CODE]})
+        self.otp.refresh_from_db()
+        self.assertEqual(int(self.otp.status), UNUSED)
+
+    def test_expired_otp_fails(self):
+        OTP.objects.filter(pk=self.otp.pk).update(expires_at=now() - timedelta(minutes=1))
+        response = self.verify()
+        self.assertEqual(response.data, {'error_code_list': [OTP_EXPIRES_ERROR_CODE]})
+        self.otp.refresh_from_db()
+        self.assertEqual(int(self.otp.status), FAIL)
+
+    def test_request_again_after_use(self):
+        self.user.is_verified = True
+        self.user.save()
+        otp = OTP.objects.create(user=self.user, otp_type='VI', status=USED)
+        response = self.client.post(self.requests_url, data={'user': {'email': self.user.email}, 'otp_type': 'VI'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        otp.refresh_from_db()
+        self.assertEqual(int(otp.status), UNUSED)
+
+    def test_resend_separation(self):
+        resend_url = reverse('otp-resend_otp')
+        response = self.client.post(resend_url, data={'uid': self.otp.uid}, format='json')
+        self.assertEqual(response.data, {'error_code_list': [OTP_REQUEST_TOO_FREQUENT_ERROR_CODE]})
+        OTP.objects.filter(pk=self.otp.pk).update(last_request=now() - timedelta(minutes=6))
+        response = self.client.post(resend_url, data={'uid': self.otp.uid}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_purge_otps(self):
+        retention = timedelta(days=1)
+        OTP.objects.filter(pk=self.otp.pk).update(expires_at=now() - timedelta(days=2))
+        other_user = CustomUser.objects.create(username='other_user', password='password123',
+                                               phone_number='+85291234567', email='user4@test.com')
+        recent = OTP.objects.create(user=other_user, otp_type='VE', expires_at=now() - timedelta(hours=1))
+
+        self.assertEqual(purge_otps(retention, batch_size=1), 1)
+        self.assertEqual(list(OTP.objects.all()), [recent])
+
+    def test_purge_otps_command(self):
+        OTP.objects.filter(pk=self.otp.pk).update(expires_at=now() - timedelta(days=2))
+        out = StringIO()
+        call_command('purge_otps', stdout=out)
+        self.assertIn('Deleted 1 expired OTPs', out.getvalue())
+        self.assertFalse(OTP.objects.exists())
+
+
+class RateLimitTests(APITestCase):
+    login_url = reverse('knox_login')
+    requests_url = reverse('otp-requests_otp')
+
+    def setUp(self):
+        # a new setting starts with new buckets
+        settings_override = override_settings(RATE_LIMITS={
+            'SHARED_CACHE': None, 'MAX_ENTRIES': 100,
+            'RATES': {'login': {'ip': '5/min', 'credential': '2/min'}, 'otp': {'credential': '2/hour'}}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def login(self, username, remote_addr='127.0.0.1'):
+        return self.client.post(self.login_url, {'username': username, 'password': 'wrong_password'},
+                                format='json', REMOTE_ADDR=remote_addr)
+
+    def test_take_token(self):
+        bucket, wait = take_token(None, 2, 60, 1000)
+        self.assertEqual((bucket, wait), ((1, 1000), 0))
+        bucket, wait = take_token(bucket, 2, 60, 1000)
+        self.assertEqual(wait, 0)
+        bucket, wait = take_token(bucket, 2, 60, 1000)
+        self.assertEqual(wait, 30)
+        # refilled one token per 30 seconds
+        bucket, wait = take_token(bucket, 2, 60, 1015)
+        self.assertEqual(wait, 15)
+        self.assertEqual(take_token(bucket, 2, 60, 1030)[1], 0)
+
+    def test_login_throttled_by_credential(self):
+        for _ in range(2):
+            self.assertNotEqual(self.login('Some_User').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.login('some_user ')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data, {'error_code_list': [REQUEST_THROTTLED_ERROR_CODE]})
+        self.assertEqual(response['Retry-After'], '30')
+        # other accounts are not limited
+        self.assertNotEqual(self.login('other_user').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_throttled_by_ip(self):
+        for index in range(5):
+            self.assertNotEqual(self.login(f'user_{index}').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('user_5').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotEqual(self.login('user_5', remote_addr='10.0.0.1').status_code,
+                            status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_otp_throttled_without_database(self):
+        data = {'user': {'email': 'nobody@test.com'}, 'otp_type': 'VE'}
+        for _ in range(2):
+            self.client.post(self.requests_url, data, format='json')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.requests_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                               'rate_limits': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                               'LOCATION': 'rate_limits'}},
+                       RATE_LIMITS={'SHARED_CACHE': 'rate_limits', 'MAX_ENTRIES': 100,
+                                    'RATES': {'login': {'credential': '1/min'}}})
+    def test_shared_cache(self):
+        self.assertNotEqual(self.login('some_user').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('some_user').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_clear(self):
+        for backend in ('local', 'shared'):
+            with self.subTest(backend=backend), \
+                    override_settings(RATE_LIMITS={'SHARED_CACHE': 'default' if backend == 'shared' else None,
+                                                   'MAX_ENTRIES': 100, 'RATES': {}}):
+                buckets = get_buckets()
+                self.assertEqual(buckets.take('some_key', 1, 60), 0)
+                self.assertGreater(buckets.take('some_key', 1, 60), 0)
+                buckets.clear()
+                self.assertEqual(buckets.take('some_key', 1, 60), 0)
+
+
+class AuthTokenCacheTests(APITestCase):
+    detail_url = reverse('user_detail')
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='some_user',
+                                              phone_number='+85291234568',
+                                              email='user5@test.com',
+                                              is_verified=True)
+        self.user.set_password('password123')
+        self.user.save()
+        self.token = self.authenticate()
+
+    def authenticate(self):
+        _, token = AuthToken.objects.create(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return token
+
+    def get_auth_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in context.captured_queries if 'knox_authtoken' in query['sql']]
+
+    def test_cached_authentication(self):
+        self.assertTrue(self.get_auth_queries())
+        self.assertEqual(self.get_auth_queries(), [])
+
+    def test_logout(self):
+        self.get_auth_queries()
+        self.assertEqual(self.client.post(reverse('knox_logout')).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_all(self):
+        old_token = self.token
+        self.get_auth_queries()
+        self.authenticate()
+        self.assertEqual(self.client.post(reverse('knox_logoutall')).status_code, status.HTTP_204_NO_CONTENT)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {old_token}')
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_password(self):
+        self.get_auth_queries()
+        response = self.client.put(reverse('user_change_password'),
+                                   {'old_password': 'password123', 'new_password': 'password456'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_200_OK)
+
+    def test_forgot_password(self):
+        self.get_auth_queries()
+        response = self.client.post(reverse('otp-requests_otp'),
+                                    {'user': {'email': self.user.email}, 'otp_type': 'VI'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        otp = OTP.objects.get(user=self.user, otp_type='VI')
+        response = self.client.post(reverse('otp-verify_otp'),
+                                    {'user': {'email': self.user.email}, 'otp_type': 'VI',
+                                     'otp_uid': otp.uid, 'otp_code': otp.otp_code}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('-forgot_password'),
+                                    {'user': {'email': self.user.email}, 'otp_type': 'FP',
+                                     'otp_uid': response.data['otp_uid'], 'otp_code': response.data['otp_code'],
+                                     'new_password': 'password456'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_keeps_cache(self):
+        self.get_auth_queries()
+        update_last_login(None, self.user)
+        self.assertEqual(self.get_auth_queries(), [])
 
+    def test_user_saved(self):
+        self.get_auth_queries()
+        self.user.is_verified = False
+        self.user.save()
+        self.assertTrue(self.get_auth_queries())
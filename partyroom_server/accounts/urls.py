@@ -14,6 +14,7 @@ urlpatterns = [
     path('register/', views.CustomUserCreateView.as_view({'post': 'create'}), name='user_register'),
     path('user/', views.CustomUserDetailView.as_view(), name='user_detail'),
     path('favourite/', views.UserfavouriteView.as_view({'get': 'retrieve', 'put': 'put', 'delete': 'destroy'}), name='user_favourite'),
+    path('favourites/', views.UserFavouriteListView.as_view(), name='user_favourite_list'),
     path('change_password/', views.CustomUserChangePasswordView.as_view(), name='user_change_password'),
     path('login/', views.LoginView.as_view(), name='knox_login'),
     path('logout/', knox_views.LogoutView.as_view(), name='knox_logout'),
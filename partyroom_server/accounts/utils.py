@@ -19,6 +19,16 @@ OTP_STATUS_CHOICES = (
     (FAIL, 'Fail'),
 )
 
+EMAIL_PENDING = 1
+EMAIL_SENT = 2
+EMAIL_FAILED = 3
+
+EMAIL_STATUS_CHOICES = (
+    (EMAIL_PENDING, 'Pending'),
+    (EMAIL_SENT, 'Sent'),
+    (EMAIL_FAILED, 'Failed'),
+)
+
 RESEND_SEPERATION_MIN = timedelta(minutes=5)
 class OTPExistError(Exception):
     """OTP with same type and user exists in db (requests otp should only call once)
@@ -27,10 +37,11 @@ class OTPExistError(Exception):
 
 
 def update_otp(otp_obj) -> None:
-    """update expires time and otp code
+    """update expires time and otp code, the new code can be used again
     """
     otp_obj.expires_at = compute_expires_time()
     otp_obj.otp_code = generate_otp_code()
+    otp_obj.status = UNUSED
     otp_obj.save()
 
 def compute_expires_time():
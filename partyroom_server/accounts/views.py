@@ -2,12 +2,15 @@ import logging
 from typing import List
 
 from django.contrib.auth import get_user_model, login
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from error_code_list import *
 from knox.auth import AuthToken
 from knox.views import LoginView as KnoxLoginView
 from main.models import PartyRoom
+from main.serializers import PartyRoomCompactSerializer
 from rest_framework import mixins, status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.serializers import AuthTokenSerializer
@@ -22,10 +25,14 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
+from utils.metrics import SerializerMetricsMixin
+from utils.pagination import PartyRoomKeysetPagination
 from utils.permissions import *
+from utils.throttling import CredentialRateThrottle, IPRateThrottle
 
 from .constants import *
 from .emails import resend_otp_via_email, send_otp_via_email
+from .otp import get_otp
 from .serializers import *
 from .utils import update_otp
 
@@ -34,14 +41,13 @@ logger = logging.getLogger(__name__)
 
 
 def generate_otp(user, otp_type) -> OTP:
-    otp = OTP.objects.filter(user=user, otp_type=otp_type)
-    if otp.exists():
-        old_otp = otp[0]
+    old_otp = OTP.objects.filter(user=user, otp_type=otp_type).first()
+    if old_otp is not None:
         if otp_type == 'FP':
             update_otp(old_otp)
             return old_otp
 
-        elif old_otp.is_expired or old_otp.status == USED or old_otp.status == FAIL:
+        elif old_otp.is_expired or int(old_otp.status) in (USED, FAIL):
             # allow user to request again when the old otp is not valid
             update_otp(old_otp)
             return old_otp
@@ -86,14 +92,25 @@ class CustomUserDetailView(RetrieveUpdateAPIView):
         return self.request.user
 
 
-class UserfavouriteView(GenericViewSet,
-                        mixins.RetrieveModelMixin):
+def get_favourite_partyrooms(user):
+    """the favourites of the user with only the fields of PartyRoomCompactSerializer"""
+    # the rating is computed in the same query
+    rating = Case(When(rating_count=0, then=Value(0.0)),
+                  default=Cast('rating_sum', FloatField()) / F('rating_count'),
+                  output_field=FloatField())
+    return PartyRoom.objects.filter(customuser=user) \
+        .only('uid', 'name', 'district') \
+        .annotate(rating=rating)
+
+
+class UserfavouriteView(GenericViewSet):
     queryset = User.objects.all()
     permission_classes = (IsAuthenticated, IsOwnerOrStaff, IsVerifiedUser,)
+    pagination_class = PartyRoomKeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
-            return UserfavouritesSerializer
+            return PartyRoomCompactSerializer
         elif self.action == 'put':
             return UserfavouritesUpdateSerializer
         elif self.action == 'destroy':
@@ -103,11 +120,17 @@ class UserfavouriteView(GenericViewSet,
         obj = self.request.user
         return obj
 
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        # the same pages as UserFavouriteListView, a user may have many favourites
+        page = self.paginate_queryset(get_favourite_partyrooms(request.user))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def put(self, request, *args, **kwargs):
         return self.update(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs) -> Response:
-        """add each uid in the favourites list to the request.user favourites
+        """add the uids in the favourites list to the request.user favourites
 
         Args:
             request: request from a login user, and a uid list
@@ -116,13 +139,10 @@ class UserfavouriteView(GenericViewSet,
             Response: either HTTP_200_OK with status Sucessful
             or HTTP_400_BAD_REQUEST with error_code_list
         """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data)
-        serializer.is_valid(raise_exception=True)
-        return self.action_to_each_favourite(request, request.user.favourites.add)
+        return self.update_favourites(request)
 
     def destroy(self, request, *args, **kwargs) -> Response:
-        """delete each uid in the favourites list to the request.user favourites
+        """delete the uids in the favourites list from the request.user favourites
 
         Args:
             request: request from a login user, and a uid list
@@ -131,27 +151,26 @@ class UserfavouriteView(GenericViewSet,
             Response: either HTTP_200_OK with status Sucessful
             or HTTP_400_BAD_REQUEST with error_code_list
         """
+        return self.update_favourites(request)
+
+    def update_favourites(self, request) -> Response:
+        # the serializer validates all the uids with one query and saves them with one bulk query
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data)
         serializer.is_valid(raise_exception=True)
-        return self.action_to_each_favourite(request, request.user.favourites.remove)
+        serializer.save()
+        return Response({'status': 'Success'}, status=status.HTTP_200_OK)
 
-    def action_to_each_favourite(self, request, action) -> Response:
-        """loop through the favourites list and perform the given action
 
-        Args:
-            request: request from a login user, and a uid list
-            method (function): a function that either add or remove the favourite from the user
-
-        Returns:
-            Response: either HTTP_200_OK with status Sucessful
-            or HTTP_400_BAD_REQUEST with error_code_list
-        """
-        for partyroom_uid in request.data['favourites']:
-            partyroom = PartyRoom.objects.get(uid=partyroom_uid)
-            action(partyroom)
+class UserFavouriteListView(SerializerMetricsMixin, ListAPIView):
+    """pages of the user favourites with only the fields of a list item
+    """
+    serializer_class = PartyRoomCompactSerializer
+    permission_classes = (IsAuthenticated, SafelistPermission, IsVerifiedUser,)
+    pagination_class = PartyRoomKeysetPagination
 
-        return Response({'status': 'Success'}, status=status.HTTP_200_OK)
+    def get_queryset(self):
+        return get_favourite_partyrooms(self.request.user)
 
 
 class CustomUserChangePasswordView(UpdateAPIView):
@@ -166,19 +185,22 @@ class CustomUserChangePasswordView(UpdateAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        if hasattr(user, 'auth_token'):
-            logger.debug('has token')
-            user.auth_token.delete()
-        token, created = AuthToken.objects.get_or_create(user=user)
+        # log out the other sessions, deleting the tokens drops them from the authentication cache
+        user.auth_token_set.all().delete()
+        _, token = AuthToken.objects.create(user)
 
-        return Response({'token': token.key, 'status': 'Success'}, status=status.HTTP_200_OK)
+        return Response({'token': token, 'status': 'Success'}, status=status.HTTP_200_OK)
 
 
 class LoginView(KnoxLoginView):
     permission_classes = (AllowAny,)
     serializer_class = AuthTokenSerializer
+    # bursts are rejected before hashing the password
+    throttle_classes = (IPRateThrottle, CredentialRateThrottle)
+    throttle_scope = 'login'
+    throttle_credential = 'username'
     
-    def login(self, request, format=None):
+    def post(self, request, format=None):
         serializer = AuthTokenSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
@@ -189,6 +211,9 @@ class LoginView(KnoxLoginView):
 class AccountOTPView(GenericViewSet):
     queryset = OTP.objects.all()
     authentication_classes = ()
+    throttle_classes = (IPRateThrottle, CredentialRateThrottle)
+    throttle_scope = 'otp'
+    throttle_credential = 'user.email'
 
     def get_serializer_class(self):
         if self.action == 'verify':
@@ -203,7 +228,8 @@ class AccountOTPView(GenericViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        otp_obj = OTP.objects.get(uid=serializer.data['uid'])
+        # loaded by the validation
+        otp_obj = get_otp(serializer.context, serializer.validated_data['uid'])
 
         if not otp_obj.allow_resend:
             return Response({'error_code_list': [OTP_REQUEST_TOO_FREQUENT_ERROR_CODE]})
@@ -265,8 +291,7 @@ class UserForgotPasswordView(GenericViewSet):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        if hasattr(user, 'auth_token'):
-            user.auth_token.delete()
+        user.auth_token_set.all().delete()
 
         return Response({'status': 'Success'}, status=status.HTTP_200_OK)
 
@@ -0,0 +1,176 @@
+import itertools
+import random
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from typing import Dict, List
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from django.core.management import call_command
+from django.db import transaction
+from knox.models import AuthToken
+from main.models import PartyRoom
+from main.uids import allocate_partyroom_uids
+from main.utils import DISTRICT_CHOICES
+from PIL import Image
+from reviews.models import PartyRoomReview
+
+from utils.utils import utc8
+
+# area of each district in DISTRICT_CHOICES
+DISTRICT_AREAS = {
+    'CW': 'HKI', 'WC': 'HKI', 'E': 'HKI', 'S': 'HKI',
+    'YTM': 'KWN', 'SSP': 'KWN', 'KC': 'KWN', 'WTS': 'KWN', 'KT': 'KWN',
+}
+BOARDGAMES = ['Catan', 'Carcassonne', 'Codenames', 'Avalon', 'Dixit', 'Splendor', 'Uno', 'Jenga']
+FACILITIES = ['Karaoke', 'Switch', 'PS5', 'Mahjong', 'Projector', 'BBQ', 'Darts', 'Pool table']
+# the generated bookings are in the past, the benchmark reserves in the future
+BOOKINGS_END = datetime(2022, 1, 1, tzinfo=utc8)
+BATCH_SIZE = 5000
+COVER_VARIANTS = 16
+
+
+def create_users(count: int) -> List[CustomUser]:
+    users = [CustomUser(username=f'bench_user_{i}',
+                        phone_number=f'+8526{i:07d}',
+                        email=f'bench_user_{i}@test.com',
+                        is_verified=True,
+                        is_roomer=i == 0) for i in range(count)]
+    for user in users:
+        user.set_unusable_password()
+    CustomUser.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    return list(CustomUser.objects.filter(username__startswith='bench_user_').order_by('id'))
+
+
+def create_partyrooms(owner: CustomUser, count: int, rng: random.Random) -> List[PartyRoom]:
+    partyrooms = []
+    for i, uid in enumerate(allocate_partyroom_uids(count)):
+        district = DISTRICT_CHOICES[i % len(DISTRICT_CHOICES)][0]
+        min_users = rng.randint(1, 10)
+        partyrooms.append(PartyRoom(owner=owner,
+                                    uid=uid,
+                                    name=f'Party room {i}',
+                                    district=district,
+                                    area=DISTRICT_AREAS.get(district, 'NT'),
+                                    minNumUsers=min_users,
+                                    maxNumUsers=min_users + rng.randint(0, 30),
+                                    shortDesp=f'{rng.choice(FACILITIES)} and boardgames',
+                                    description=' '.join(rng.sample(FACILITIES, 4)),
+                                    venueFaciList=rng.sample(FACILITIES, 3),
+                                    boardgameList=rng.sample(BOARDGAMES, 4)))
+    PartyRoom.objects.bulk_create(partyrooms, batch_size=BATCH_SIZE)
+    return list(PartyRoom.objects.order_by('id'))
+
+
+def create_bookings(users: List[CustomUser], partyrooms: List[PartyRoom], count: int, rng: random.Random) -> int:
+    """back to back bookings of 2 hours in each partyroom, ending at BOOKINGS_END"""
+    per_partyroom = -(-count // len(partyrooms))
+    created = 0
+    while created < count:
+        batch = []
+        for i in range(created, min(created + BATCH_SIZE, count)):
+            partyroom = partyrooms[i // per_partyroom]
+            start_time = BOOKINGS_END - timedelta(hours=2 * (i % per_partyroom + 1))
+            batch.append(Booking(partyroom=partyroom,
+                                 user=rng.choice(users),
+                                 start_time=start_time,
+                                 end_time=start_time + timedelta(hours=2) - timedelta(minutes=partyroom.transitionTime),
+                                 status='confirm',
+                                 num_users=partyroom.minNumUsers,
+                                 unit_price=100,
+                                 total_price=200))
+        Booking.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def create_reviews(count: int, rng: random.Random) -> int:
+    """review the first bookings, by the user who booked"""
+    created = 0
+    bookings = Booking.objects.order_by('id').values_list('id', 'partyroom_id', 'user_id')[:count].iterator()
+    while True:
+        batch = [PartyRoomReview(booking_id=booking_id,
+                                 partyroom_id=partyroom_id,
+                                 reviewer_id=user_id,
+                                 rating=rng.randint(1, 5),
+                                 comments=rng.choice(['Great place', 'Clean and big', 'Too noisy', '']),
+                                 recommend=rng.random() < 0.8)
+                 for booking_id, partyroom_id, user_id in itertools.islice(bookings, BATCH_SIZE)]
+        if not batch:
+            return created
+        # bulk_create skips the rating aggregate, rebuild_partyroom_rating fixes it afterwards
+        PartyRoomReview.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def create_favourites(users: List[CustomUser], partyrooms: List[PartyRoom], per_user: int, rng: random.Random) -> int:
+    through = CustomUser.favourites.through
+    favourites = [through(customuser_id=user.id, partyroom_id=partyroom.id)
+                  for user in users for partyroom in rng.sample(partyrooms, min(per_user, len(partyrooms)))]
+    through.objects.bulk_create(favourites, batch_size=BATCH_SIZE)
+    return len(favourites)
+
+
+def create_covers(partyrooms: List[PartyRoom], image_dir: Path, rng: random.Random) -> int:
+    """write a 1280x960 jpeg cover of every partyroom, copied from a few generated images"""
+    image_dir.mkdir(parents=True, exist_ok=True)
+    variants = []
+    for _ in range(COVER_VARIANTS):
+        image = Image.new('RGB', (1280, 960), tuple(rng.randrange(256) for _ in range(3)))
+        for _ in range(40):
+            x, y = rng.randrange(1280), rng.randrange(960)
+            image.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + rng.randrange(50, 400), y + rng.randrange(50, 300)))
+        data = BytesIO()
+        image.save(data, 'JPEG', quality=85)
+        variants.append(data.getvalue())
+    for partyroom in partyrooms:
+        (image_dir / f'{partyroom.uid}.jpg').write_bytes(rng.choice(variants))
+    return len(partyrooms)
+
+
+def generate_dataset(rooms: int, users: int, bookings: int, reviews: int, favourites: int,
+                     image_dir: Path, seed: int = 0) -> Dict[str, int]:
+    """fill an empty database with a reproducible dataset
+
+    Args:
+        rooms (int): number of partyrooms, spread over DISTRICT_CHOICES
+        users (int): number of users, each with a knox token
+        bookings (int): number of past bookings
+        reviews (int): number of reviews, at most one per booking
+        favourites (int): number of favourite partyrooms of each user
+        image_dir (Path): directory of the cover images
+
+    Returns:
+        Dict[str, int]: number of rows of each kind
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        user_list = create_users(users)
+        partyrooms = create_partyrooms(user_list[0], rooms, rng)
+        counts = {
+            'users': len(user_list),
+            'partyrooms': len(partyrooms),
+            'bookings': create_bookings(user_list, partyrooms, bookings, rng),
+            'reviews': create_reviews(min(reviews, bookings), rng),
+            'favourites': create_favourites(user_list, partyrooms, favourites, rng),
+        }
+    call_command('rebuild_partyroom_rating', stdout=StringIO())
+    call_command('rebuild_search_index', stdout=StringIO())
+    counts['covers'] = create_covers(partyrooms, image_dir, rng)
+    return counts
+
+
+def get_tokens(users: List[CustomUser]) -> List[str]:
+    """a new knox token of each user"""
+    return [AuthToken.objects.create(user)[1] for user in users]
+
+
+def get_dataset_counts() -> Dict[str, int]:
+    return {
+        'users': CustomUser.objects.count(),
+        'partyrooms': PartyRoom.objects.count(),
+        'bookings': Booking.objects.count(),
+        'reviews': PartyRoomReview.objects.count(),
+        'favourites': CustomUser.favourites.through.objects.count(),
+    }
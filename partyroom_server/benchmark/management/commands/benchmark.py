@@ -0,0 +1,124 @@
+import json
+import logging
+import platform
+import shutil
+from pathlib import Path
+
+from accounts.models import CustomUser
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from utils.utils import now
+
+from benchmark.dataset import generate_dataset, get_dataset_counts, get_tokens
+from benchmark.runner import SCENARIOS, BenchmarkData, compare_results, load_results, run_scenario
+
+
+class Command(BaseCommand):
+    help = ('Generate a dataset in a separate SQLite database and measure the req/s and latency '
+            'of the API with concurrent in-process clients')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database-file', type=Path, default=settings.BASE_DIR / 'benchmark.sqlite3',
+                            help='SQLite file of the benchmark dataset, the default database is not touched')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='keep the dataset for the next run, it is only generated when empty')
+        parser.add_argument('--rooms', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--bookings', type=int, default=2000000,
+                            help='generating the default takes a few minutes, reuse it with --keepdb')
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--favourites', type=int, default=20, help='favourite partyrooms of each user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f'comma separated, of {", ".join(SCENARIOS)}')
+        parser.add_argument('--requests', type=int, default=1000, help='requests of each scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=20, help='requests before measuring each scenario')
+        parser.add_argument('--max-error-rate', type=float, default=0.01,
+                            help='fail when a scenario has more errors, its latencies would mostly time the errors')
+        parser.add_argument('--sqlite-timeout', type=float, default=30,
+                            help='seconds a connection waits for a lock of the benchmark database')
+        parser.add_argument('--output', type=Path, help='write the results as JSON')
+        parser.add_argument('--compare', type=Path, help='JSON results of a previous run')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'unknown scenarios {", ".join(sorted(unknown))}')
+        baseline = load_results(options['compare']) if options['compare'] else None
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            raise CommandError('the benchmark runs on SQLite')
+        database_file = options['database_file'].resolve()
+        image_dir = database_file.with_suffix('.images')
+        connection.settings_dict['TEST']['NAME'] = str(database_file)
+        # the connections of the client threads share the settings dict
+        connection.settings_dict['OPTIONS'] = {**connection.settings_dict['OPTIONS'],
+                                               'timeout': options['sqlite_timeout']}
+
+        # the test environment allows the test client host and keeps the emails in memory
+        setup_test_environment(debug=False)
+        if options['verbosity'] < 2:
+            # the errors are counted and checked against --max-error-rate
+            logging.disable(logging.CRITICAL)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False,
+                                                      keepdb=options['keepdb'])
+        # the readers don't wait for the writer, the database keeps the WAL mode for --keepdb runs
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        try:
+            # the clients share an ip and would be throttled
+            with override_settings(PARTYROOM_IMAGE_URL=image_dir, PARTYROOM_THUMBNAIL_URL=image_dir / 'thumbnails',
+                                   RATE_LIMITS={**settings.RATE_LIMITS, 'RATES': {}}):
+                results = self.run(scenarios, image_dir, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            if not options['keepdb']:
+                shutil.rmtree(image_dir, ignore_errors=True)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        if options['output']:
+            options['output'].write_text(json.dumps(results, indent=2))
+            self.stdout.write(f'Saved the results to {options["output"]}')
+        if baseline is not None:
+            self.stdout.write('\n'.join(compare_results(results, baseline)))
+        failed = [name for name, result in results['scenarios'].items()
+                  if result['error_rate'] > options['max_error_rate']]
+        if failed:
+            raise CommandError(f'error rate above {options["max_error_rate"]:.2%} in {", ".join(failed)}, '
+                               f'their latencies are not comparable')
+
+    def run(self, scenarios, image_dir, options):
+        if CustomUser.objects.filter(username__startswith='bench_user_').exists():
+            self.stdout.write('Using the existing dataset')
+        else:
+            self.stdout.write('Generating the dataset...')
+            generate_dataset(options['rooms'], options['users'], options['bookings'], options['reviews'],
+                             options['favourites'], image_dir, options['seed'])
+        dataset = get_dataset_counts()
+        self.stdout.write(', '.join(f'{count} {name}' for name, count in dataset.items()))
+
+        users = CustomUser.objects.filter(username__startswith='bench_user_').order_by('id')
+        data = BenchmarkData(get_tokens(users[:options['concurrency']]))
+        results = {
+            'started_at': now().isoformat(),
+            'python': platform.python_version(),
+            'dataset': dataset,
+            'scenarios': {},
+        }
+        self.stdout.write(f'{"scenario":<12}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for name in scenarios:
+            result = run_scenario(name, data, options['requests'], options['concurrency'], options['warmup'])
+            results['scenarios'][name] = result
+            if result['error_rate'] > options['max_error_rate']:
+                self.stderr.write(f'{name}: {result["errors"]} of {result["requests"]} requests failed')
+            self.stdout.write(f'{name:<12}{result["rps"]:>10}{result["p50_ms"]:>10}'
+                              f'{result["p95_ms"]:>10}{result["p99_ms"]:>10}{result["errors"]:>8}')
+        return results
@@ -0,0 +1,173 @@
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from booking.models import Booking
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from main.models import PartyRoom
+from main.utils import DISTRICT_CHOICES
+
+from utils.utils import utc8
+
+from .dataset import BOOKINGS_END
+
+# the reservations of the benchmark, far from the generated bookings
+RESERVE_START = datetime(2040, 1, 1, tzinfo=utc8)
+
+
+class BenchmarkData:
+    """the uids and tokens that the scenarios pick from"""
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.uids = list(PartyRoom.objects.values_list('uid', flat=True))
+        self.districts = [district for district, _ in DISTRICT_CHOICES]
+        # every reservation gets its own slot after the earlier runs, so that they don't conflict
+        latest = Booking.objects.aggregate(latest=Max('end_time'))['latest']
+        self.reserve_start = max(RESERVE_START, latest) if latest else RESERVE_START
+        self.reserve_slots = itertools.count(1)
+        # SQLite has a single writer and fails a transaction that can't take the write lock, instead
+        # of timing 'database is locked' errors the writes wait for each other here
+        self.write_lock = threading.Lock() if connections[DEFAULT_DB_ALIAS].vendor == 'sqlite' else None
+
+
+def list_partyrooms(client: Client, rng: random.Random, data: BenchmarkData):
+    return client.get(reverse('get_all_partyrooms'))
+
+
+def filter_partyrooms(client: Client, rng: random.Random, data: BenchmarkData):
+    return client.get(reverse('filter_partyroom'), {'district': rng.choice(data.districts),
+                                                    'numOfPpl': rng.randint(1, 20)})
+
+
+def partyroom_detail(client: Client, rng: random.Random, data: BenchmarkData):
+    return client.get(reverse('detail_partyroom', args=[rng.choice(data.uids)]))
+
+
+def check_time(client: Client, rng: random.Random, data: BenchmarkData):
+    booking_date = (BOOKINGS_END - timedelta(days=rng.randint(1, 30))).date()
+    return client.get(reverse('booking-booking_check'), {'partyroom__uid': rng.choice(data.uids),
+                                                         'booking_date': booking_date.isoformat()})
+
+
+def reserve(client: Client, rng: random.Random, data: BenchmarkData):
+    start_time = data.reserve_start + timedelta(hours=3 * next(data.reserve_slots))
+    if data.write_lock is not None:
+        with data.write_lock:
+            return post_reservation(client, rng, data, start_time)
+    return post_reservation(client, rng, data, start_time)
+
+
+def post_reservation(client: Client, rng: random.Random, data: BenchmarkData, start_time: datetime):
+    return client.post(reverse('booking-booking_reserve'),
+                       {'partyroom': rng.choice(data.uids),
+                        'start_time': start_time.isoformat(),
+                        'end_time': (start_time + timedelta(hours=2)).isoformat(),
+                        'num_users': 1,
+                        'unit_price': 100,
+                        'total_price': 200},
+                       content_type='application/json')
+
+
+def favourites(client: Client, rng: random.Random, data: BenchmarkData):
+    return client.get(reverse('user_favourite_list'))
+
+
+SCENARIOS: Dict[str, Callable] = {
+    'list': list_partyrooms,
+    'filter': filter_partyrooms,
+    'detail': partyroom_detail,
+    'check_time': check_time,
+    'reserve': reserve,
+    'favourites': favourites,
+}
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    """nearest rank percentile of the sorted latencies"""
+    if not latencies:
+        return 0.0
+    return latencies[max(math.ceil(q * len(latencies)) - 1, 0)]
+
+
+def run_client(scenario: Callable, data: BenchmarkData, index: int, count: int, threaded: bool):
+    client = Client(raise_request_exception=False,
+                    HTTP_AUTHORIZATION=f'Token {data.tokens[index % len(data.tokens)]}')
+    rng = random.Random(index)
+    latencies, errors = [], 0
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            response = scenario(client, rng, data)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+    finally:
+        if threaded:
+            # the thread's own connections
+            connections.close_all()
+    return latencies, errors
+
+
+def run_scenario(name: str, data: BenchmarkData, requests: int, concurrency: int, warmup: int = 0) -> Dict:
+    """send the requests of the scenario from concurrent clients
+
+    Returns:
+        Dict: req/s, error count and latency percentiles in milliseconds
+    """
+    scenario = SCENARIOS[name]
+    if warmup:
+        run_client(scenario, data, 0, warmup, threaded=False)
+
+    counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [run_client(scenario, data, 0, requests, threaded=False)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda args: run_client(scenario, data, *args, threaded=True),
+                                        enumerate(counts)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'error_rate': round(sum(errors for _, errors in results) / len(latencies), 4) if latencies else 0,
+        'concurrency': concurrency,
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0,
+    }
+
+
+def compare_results(results: Dict, baseline: Dict) -> List[str]:
+    """lines of the change of req/s and p95 of each scenario from the baseline run"""
+    def change(new: float, old: Optional[float]) -> str:
+        if not old:
+            return 'n/a'
+        return f'{(new - old) / old * 100:+.1f}%'
+
+    lines = [f'{"scenario":<12}{"req/s":>22}{"p95 ms":>26}']
+    for name, result in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name, {})
+        lines.append(f'{name:<12}'
+                     f'{result["rps"]:>12} {change(result["rps"], old.get("rps")):>9}'
+                     f'{result["p95_ms"]:>16} {change(result["p95_ms"], old.get("p95_ms")):>9}')
+    return lines
+
+
+def load_results(path) -> Dict:
+    with open(path) as f:
+        return json.load(f)
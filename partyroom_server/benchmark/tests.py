@@ -0,0 +1,50 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase, override_settings
+
+from accounts.models import CustomUser
+from main.models import PartyRoom
+
+from .dataset import generate_dataset, get_tokens
+from .runner import SCENARIOS, BenchmarkData, compare_results, percentile, run_scenario
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        self.image_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.image_dir, ignore_errors=True)
+        self.settings_override = override_settings(PARTYROOM_IMAGE_URL=self.image_dir,
+                                                   PARTYROOM_THUMBNAIL_URL=self.image_dir / 'thumbnails')
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_generate_dataset(self):
+        counts = generate_dataset(rooms=20, users=3, bookings=100, reviews=10, favourites=5,
+                                  image_dir=self.image_dir)
+        self.assertEqual(counts, {'users': 3, 'partyrooms': 20, 'bookings': 100,
+                                  'reviews': 10, 'favourites': 15, 'covers': 20})
+        self.assertEqual(len(list(self.image_dir.glob('*.jpg'))), 20)
+        # the rating aggregate is rebuilt after the bulk insert
+        self.assertEqual(sum(PartyRoom.objects.values_list('rating_count', flat=True)), 10)
+
+    def test_run_scenarios(self):
+        generate_dataset(rooms=20, users=2, bookings=100, reviews=10, favourites=5, image_dir=self.image_dir)
+        data = BenchmarkData(get_tokens(list(CustomUser.objects.all())))
+        results = {'scenarios': {name: run_scenario(name, data, requests=5, concurrency=1) for name in SCENARIOS}}
+        for name, result in results['scenarios'].items():
+            self.assertEqual(result['requests'], 5, name)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['error_rate'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        lines = compare_results(results, results)
+        self.assertEqual(len(lines), len(SCENARIOS) + 1)
+        self.assertIn('+0.0%', lines[1])
+
+    def test_percentile(self):
+        latencies = [i / 100 for i in range(1, 101)]
+        self.assertEqual(percentile(latencies, 0.5), 0.5)
+        self.assertEqual(percentile(latencies, 0.99), 0.99)
+        self.assertEqual(percentile([], 0.5), 0.0)
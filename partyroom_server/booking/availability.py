@@ -0,0 +1,114 @@
+from datetime import date, datetime, time, timedelta
+from logging import getLogger
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .utils import get_overlapping_bookings
+
+logger = getLogger(__name__)
+
+Interval = Tuple[datetime, datetime]
+
+
+def get_day_bounds(day: date) -> Interval:
+    """[start, end) of the day in the local time zone"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(1), time.min))
+    return start, end
+
+
+def get_days(start_time: datetime, end_time: datetime) -> List[date]:
+    """local dates touched by [start_time, end_time)"""
+    first_day = timezone.localdate(start_time)
+    last_day = timezone.localdate(end_time - timedelta(microseconds=1))
+    return [first_day + timedelta(i) for i in range((last_day - first_day).days + 1)]
+
+
+def get_availability_cache_key(partyroom_id: int, transition_time: int, day: date) -> str:
+    # the transition time is part of the key, changing it leaves the old entries unused
+    return f'booking:availability:{partyroom_id}:{transition_time}:{day.isoformat()}'
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def compute_day_availability(day: date, busy: List[Interval]) -> Dict[str, List[Dict]]:
+    """split the day into busy and free slots
+
+    Args:
+        day (date): the local date
+        busy (List[Interval]): sorted and merged busy intervals around the day
+
+    Returns:
+        Dict[str, List[Dict]]: busy and free slots clipped to the day
+    """
+    day_start, day_end = get_day_bounds(day)
+    busy_slots, free_slots = [], []
+    cursor = day_start
+    for start, end in busy:
+        if end <= day_start or start >= day_end:
+            continue
+        start, end = max(start, day_start), min(end, day_end)
+        if start > cursor:
+            free_slots.append({'start_time': cursor, 'end_time': start})
+        busy_slots.append({'start_time': start, 'end_time': end})
+        cursor = end
+    if cursor < day_end:
+        free_slots.append({'start_time': cursor, 'end_time': day_end})
+    return {'busy': busy_slots, 'free': free_slots}
+
+
+def get_availability(partyroom, start_date: date, end_date: date) -> List[Dict]:
+    """free and busy slots of the partyroom for each day in [start_date, end_date]
+
+    Busy slots include the transition time before and after each booking. The days
+    are read from the cache and the missing ones are computed with one range query.
+
+    Args:
+        partyroom (PartyRoom): the partyroom to check
+        start_date (date): first local date
+        end_date (date): last local date, inclusive
+
+    Returns:
+        List[Dict]: date, busy and free slots of each day
+    """
+    days = [start_date + timedelta(i) for i in range((end_date - start_date).days + 1)]
+    keys = {get_availability_cache_key(partyroom.id, partyroom.transitionTime, day): day for day in days}
+    availability = cache.get_many(keys)
+
+    missing_days = [day for key, day in keys.items() if key not in availability]
+    if missing_days:
+        transition = timedelta(minutes=partyroom.transitionTime)
+        span_start = get_day_bounds(missing_days[0])[0] - transition
+        span_end = get_day_bounds(missing_days[-1])[1] + transition
+        bookings = get_overlapping_bookings(partyroom, span_start, span_end).values_list('start_time', 'end_time')
+        busy = merge_intervals((start - transition, end + transition) for start, end in bookings)
+
+        computed = {get_availability_cache_key(partyroom.id, partyroom.transitionTime, day):
+                    compute_day_availability(day, busy) for day in missing_days}
+        cache.set_many(computed, settings.BOOKING_AVAILABILITY_CACHE_TIMEOUT)
+        availability.update(computed)
+        logger.debug('computed availability of %s for %d days', partyroom.uid, len(missing_days))
+
+    return [{'date': day, **availability[key]} for key, day in keys.items()]
+
+
+def get_affected_cache_keys(partyroom, start_time: datetime, end_time: datetime) -> List[str]:
+    """cache keys of the days blocked by a booking of [start_time, end_time)"""
+    transition = timedelta(minutes=partyroom.transitionTime)
+    return [get_availability_cache_key(partyroom.id, partyroom.transitionTime, day)
+            for day in get_days(start_time - transition, end_time + transition)]
+
+
+def invalidate_availability(keys: List[str]) -> None:
+    cache.delete_many(keys)
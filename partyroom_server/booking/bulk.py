@@ -0,0 +1,267 @@
+import csv
+import heapq
+import json
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from error_code_list import *
+from main.models import PartyRoom
+
+from .availability import get_affected_cache_keys, get_day_bounds, invalidate_availability
+from .constants import BOOKING_UNAVAILABLE_STATUS
+from .models import Booking
+from .serializers import BookingImportSerializer
+from .utils import classify_conflict, get_overlapping_bookings
+
+# columns of the exported files, an export can be imported into another partyroom
+EXPORT_FIELDS = ('uid', 'user', 'start_time', 'end_time', 'status', 'num_users', 'unit_price', 'total_price')
+FILE_FORMATS = ('csv', 'jsonl')
+
+
+class BookingImportError(Exception):
+    """the import is rejected, nothing is saved
+
+    Args:
+        error_code (str): error code of the whole import
+        rows (List[Dict]): row number, error codes and the conflicting row of each invalid row
+    """
+    def __init__(self, error_code: str, rows: List[Dict] = None):
+        super().__init__(error_code)
+        self.error_code = error_code
+        self.rows = rows or []
+
+    def as_data(self) -> Dict:
+        data = {'error_code_list': [self.error_code]}
+        if self.rows:
+            data['rows'] = self.rows
+        return data
+
+
+def read_csv_rows(lines: Iterable[str]) -> Iterator[Dict]:
+    """rows of a CSV file with a header line"""
+    for row in csv.DictReader(lines):
+        # the extra values of a row are under the None key
+        yield row if None not in row else None
+
+
+def read_jsonl_rows(lines: Iterable[str]) -> Iterator[Dict]:
+    """rows of a JSON object per line file, blank lines are skipped"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+
+def read_rows(lines: Iterable[str], file_format: str) -> Iterator[Dict]:
+    """rows of the file, None for a row that can't be read
+
+    Raises:
+        BookingImportError: the file can't be decoded or parsed from a row on
+    """
+    rows = read_csv_rows(lines) if file_format == 'csv' else read_jsonl_rows(lines)
+    number = 0
+    try:
+        for number, row in enumerate(rows, 1):
+            yield row
+    except (UnicodeDecodeError, csv.Error):
+        # the lines after the error can't be trusted
+        raise BookingImportError(BOOKING_IMPORT_ROWS_INVALID_ERROR,
+                                 [{'row': number + 1, 'error_code_list': [BOOKING_IMPORT_ROW_INVALID_ERROR]}])
+
+
+def get_row_error_codes(errors) -> List[str]:
+    """the error codes in the serializer errors of a row"""
+    if isinstance(errors, dict):
+        errors = [detail for details in errors.values() for detail in details]
+    codes = [str(detail) for detail in errors if str(detail).startswith('ERROR')]
+    return codes or [BOOKING_IMPORT_ROW_INVALID_ERROR]
+
+
+def validate_rows(rows: Iterable[Optional[Dict]], max_rows: Optional[int]) -> List[Dict]:
+    """validated data of the rows, numbered from 1 in the order of the file"""
+    bookings, errors = [], []
+    for number, row in enumerate(rows, 1):
+        if max_rows is not None and number > max_rows:
+            raise BookingImportError(BOOKING_IMPORT_TOO_MANY_ROWS_ERROR)
+        if row is None:
+            errors.append({'row': number, 'error_code_list': [BOOKING_IMPORT_ROW_INVALID_ERROR]})
+            continue
+        # empty CSV cells are missing values
+        serializer = BookingImportSerializer(data={key: value for key, value in row.items() if value != ''})
+        if serializer.is_valid():
+            bookings.append({**serializer.validated_data, 'row': number})
+        else:
+            errors.append({'row': number, 'error_code_list': get_row_error_codes(serializer.errors)})
+    if errors:
+        raise BookingImportError(BOOKING_IMPORT_ROWS_INVALID_ERROR, errors)
+    return bookings
+
+
+def resolve_users(bookings: List[Dict], default_user) -> None:
+    """replace the user emails of the bookings by the users, in one query"""
+    emails = {booking['user'].lower() for booking in bookings if 'user' in booking}
+    users = {}
+    if emails:
+        # the emails are stored as given at sign up
+        matched = get_user_model().objects.annotate(email_lower=Lower('email')).filter(email_lower__in=emails)
+        users = {user.email_lower: user for user in matched}
+    errors = []
+    for booking in bookings:
+        if 'user' not in booking:
+            booking['user'] = default_user
+        elif booking['user'].lower() in users:
+            booking['user'] = users[booking['user'].lower()]
+        else:
+            errors.append({'row': booking['row'], 'error_code_list': [BOOKING_IMPORT_USER_DOES_NOT_EXIST_ERROR]})
+    if errors:
+        raise BookingImportError(BOOKING_IMPORT_ROWS_INVALID_ERROR, errors)
+
+
+def find_import_conflicts(bookings: List[Dict], existing: Iterable) -> List[Dict]:
+    """the rows that overlap an existing booking or another row, in a single sweep
+
+    The bookings and the existing bookings are visited by start time. Two heaps
+    by end time hold the bookings that are still running, every one of them
+    overlaps the visited booking.
+
+    Args:
+        bookings (List[Dict]): validated rows sorted by start time
+        existing (Iterable): (start_time, end_time) of the existing bookings sorted by start time
+
+    Returns:
+        List[Dict]: row number, error codes and the conflicting row of each conflicting row
+    """
+    conflicts = {}
+    running_rows, running_existing = [], []
+
+    def add_conflict(booking, error_code, other_row=None):
+        if booking['row'] not in conflicts:
+            conflicts[booking['row']] = {'row': booking['row'], 'error_code_list': [error_code]}
+            if other_row is not None:
+                conflicts[booking['row']]['conflicts_with'] = other_row
+
+    existing = iter(existing)
+    next_existing = next(existing, None)
+    for booking in bookings + [None]:
+        # the existing bookings that start before this row
+        while next_existing is not None and (booking is None or next_existing[0] < booking['start_time']):
+            start_time, end_time = next_existing
+            while running_rows and running_rows[0][0] <= start_time:
+                heapq.heappop(running_rows)
+            for _, _, other in running_rows:
+                add_conflict(other, classify_conflict(start_time, end_time, other['start_time'], other['end_time']))
+            heapq.heappush(running_existing, next_existing[::-1])
+            next_existing = next(existing, None)
+        if booking is None:
+            break
+
+        for running in (running_rows, running_existing):
+            while running and running[0][0] <= booking['start_time']:
+                heapq.heappop(running)
+        if running_existing:
+            end_time, start_time = running_existing[0]
+            add_conflict(booking, classify_conflict(start_time, end_time, booking['start_time'], booking['end_time']))
+        for _, _, other in running_rows:
+            add_conflict(booking, BOOKING_IMPORT_ROW_CONFLICTS_ERROR, other['row'])
+            add_conflict(other, BOOKING_IMPORT_ROW_CONFLICTS_ERROR, booking['row'])
+        heapq.heappush(running_rows, (booking['end_time'], booking['row'], booking))
+    return sorted(conflicts.values(), key=lambda conflict: conflict['row'])
+
+
+def import_bookings(partyroom: PartyRoom, rows: Iterable[Optional[Dict]], default_user,
+                    max_rows: Optional[int] = None) -> int:
+    """check the rows against each other and the existing bookings, then create them all
+
+    Rows without a status are confirmed bookings, only the rows with a status
+    of BOOKING_UNAVAILABLE_STATUS are checked for conflicts. The whole import
+    is rejected when any row is invalid or conflicts. The queries don't grow
+    with the rows, apart from one insert per settings.BOOKING_IMPORT_BATCH_SIZE
+    bookings.
+
+    Args:
+        partyroom (PartyRoom): partyroom of the bookings
+        rows (Iterable[Optional[Dict]]): rows of read_rows
+        default_user (CustomUser): user of the rows without a user email
+        max_rows (Optional[int]): most rows of an import, unlimited when None
+
+    Raises:
+        BookingImportError: the rows are rejected
+
+    Returns:
+        int: number of created bookings
+    """
+    bookings = validate_rows(rows, max_rows)
+    if not bookings:
+        return 0
+    resolve_users(bookings, default_user)
+    bookings.sort(key=lambda booking: (booking['start_time'], booking['end_time']))
+
+    # canceled, rejected and outdated bookings don't take the time, like in reserve
+    blocking = [booking for booking in bookings if booking['status'] in BOOKING_UNAVAILABLE_STATUS]
+
+    with transaction.atomic():
+        # the same lock as the reservations, so that they are checked one at a time
+        partyroom = PartyRoom.objects.select_for_update().get(pk=partyroom.pk)
+        if blocking:
+            existing = get_overlapping_bookings(partyroom, blocking[0]['start_time'],
+                                                max(booking['end_time'] for booking in blocking)) \
+                .order_by('start_time').values_list('start_time', 'end_time')
+            conflicts = find_import_conflicts(blocking, existing.iterator())
+            if conflicts:
+                raise BookingImportError(BOOKING_IMPORT_ROWS_INVALID_ERROR, conflicts)
+
+        Booking.objects.bulk_create(
+            (Booking(partyroom=partyroom, **{key: value for key, value in booking.items() if key != 'row'})
+             for booking in bookings),
+            batch_size=settings.BOOKING_IMPORT_BATCH_SIZE)
+
+        # bulk_create sends no post_save, the availability signal doesn't see the new bookings
+        keys = {key for booking in blocking
+                for key in get_affected_cache_keys(partyroom, booking['start_time'], booking['end_time'])}
+        transaction.on_commit(lambda: invalidate_availability(list(keys)))
+    return len(bookings)
+
+
+def iter_export_rows(partyroom: PartyRoom, start_date: date, end_date: date) -> Iterator[Dict]:
+    """the bookings of the partyroom that touch the local dates [start_date, end_date], by start time
+
+    The bookings are read in chunks, the memory doesn't grow with the bookings.
+    """
+    start_time, end_time = get_day_bounds(start_date)[0], get_day_bounds(end_date)[1]
+    bookings = Booking.objects.filter(partyroom=partyroom, start_time__lt=end_time, end_time__gt=start_time) \
+        .order_by('start_time', 'id') \
+        .values_list('uid', 'user__email', 'start_time', 'end_time', 'status',
+                     'num_users', 'unit_price', 'total_price')
+    for values in bookings.iterator(chunk_size=settings.BOOKING_IMPORT_BATCH_SIZE):
+        row = dict(zip(EXPORT_FIELDS, values))
+        row['start_time'] = timezone.localtime(row['start_time']).isoformat()
+        row['end_time'] = timezone.localtime(row['end_time']).isoformat()
+        yield row
+
+
+class Echo:
+    """a file that returns what is written, for csv.writer"""
+    def write(self, value: str) -> str:
+        return value
+
+
+def export_bookings(partyroom: PartyRoom, start_date: date, end_date: date, file_format: str) -> Iterator[str]:
+    """the lines of the exported file"""
+    rows = iter_export_rows(partyroom, start_date, end_date)
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row.values())
+    else:
+        for row in rows:
+            yield json.dumps(row) + '\n'
@@ -1,8 +1,7 @@
 from django_filters import rest_framework as filters
-from django.db.models import Q
+from .availability import get_day_bounds
 from .models import Booking
-from datetime import date, time, datetime, timedelta
-from utils.utils import utc
+from datetime import date
 
 
 class BookingUnavailableFilter(filters.FilterSet):
@@ -13,7 +12,7 @@ class BookingUnavailableFilter(filters.FilterSet):
     
 
     def booking_date_filter(self, queryset, name: str, booking_date: date):
-        """filter either start time or end time of existing booking equal to the booking date
+        """filter the existing bookings that overlap the booking date
 
         Args:
             queryset ([type]): Booking.objects.all
@@ -23,11 +22,6 @@ class BookingUnavailableFilter(filters.FilterSet):
         Returns:
             [type]: a queryset
         """
-        previous_date = booking_date - timedelta(1)  # day before
-        utc_start_booking_datetime = datetime.combine(previous_date, time(hour=16), tzinfo=utc)
-        utc_end_booking_datetime = datetime.combine(booking_date, time(hour=16), tzinfo=utc)
-
-        # first query the date, then validate the time(in utc time zone)
-        return queryset.filter(Q(start_time__contains=previous_date)).filter(start_time__gte=utc_start_booking_datetime) |  \
-                queryset.filter(Q(end_time__contains=booking_date)).filter(end_time__lte=utc_end_booking_datetime)
-    
\ No newline at end of file
+        # a range on the datetime columns so that booking_room_time_idx can be used
+        day_start, day_end = get_day_bounds(booking_date)
+        return queryset.filter(start_time__lt=day_end, end_time__gt=day_start)
@@ -0,0 +1,34 @@
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from main.models import PartyRoom
+
+from booking.bulk import FILE_FORMATS, export_bookings
+
+
+class Command(BaseCommand):
+    help = 'Write the bookings of a partyroom on the given local dates as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('partyroom', help='uid of the partyroom')
+        parser.add_argument('--start-date', type=date.fromisoformat, required=True)
+        parser.add_argument('--end-date', type=date.fromisoformat, required=True, help='inclusive')
+        parser.add_argument('--format', choices=FILE_FORMATS, default='csv')
+        parser.add_argument('--output', type=Path, help='the file to write, stdout by default')
+
+    def handle(self, *args, **options):
+        try:
+            partyroom = PartyRoom.objects.get(uid=options['partyroom'])
+        except PartyRoom.DoesNotExist:
+            raise CommandError(f'partyroom {options["partyroom"]} does not exist')
+        if options['end_date'] < options['start_date']:
+            raise CommandError('the end date is before the start date')
+
+        lines = export_bookings(partyroom, options['start_date'], options['end_date'], options['format'])
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with options['output'].open('w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
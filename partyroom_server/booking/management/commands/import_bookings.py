@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from main.models import PartyRoom
+
+from booking.bulk import FILE_FORMATS, BookingImportError, import_bookings, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Import the bookings of a partyroom from a CSV or JSON lines file, '
+            'nothing is saved when a row is invalid or conflicts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('partyroom', help='uid of the partyroom')
+        parser.add_argument('file', type=Path)
+        parser.add_argument('--format', choices=FILE_FORMATS,
+                            help='format of the file, by default from its suffix')
+        parser.add_argument('--user', help='email of the user of the rows without a user, the owner by default')
+
+    def handle(self, *args, **options):
+        try:
+            partyroom = PartyRoom.objects.select_related('owner').get(uid=options['partyroom'])
+        except PartyRoom.DoesNotExist:
+            raise CommandError(f'partyroom {options["partyroom"]} does not exist')
+        file_format = options['format'] or options['file'].suffix.lstrip('.').lower()
+        if file_format not in FILE_FORMATS:
+            raise CommandError(f'unknown format {file_format}, use --format')
+        default_user = partyroom.owner
+        if options['user']:
+            default_user = get_user_model().objects.filter(email__iexact=options['user']).first()
+            if default_user is None:
+                raise CommandError(f'user {options["user"]} does not exist')
+
+        with options['file'].open(newline='', encoding='utf-8-sig') as lines:
+            try:
+                created = import_bookings(partyroom, read_rows(lines, file_format), default_user)
+            except BookingImportError as error:
+                for row in error.rows:
+                    self.stderr.write(f'row {row["row"]}: {", ".join(row["error_code_list"])}'
+                                      + (f' with row {row["conflicts_with"]}' if 'conflicts_with' in row else ''))
+                raise CommandError(f'no bookings imported, {error.error_code}')
+        self.stdout.write(f'Imported {created} bookings into {partyroom.uid}')
@@ -14,28 +14,29 @@ STATUS_CHOICES = (
     ('NOT_OPEN', 'not_open'),   
 )
 
-def increment_booking_id():
-    last_booking = Booking.objects.all().order_by('id').last()
-    return 100000 if not last_booking else last_booking.id + 1
-
-
 class Booking(models.Model):
-    id = models.PositiveIntegerField(
+    # the database assigns the id, starting from this value (see utils.db)
+    ID_START_OFFSET = 100000
+
+    id = models.AutoField(
         primary_key=True,
         editable=False,
     )
     uid = ShortUUIDField(
         unique=True, 
     )
+    # the composite indexes in Meta lead with partyroom and user
     partyroom = models.ForeignKey(
         to='main.partyroom',
         on_delete=models.CASCADE,
         verbose_name='partyroom', 
+        db_index=False,
     )
     user = models.ForeignKey(
         to=settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        verbose_name='user'
+        verbose_name='user',
+        db_index=False,
     )
     start_time = models.DateTimeField(
         verbose_name='booking start time',
@@ -69,12 +70,27 @@ class Booking(models.Model):
     total_price = models.PositiveIntegerField(
         verbose_name='booking total price'
     )
-    
+
+    class Meta:
+        indexes = [
+            # reserve conflict check: partyroom, status IN (...), start_time < end AND end_time > start
+            models.Index(fields=['partyroom', 'status', 'start_time', 'end_time'],
+                         name='booking_room_status_time_idx'),
+            # bookings of a partyroom on a day (BookingUnavailableFilter)
+            models.Index(fields=['partyroom', 'start_time', 'end_time'],
+                         name='booking_room_time_idx'),
+            # bookings of a user ordered by start time (MyBookingListView)
+            models.Index(fields=['user', 'start_time'],
+                         name='booking_user_start_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored period so that moving a booking also refreshes the old days
+        loaded_times = (instance.__dict__.get('start_time'), instance.__dict__.get('end_time'))
+        instance._loaded_times = None if None in loaded_times else loaded_times
+        return instance
+
     def __str__(self):
         return f'{self.partyroom.uid} {str(self.start_time)[:16]}-{str(self.end_time)[:16]}'
-
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        if not self.id:
-            self.id = increment_booking_id()
-        super(Booking, self).save(force_insert=False, force_update=False, using=None,
-                                    update_fields=None)    
\ No newline at end of file
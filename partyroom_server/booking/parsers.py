@@ -0,0 +1,25 @@
+import codecs
+
+from rest_framework.parsers import BaseParser
+
+from .bulk import read_rows
+
+
+class BookingFileParser(BaseParser):
+    """the rows of a bulk import body, read while they are validated"""
+    file_format = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return read_rows(codecs.iterdecode(stream, 'utf-8-sig'), self.file_format)
+
+
+class BookingCSVParser(BookingFileParser):
+    media_type = 'text/csv'
+    file_format = 'csv'
+
+
+class BookingJSONLinesParser(BookingFileParser):
+    media_type = 'application/jsonl'
+    file_format = 'jsonl'
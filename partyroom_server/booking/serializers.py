@@ -1,20 +1,22 @@
 import logging
 from datetime import timedelta
 
+from django.conf import settings
 from error_code_list import *
 from main.models import PartyRoom
 from main.serializers import PartyRoomBriefImageSerializer, PartyRoomBriefSerializer
+from main.utils import UID_MAX_LENGTH
 from rest_framework import serializers
 
-from .constants import BOOKING_UNAVAILABLE_STATUS
-from .models import Booking
+from .models import STATUS_CHOICES, Booking
+from .utils import find_booking_conflict
 
 
 logger = logging.getLogger(__name__)
 
 
 class BookingReserveSerializer(serializers.ModelSerializer):
-    partyroom = serializers.CharField(max_length=3)
+    partyroom = serializers.CharField(max_length=UID_MAX_LENGTH)
     # TODO cannot reserve the days that have passed
     class Meta:
         model = Booking
@@ -65,7 +67,9 @@ class BookingReserveSerializer(serializers.ModelSerializer):
         if not isinstance(value, str):
             raise serializers.ValidationError(BOOKING_UID_TYPE_ERROR)
         try:
-            partyroom = PartyRoom.objects.get(uid=value)
+            # lock the partyroom until the booking is created so that reservations
+            # of the same partyroom are checked one at a time
+            partyroom = PartyRoom.objects.select_for_update().get(uid=value)
             # return partroom instance instead of partyroom uid
             return partyroom
         
@@ -83,41 +87,50 @@ class BookingReserveSerializer(serializers.ModelSerializer):
             # start time is later than end time
             raise serializers.ValidationError(BOOKING_START_TIME_GTE_END_TIME_ERROR)
         
-        # case1 this booking start before an existing booking but end time is overlapped to an existing booking
-        conflict_bookings_case1 = Booking.objects.filter(start_time__gte=start_time,
-                                                         start_time__lt=end_time, 
-                                                         partyroom__uid=partyroom.uid,
-                                                         status__in=BOOKING_UNAVAILABLE_STATUS)
-        if len(conflict_bookings_case1) != 0:
-            raise serializers.ValidationError(BOOKING_TIME_CONFLICS_CASE1_ERROR)
-                                                         
-        # case2 this booking start within an existing booking period but end after the existing bookin      
-        conflict_bookings_case2 = Booking.objects.filter(end_time__gt=start_time, 
-                                                   end_time__lte=end_time,
-                                                   partyroom__uid=partyroom.uid,
-                                                   status__in=BOOKING_UNAVAILABLE_STATUS)
-        if len(conflict_bookings_case2) != 0:
-            raise serializers.ValidationError(BOOKING_TIME_CONFLICS_CASE2_ERROR)  
-              
-        # case 3 this booking is within an existing booking time period
-        conflict_bookings_case3 = Booking.objects.filter(start_time__lte=start_time, 
-                                                   end_time__gte=end_time,
-                                                   partyroom__uid=partyroom.uid,
-                                                   status__in=BOOKING_UNAVAILABLE_STATUS)
-        if len(conflict_bookings_case3) != 0:
-            raise serializers.ValidationError(BOOKING_TIME_CONFLICS_CASE3_ERROR)   
-             
-        # case 4 this booking includes an existing booking period
-        conflict_bookings_case4 = Booking.objects.filter(start_time__gte=start_time,
-                                                         end_time__lte=end_time,
-                                                         partyroom__uid=partyroom.uid,
-                                                         status__in=BOOKING_UNAVAILABLE_STATUS)
-        if len(conflict_bookings_case4) != 0:
-            raise serializers.ValidationError(BOOKING_TIME_CONFLICS_CASE4_ERROR)
+        conflict_error = find_booking_conflict(partyroom, start_time, end_time)
+        if conflict_error is not None:
+            raise serializers.ValidationError(conflict_error)
 
         return data
     
 
+class BookingImportSerializer(BookingReserveSerializer):
+    """a row of a bulk import, the partyroom is given for the whole import and
+    the conflicts are checked together in booking.bulk
+    """
+    partyroom = None
+    # email of the user of the booking, the importing user by default
+    user = serializers.EmailField(required=False, error_messages={'invalid': EMAIL_INVALID_ERROR_CODE})
+    # the stored values, e.g. 'confirm' or 'canceled', of an export
+    status = serializers.ChoiceField(choices=[value for _, value in STATUS_CHOICES], default='confirm',
+                                     error_messages={'invalid_choice': BOOKING_IMPORT_STATUS_INVALID_ERROR})
+
+    class Meta(BookingReserveSerializer.Meta):
+        fields = ('user', 'start_time', 'end_time', 'status', 'num_users', 'unit_price', 'total_price')
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError(BOOKING_START_TIME_GTE_END_TIME_ERROR)
+        return data
+
+
+class BookingExportQuerySerializer(serializers.Serializer):
+    start_date = serializers.DateField(
+        error_messages={'required': BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR,
+                        'invalid': BOOKING_DATE_INVALID_ERROR})
+    end_date = serializers.DateField(
+        error_messages={'required': BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR,
+                        'invalid': BOOKING_DATE_INVALID_ERROR})
+    # named file_format, ?format= selects the renderer in DRF
+    file_format = serializers.ChoiceField(choices=('csv', 'jsonl'), default='csv',
+                                          error_messages={'invalid_choice': BOOKING_FILE_FORMAT_INVALID_ERROR})
+
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError(BOOKING_DATE_INVALID_ERROR)
+        return data
+
+
 class AvailableBookingListSerializer(serializers.ModelSerializer):
     start_time = serializers.DateTimeField(format='%Y-%m-%dT%H:%M')
     end_time = serializers.DateTimeField(format='%Y-%m-%dT%H:%M')
@@ -127,6 +140,45 @@ class AvailableBookingListSerializer(serializers.ModelSerializer):
           fields = ('start_time', 'end_time',)          
 
 
+class BookingAvailabilityQuerySerializer(serializers.Serializer):
+    partyroom__uid = serializers.CharField(
+        error_messages={'required': BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR,
+                        'blank': BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR})
+    start_date = serializers.DateField(
+        error_messages={'required': BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR,
+                        'invalid': BOOKING_DATE_INVALID_ERROR})
+    end_date = serializers.DateField(
+        error_messages={'required': BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR,
+                        'invalid': BOOKING_DATE_INVALID_ERROR})
+
+    def validate_partyroom__uid(self, value):
+        try:
+            # return partroom instance instead of partyroom uid
+            return PartyRoom.objects.get(uid=value)
+        except PartyRoom.DoesNotExist:
+            raise serializers.ValidationError(BOOKING_PARTYROOM_DOES_NOT_EXIST_ERROR)
+
+    def validate(self, data):
+        num_days = (data['end_date'] - data['start_date']).days + 1
+        if num_days < 1:
+            # end date is earlier than start date
+            raise serializers.ValidationError(BOOKING_DATE_INVALID_ERROR)
+        if num_days > settings.BOOKING_AVAILABILITY_MAX_DAYS:
+            raise serializers.ValidationError(BOOKING_DATE_RANGE_TOO_LONG_ERROR)
+        return data
+
+
+class AvailabilitySlotSerializer(serializers.Serializer):
+    start_time = serializers.DateTimeField(format='%Y-%m-%dT%H:%M')
+    end_time = serializers.DateTimeField(format='%Y-%m-%dT%H:%M')
+
+
+class BookingAvailabilitySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    busy = AvailabilitySlotSerializer(many=True)
+    free = AvailabilitySlotSerializer(many=True)
+
+
 class BookingCancelSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
@@ -0,0 +1,21 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .availability import get_affected_cache_keys, invalidate_availability
+from .models import Booking
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_availability(sender, instance, **kwargs):
+    # reserve, cancel and time changes all go through save/delete,
+    # bulk_create and queryset.update rely on the cache timeout instead
+    keys = get_affected_cache_keys(instance.partyroom, instance.start_time, instance.end_time)
+    loaded_times = getattr(instance, '_loaded_times', None)
+    if loaded_times is not None and loaded_times != (instance.start_time, instance.end_time):
+        keys += get_affected_cache_keys(instance.partyroom, *loaded_times)
+    # after commit so that a concurrent request can't cache the days before the booking is visible
+    transaction.on_commit(partial(invalidate_availability, keys))
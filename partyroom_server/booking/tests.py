@@ -1,12 +1,28 @@
+import json
+import tempfile
 from datetime import datetime, timedelta, timezone
+from io import StringIO
+from pathlib import Path
 
 from accounts.models import CustomUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from error_code_list import *
 from main.models import PartyRoom
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
+from utils.testing import QueryBudgetTestMixin, Seeder, create_user
+
+from .bulk import find_import_conflicts
+from .filters import BookingUnavailableFilter
+from .models import Booking
+from .utils import get_overlapping_bookings
 
 
 room_1_data = {"name": "small_room_1",
@@ -116,8 +132,483 @@ class BookingCreateTests(APITestCase):
         response_data['partyroom'] = self.room1.name
 
         self.assertEqual(response.data, response_data)
-        
-      
-        
-        
-        
\ No newline at end of file
+
+
+class BookingIdTests(APITestCase):
+    def test_booking_id_start_offset(self):
+        roomer = CustomUser.objects.create(username='roomer',
+                                           password='some_password',
+                                           phone_number='+85291234511',
+                                           email='user1@example.com',
+                                           is_roomer=True)
+        room = PartyRoom.objects.create(owner=roomer, name='small_room_1')
+        bookings = [Booking.objects.create(partyroom=room,
+                                           user=roomer,
+                                           start_time=now + timedelta(hours=i),
+                                           end_time=now + timedelta(hours=i + 1),
+                                           unit_price=10,
+                                           total_price=10) for i in range(2)]
+        # ids are assigned by the database from the offset
+        self.assertEqual([booking.id for booking in bookings], [100000, 100001])
+        self.assertEqual(room.id, 1)
+
+
+class BookingConflictTests(APITestCase):
+    reserve_url = reverse('booking-booking_reserve')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='booking_user',
+                                              password='some_password',
+                                              phone_number='+85291234512',
+                                              email='user2@example.com',
+                                              is_verified=True)
+        self.room = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+        self.start_time = datetime(2030, 1, 1, 12, tzinfo=utc8)
+        # existing booking 12:00-14:00
+        Booking.objects.create(partyroom=self.room,
+                               user=self.user,
+                               start_time=self.start_time,
+                               end_time=self.start_time + timedelta(hours=2),
+                               status='confirm',
+                               unit_price=10,
+                               total_price=10)
+        self.client.force_authenticate(self.user)
+
+    def reserve(self, start_hour, end_hour):
+        data = {'partyroom': self.room.uid,
+                'start_time': (self.start_time + timedelta(hours=start_hour)).isoformat(),
+                'end_time': (self.start_time + timedelta(hours=end_hour)).isoformat(),
+                'num_users': 2,
+                'unit_price': 10,
+                'total_price': 10}
+        return self.client.post(self.reserve_url, data, format='json')
+
+    def test_reserve_conflicts(self):
+        conflicts = [
+            ((-1, 1), BOOKING_TIME_CONFLICS_CASE1_ERROR),
+            ((1, 3), BOOKING_TIME_CONFLICS_CASE2_ERROR),
+            ((0.5, 1.5), BOOKING_TIME_CONFLICS_CASE3_ERROR),
+            ((-1, 3), BOOKING_TIME_CONFLICS_CASE1_ERROR),
+        ]
+        for (start_hour, end_hour), error_code in conflicts:
+            response = self.reserve(start_hour, end_hour)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data, {'error_code_list': [error_code]})
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_reserve_adjacent_booking(self):
+        response = self.reserve(2, 3)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.reserve(-1, 0)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(RATE_LIMITS={'SHARED_CACHE': None, 'MAX_ENTRIES': 100,
+                                    'RATES': {'reserve': {'user': '1/min'}}})
+    def test_reserve_throttled_by_user(self):
+        self.assertEqual(self.reserve(2, 3).status_code, status.HTTP_201_CREATED)
+        response = self.reserve(3, 4)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data, {'error_code_list': [REQUEST_THROTTLED_ERROR_CODE]})
+        self.assertEqual(response['Retry-After'], '60')
+        # the other booking actions are not limited
+        response = self.client.get(reverse('booking-booking_check'), {'partyroom__uid': self.room.uid})
+        self.assertNotEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_reserve_conflict_single_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.reserve(1, 3)
+        self.assertEqual(response.data, {'error_code_list': [BOOKING_TIME_CONFLICS_CASE2_ERROR]})
+        # one overlap query instead of a query per conflict case
+        booking_queries = [query for query in context.captured_queries if 'booking_booking' in query['sql']]
+        self.assertEqual(len(booking_queries), 1)
+
+
+class BookingIndexTests(APITestCase):
+    """the hot booking queries use the composite indexes (EXPLAIN on sqlite and MySQL)
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='booking_user',
+                                              password='some_password',
+                                              phone_number='+85291234512',
+                                              email='user2@example.com')
+        self.room = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+        start_time = datetime(2030, 1, 1, 12, tzinfo=utc8)
+        Booking.objects.bulk_create([Booking(partyroom=self.room,
+                                             user=self.user,
+                                             start_time=start_time + timedelta(hours=2 * i),
+                                             end_time=start_time + timedelta(hours=2 * i + 1),
+                                             status='confirm',
+                                             unit_price=10,
+                                             total_price=10) for i in range(50)])
+        self.start_time = start_time
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_reserve_query_uses_index(self):
+        queryset = get_overlapping_bookings(self.room, self.start_time, self.start_time + timedelta(hours=1))
+        self.assertUsesIndex(queryset, 'booking_room_status_time_idx')
+
+    def test_day_query_uses_index(self):
+        filterset = BookingUnavailableFilter({'partyroom__uid': self.room.uid, 'booking_date': '2030-01-02'},
+                                             queryset=Booking.objects.all())
+        self.assertUsesIndex(filterset.qs, 'booking_room_time_idx')
+
+    def test_my_bookings_query_uses_index(self):
+        queryset = Booking.objects.filter(user=self.user).order_by('start_time')
+        self.assertUsesIndex(queryset, 'booking_user_start_idx')
+
+
+class BookingAvailabilityTests(APITestCase):
+    availability_url = reverse('booking-booking_availability')
+    reserve_url = reverse('booking-booking_reserve')
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='booking_user',
+                                              password='some_password',
+                                              phone_number='+85291234512',
+                                              email='user2@example.com',
+                                              is_verified=True)
+        self.room = PartyRoom.objects.create(owner=self.user, name='small_room_1', transitionTime=15)
+        self.start_time = datetime(2030, 1, 1, 12, tzinfo=utc8)
+        # existing booking 12:00-14:00
+        self.booking = Booking.objects.create(partyroom=self.room,
+                                              user=self.user,
+                                              start_time=self.start_time,
+                                              end_time=self.start_time + timedelta(hours=2),
+                                              status='confirm',
+                                              unit_price=10,
+                                              total_price=10)
+        self.client.force_authenticate(self.user)
+
+    def get_availability(self, start_date='2030-01-01', end_date='2030-01-31'):
+        return self.client.get(self.availability_url, {'partyroom__uid': self.room.uid,
+                                                       'start_date': start_date,
+                                                       'end_date': end_date})
+
+    def test_month_availability(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_availability()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 31)
+        # the busy slot includes the transition time around the booking
+        self.assertEqual(response.data[0], {
+            'date': '2030-01-01',
+            'busy': [{'start_time': '2030-01-01T11:45', 'end_time': '2030-01-01T14:15'}],
+            'free': [{'start_time': '2030-01-01T00:00', 'end_time': '2030-01-01T11:45'},
+                     {'start_time': '2030-01-01T14:15', 'end_time': '2030-01-02T00:00'}],
+        })
+        self.assertEqual(response.data[1]['busy'], [])
+        # one range query for the whole month
+        booking_queries = [query for query in context.captured_queries if 'booking_booking' in query['sql']]
+        self.assertEqual(len(booking_queries), 1)
+
+    def test_booking_across_midnight(self):
+        Booking.objects.create(partyroom=self.room,
+                               user=self.user,
+                               start_time=self.start_time + timedelta(hours=11),
+                               end_time=self.start_time + timedelta(hours=14),
+                               status='confirm',
+                               unit_price=10,
+                               total_price=10)
+        response = self.get_availability(end_date='2030-01-02')
+        self.assertEqual(response.data[0]['busy'][-1], {'start_time': '2030-01-01T22:45', 'end_time': '2030-01-02T00:00'})
+        self.assertEqual(response.data[1]['busy'], [{'start_time': '2030-01-02T00:00', 'end_time': '2030-01-02T02:15'}])
+
+    def test_availability_cached(self):
+        self.get_availability()
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_availability()
+        self.assertEqual(len(response.data), 31)
+        booking_queries = [query for query in context.captured_queries if 'booking_booking' in query['sql']]
+        self.assertEqual(booking_queries, [])
+
+    def test_availability_invalidated(self):
+        self.get_availability()
+        data = {'partyroom': self.room.uid,
+                'start_time': (self.start_time + timedelta(days=1)).isoformat(),
+                'end_time': (self.start_time + timedelta(days=1, hours=1)).isoformat(),
+                'num_users': 2,
+                'unit_price': 10,
+                'total_price': 10}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.reserve_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.get_availability()
+        self.assertEqual(response.data[1]['busy'], [{'start_time': '2030-01-02T11:45', 'end_time': '2030-01-02T13:15'}])
+
+        # cancel
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.delete()
+        response = self.get_availability()
+        self.assertEqual(response.data[0]['busy'], [])
+
+    def test_availability_invalid_parameters(self):
+        response = self.client.get(self.availability_url, {'partyroom__uid': self.room.uid})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR, response.data['error_code_list'])
+
+        response = self.get_availability(start_date='2030-01-31', end_date='2030-01-01')
+        self.assertEqual(response.data, {'error_code_list': [BOOKING_DATE_INVALID_ERROR]})
+
+        response = self.get_availability(end_date='2030-12-31')
+        self.assertEqual(response.data, {'error_code_list': [BOOKING_DATE_RANGE_TOO_LONG_ERROR]})
+
+        response = self.client.get(self.availability_url, {'partyroom__uid': 'ZZZ',
+                                                           'start_date': '2030-01-01',
+                                                           'end_date': '2030-01-01'})
+        self.assertEqual(response.data, {'error_code_list': [BOOKING_PARTYROOM_DOES_NOT_EXIST_ERROR]})
+
+    def test_check_time_includes_overlapping_booking(self):
+        # the booking of the whole day neither starts nor ends on the booking date
+        Booking.objects.create(partyroom=self.room,
+                               user=self.user,
+                               start_time=self.start_time + timedelta(days=1),
+                               end_time=self.start_time + timedelta(days=3),
+                               status='confirm',
+                               unit_price=10,
+                               total_price=10)
+        response = self.client.get(reverse('booking-booking_check'), {'partyroom__uid': self.room.uid,
+                                                                      'booking_date': '2030-01-03'})
+        self.assertEqual(response.data, [{'start_time': '2030-01-02T12:00', 'end_time': '2030-01-04T12:00'}])
+
+
+class MyBookingListTests(APITestCase):
+    my_bookings_url = reverse('my_bookings')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='booking_user',
+                                              password='some_password',
+                                              phone_number='+85291234512',
+                                              email='user2@example.com',
+                                              is_verified=True)
+        self.rooms = [PartyRoom.objects.create(owner=self.user, name=f'small_room_{i}') for i in range(3)]
+        self.start_time = datetime(2030, 1, 1, 12, tzinfo=utc8)
+        self.client.force_authenticate(self.user)
+
+    def create_bookings(self, num_bookings):
+        # created in reverse so that the response order comes from the ordering
+        Booking.objects.bulk_create([Booking(partyroom=self.rooms[i % len(self.rooms)],
+                                             user=self.user,
+                                             start_time=self.start_time + timedelta(hours=i),
+                                             end_time=self.start_time + timedelta(hours=i, minutes=30),
+                                             status='confirm',
+                                             unit_price=10,
+                                             total_price=10) for i in reversed(range(num_bookings))])
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.my_bookings_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_my_bookings_paginated_by_start_time(self):
+        self.create_bookings(15)
+        response = self.client.get(self.my_bookings_url)
+        start_times = [booking['start_time'] for booking in response.data['results']]
+        self.assertEqual(len(start_times), 10)
+        self.assertEqual(start_times, sorted(start_times))
+        self.assertEqual(response.data['results'][0]['partyroom']['name'], 'small_room_0')
+        self.assertIn('image_cover_url', response.data['results'][0]['partyroom'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_my_bookings_same_start_time(self):
+        bookings = Booking.objects.bulk_create([Booking(partyroom=self.rooms[i % len(self.rooms)],
+                                                        user=self.user,
+                                                        start_time=self.start_time,
+                                                        end_time=self.start_time + timedelta(hours=1),
+                                                        status='confirm',
+                                                        unit_price=10,
+                                                        total_price=10) for i in range(15)])
+        uids = []
+        response = self.client.get(self.my_bookings_url)
+        uids += [booking['uid'] for booking in response.data['results']]
+        response = self.client.get(response.data['next'])
+        uids += [booking['uid'] for booking in response.data['results']]
+        # the id breaks the ties, nothing is repeated or skipped across the pages
+        self.assertEqual(sorted(uids), sorted(booking.uid for booking in bookings))
+
+    def test_my_bookings_query_count(self):
+        self.create_bookings(1)
+        num_queries = self.count_queries()
+        self.create_bookings(30)
+        # the partyrooms are joined, more bookings don't add queries
+        self.assertEqual(self.count_queries(), num_queries)
+
+
+class MyBookingsQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    def test_my_bookings(self):
+        seeder = Seeder()
+        user = seeder.create_user()
+        partyrooms = seeder.partyrooms(3)
+        self.client.force_authenticate(user)
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('my_bookings')),
+                               lambda count: seeder.bookings(user, count, partyrooms))
+
+
+class BookingBulkTests(APITestCase):
+    def setUp(self):
+        self.owner = create_user(1, is_roomer=True)
+        self.customer = create_user(2)
+        self.room = PartyRoom.objects.create(owner=self.owner, name='small_room_1')
+        self.start_time = datetime(2030, 1, 1, 12, tzinfo=utc8)
+        # existing booking 12:00-14:00
+        Booking.objects.create(partyroom=self.room, user=self.customer,
+                               start_time=self.start_time, end_time=self.start_time + timedelta(hours=2),
+                               status='confirm', unit_price=10, total_price=20)
+        self.import_url = reverse('booking_import', args=[self.room.uid])
+        self.export_url = reverse('booking_export', args=[self.room.uid])
+        self.client.force_authenticate(self.owner)
+
+    def row(self, start_hour, end_hour, **kwargs):
+        return {'start_time': (self.start_time + timedelta(hours=start_hour)).isoformat(),
+                'end_time': (self.start_time + timedelta(hours=end_hour)).isoformat(),
+                'num_users': 2, 'unit_price': 10, 'total_price': 10, **kwargs}
+
+    def csv(self, rows):
+        fields = ['user', 'start_time', 'end_time', 'status', 'num_users', 'unit_price', 'total_price']
+        return '\n'.join([','.join(fields)] + [','.join(str(row.get(field, '')) for field in fields)
+                                                for row in rows])
+
+    def import_csv(self, rows):
+        return self.client.post(self.import_url, self.csv(rows), content_type='text/csv')
+
+    def test_find_import_conflicts(self):
+        def booking(row, start_hour, end_hour):
+            return {'row': row, 'start_time': self.start_time + timedelta(hours=start_hour),
+                    'end_time': self.start_time + timedelta(hours=end_hour)}
+        existing = [(self.start_time + timedelta(hours=5), self.start_time + timedelta(hours=6))]
+        bookings = [booking(1, 0, 1), booking(2, 1, 2), booking(3, 1.5, 3), booking(4, 4, 7), booking(5, 7, 8)]
+        self.assertEqual(find_import_conflicts(bookings, existing), [
+            {'row': 2, 'error_code_list': [BOOKING_IMPORT_ROW_CONFLICTS_ERROR], 'conflicts_with': 3},
+            {'row': 3, 'error_code_list': [BOOKING_IMPORT_ROW_CONFLICTS_ERROR], 'conflicts_with': 2},
+            {'row': 4, 'error_code_list': [BOOKING_TIME_CONFLICS_CASE1_ERROR]},
+        ])
+        # adjacent bookings don't conflict
+        self.assertEqual(find_import_conflicts([booking(1, 0, 5), booking(2, 6, 7)], existing), [])
+
+    def test_import_csv(self):
+        rows = [self.row(4, 5), self.row(2, 3, user=self.owner.email.upper()), self.row(-2, 0)]
+        response = self.import_csv(rows)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'created': 3})
+        bookings = Booking.objects.filter(partyroom=self.room).order_by('start_time')
+        self.assertEqual([booking.user for booking in bookings],
+                         [self.owner, self.customer, self.owner, self.owner])
+        self.assertEqual(len({booking.uid for booking in bookings}), 4)
+
+    def test_import_user_email_case(self):
+        self.customer.email = 'Seed_User_2@Test.com'
+        self.customer.save()
+        response = self.import_csv([self.row(2, 3, user='seed_user_2@test.COM')])
+        self.assertEqual(response.data, {'created': 1})
+        self.assertEqual(Booking.objects.get(start_time=self.start_time + timedelta(hours=2)).user, self.customer)
+
+    def test_import_query_count(self):
+        def count_queries(rows):
+            with CaptureQueriesContext(connection) as context:
+                response = self.import_csv(rows)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(context.captured_queries)
+        num_queries = count_queries([self.row(3, 4, user=self.customer.email)])
+        self.assertEqual(count_queries([self.row(hour, hour + 1, user=self.customer.email)
+                                        for hour in range(10, 40)]), num_queries)
+
+    def test_import_jsonl(self):
+        body = '\n'.join(json.dumps(row) for row in [self.row(2, 3), self.row(3, 4)]) + '\n'
+        response = self.client.post(self.import_url, body, content_type='application/jsonl')
+        self.assertEqual(response.data, {'created': 2})
+
+    def test_import_rejects_all(self):
+        response = self.import_csv([self.row(2, 3), self.row(1, 3), self.row(4, 3),
+                                    self.row(5, 6, user='nobody@test.com')])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {
+            'error_code_list': [BOOKING_IMPORT_ROWS_INVALID_ERROR],
+            'rows': [{'row': 3, 'error_code_list': [BOOKING_START_TIME_GTE_END_TIME_ERROR]}],
+        })
+        response = self.import_csv([self.row(2, 3), self.row(1, 3), self.row(5, 6, user='nobody@test.com')])
+        self.assertEqual(response.data['rows'],
+                         [{'row': 3, 'error_code_list': [BOOKING_IMPORT_USER_DOES_NOT_EXIST_ERROR]}])
+        response = self.import_csv([self.row(2, 3), self.row(1, 3)])
+        self.assertEqual(response.data['rows'], [
+            {'row': 1, 'error_code_list': [BOOKING_IMPORT_ROW_CONFLICTS_ERROR], 'conflicts_with': 2},
+            {'row': 2, 'error_code_list': [BOOKING_TIME_CONFLICS_CASE2_ERROR]},
+        ])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_import_undecodable_body(self):
+        body = self.csv([self.row(2, 3)]).encode() + b'\n\xff\xfe,,,\n'
+        response = self.client.post(self.import_url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {
+            'error_code_list': [BOOKING_IMPORT_ROWS_INVALID_ERROR],
+            'rows': [{'row': 2, 'error_code_list': [BOOKING_IMPORT_ROW_INVALID_ERROR]}],
+        })
+        self.assertEqual(Booking.objects.count(), 1)
+
+    @override_settings(BOOKING_IMPORT_MAX_ROWS=2)
+    def test_import_too_many_rows(self):
+        response = self.import_csv([self.row(2, 3), self.row(3, 4), self.row(4, 5)])
+        self.assertEqual(response.data, {'error_code_list': [BOOKING_IMPORT_TOO_MANY_ROWS_ERROR]})
+
+    def test_import_owner_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.import_csv([self.row(2, 3)]).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('booking_import', args=['ZZZZ']), '', content_type='text/csv')
+        self.assertEqual(response.data, {'error_code_list': [BOOKING_PARTYROOM_DOES_NOT_EXIST_ERROR]})
+
+    def test_export(self):
+        response = self.client.get(self.export_url, {'start_date': '2030-01-01', 'end_date': '2030-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'uid,user,start_time,end_time,status,num_users,unit_price,total_price')
+        self.assertEqual(lines[1].split(',')[1:4],
+                         [self.customer.email, '2030-01-01T12:00:00+08:00', '2030-01-01T14:00:00+08:00'])
+
+        response = self.client.get(self.export_url, {'start_date': '2030-01-02', 'end_date': '2030-01-02',
+                                                     'file_format': 'jsonl'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_export_import_commands(self):
+        output = StringIO()
+        call_command('export_bookings', self.room.uid, '--start-date=2030-01-01', '--end-date=2030-01-31',
+                     '--format=jsonl', stdout=output)
+        other_room = PartyRoom.objects.create(owner=self.owner, name='small_room_2')
+        path = self.tmp_path('bookings.jsonl')
+        path.write_text(output.getvalue())
+        output = StringIO()
+        call_command('import_bookings', other_room.uid, str(path), stdout=output)
+        self.assertIn('Imported 1 bookings', output.getvalue())
+        self.assertEqual(Booking.objects.get(partyroom=other_room).user, self.customer)
+        with self.assertRaises(CommandError):
+            call_command('import_bookings', other_room.uid, str(path), stdout=output, stderr=StringIO())
+
+    def test_export_import_canceled_booking(self):
+        Booking.objects.filter(partyroom=self.room).update(status='canceled')
+        Booking.objects.create(partyroom=self.room, user=self.customer,
+                               start_time=self.start_time, end_time=self.start_time + timedelta(hours=2),
+                               status='confirm', unit_price=10, total_price=20)
+        response = self.client.get(self.export_url, {'start_date': '2030-01-01', 'end_date': '2030-01-01'})
+        body = b''.join(response.streaming_content)
+
+        other_room = PartyRoom.objects.create(owner=self.owner, name='small_room_2')
+        response = self.client.post(reverse('booking_import', args=[other_room.uid]), body, content_type='text/csv')
+        self.assertEqual(response.data, {'created': 2})
+        self.assertEqual(sorted(Booking.objects.filter(partyroom=other_room).values_list('status', flat=True)),
+                         ['canceled', 'confirm'])
+
+    def test_import_invalid_status(self):
+        response = self.import_csv([{**self.row(2, 3), 'status': 'unknown'}])
+        self.assertEqual(response.data['rows'],
+                         [{'row': 1, 'error_code_list': [BOOKING_IMPORT_STATUS_INVALID_ERROR]}])
+
+    def tmp_path(self, name):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return Path(directory.name) / name
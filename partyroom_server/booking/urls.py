@@ -10,5 +10,7 @@ router.register("", views.BookingViewSet)
 urlpatterns = [
     path('my_booking/<str:uid>', views.BookingDetailView.as_view(), name='my_booking'),
     path('my_bookings/', views.MyBookingListView.as_view(), name='my_bookings'),
+    path('import/<str:uid>', views.BookingImportView.as_view(), name='booking_import'),
+    path('export/<str:uid>', views.BookingExportView.as_view(), name='booking_export'),
     path('', include(router.urls))
 ]
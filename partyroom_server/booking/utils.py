@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Optional
+
+from error_code_list import *
+
+from .constants import BOOKING_UNAVAILABLE_STATUS
+from .models import Booking
+
+# when the new booking overlaps several bookings, the error of the lowest case is returned
+BOOKING_CONFLICT_ERRORS = (
+    BOOKING_TIME_CONFLICS_CASE1_ERROR,
+    BOOKING_TIME_CONFLICS_CASE2_ERROR,
+    BOOKING_TIME_CONFLICS_CASE3_ERROR,
+    BOOKING_TIME_CONFLICS_CASE4_ERROR,
+)
+
+def get_overlapping_bookings(partyroom, start_time: datetime, end_time: datetime):
+    """bookings of the partyroom that overlap [start_time, end_time)"""
+    return Booking.objects.filter(partyroom=partyroom,
+                                  status__in=BOOKING_UNAVAILABLE_STATUS,
+                                  start_time__lt=end_time,
+                                  end_time__gt=start_time)
+
+
+def classify_conflict(existing_start: datetime, existing_end: datetime,
+                      start_time: datetime, end_time: datetime) -> str:
+    """error code of an existing booking that overlaps the new booking"""
+    if start_time <= existing_start < end_time:
+        # case1 this booking start before an existing booking but end time is overlapped to an existing booking
+        return BOOKING_TIME_CONFLICS_CASE1_ERROR
+    elif start_time < existing_end <= end_time:
+        # case2 this booking start within an existing booking period but end after the existing booking
+        return BOOKING_TIME_CONFLICS_CASE2_ERROR
+    elif existing_start <= start_time and existing_end >= end_time:
+        # case 3 this booking is within an existing booking time period
+        return BOOKING_TIME_CONFLICS_CASE3_ERROR
+    # case 4 this booking includes an existing booking period
+    return BOOKING_TIME_CONFLICS_CASE4_ERROR
+
+
+def find_booking_conflict(partyroom, start_time: datetime, end_time: datetime) -> Optional[str]:
+    """check the new booking against the existing bookings with a single query
+
+    Args:
+        partyroom (PartyRoom): the partyroom to reserve
+        start_time (datetime): start of the new booking
+        end_time (datetime): end of the new booking
+
+    Returns:
+        Optional[str]: error code of the conflict, None if there is no conflict
+    """
+    overlapping = get_overlapping_bookings(partyroom, start_time, end_time).values_list('start_time', 'end_time')
+    conflicts = [classify_conflict(existing_start, existing_end, start_time, end_time)
+                 for existing_start, existing_end in overlapping]
+    return min(conflicts, key=BOOKING_CONFLICT_ERRORS.index) if conflicts else None
@@ -1,28 +1,42 @@
 from logging import getLogger
 
-from django.http import Http404
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from error_code_list import *
+from main.models import PartyRoom
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.generics import ListAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.generics import GenericAPIView, ListAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
+from utils.metrics import SerializerMetricsMixin
+from utils.pagination import BookingKeysetPagination
 from utils.permissions import *
+from utils.throttling import IPRateThrottle, UserRateThrottle
 
+from .availability import get_availability
+from .bulk import BookingImportError, export_bookings, import_bookings
 from .filters import BookingUnavailableFilter
 from .models import Booking
+from .parsers import BookingCSVParser, BookingJSONLinesParser
 from .serializers import (AvailableBookingListSerializer,
+                          BookingAvailabilityQuerySerializer,
+                          BookingAvailabilitySerializer,
                           BookingCancelSerializer, BookingDetailSerializer,
-                          BookingListSerializer, BookingReserveSerializer)
+                          BookingExportQuerySerializer, BookingListSerializer,
+                          BookingReserveSerializer)
 
 logger = getLogger(__name__)
 
-class BookingViewSet(GenericViewSet):
+class BookingViewSet(SerializerMetricsMixin, GenericViewSet):
     queryset = Booking.objects.all()
     permission_classes = (IsAuthenticated, SafelistPermission, IsVerifiedUser,)
+    # set by the throttled actions
+    throttle_scope = None
     filter_backends = (DjangoFilterBackend,)
     filter_class = BookingUnavailableFilter
 
@@ -33,6 +47,8 @@ class BookingViewSet(GenericViewSet):
             return BookingReserveSerializer
         elif self.action =='check_time':
             return AvailableBookingListSerializer
+        elif self.action == 'availability':
+            return BookingAvailabilitySerializer
     
     @extend_schema(responses=AvailableBookingListSerializer(many=True))    
     @action(methods=['get'], detail=False, url_name='booking_check')
@@ -46,18 +62,35 @@ class BookingViewSet(GenericViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)        
 
-    @action(['post'], detail=False, url_name='booking_reserve')
+    @extend_schema(parameters=[BookingAvailabilityQuerySerializer],
+                   responses=BookingAvailabilitySerializer(many=True))
+    @action(methods=['get'], detail=False, url_name='booking_availability')
+    def availability(self, request, *args, **kwargs):
+        # free and busy slots of each day in [start_date, end_date], e.g. a month calendar
+        query_serializer = BookingAvailabilityQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        availability = get_availability(query_serializer.validated_data['partyroom__uid'],
+                                        query_serializer.validated_data['start_date'],
+                                        query_serializer.validated_data['end_date'])
+        serializer = self.get_serializer(availability, many=True)
+        return Response(serializer.data)
+
+    @action(['post'], detail=False, url_name='booking_reserve',
+            throttle_classes=(IPRateThrottle, UserRateThrottle), throttle_scope='reserve')
     def reserve(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        # the partyroom is locked during validation, the conflict check and the
+        # insert must be in the same transaction
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class BookingDetailView(RetrieveUpdateDestroyAPIView):
+class BookingDetailView(SerializerMetricsMixin, RetrieveUpdateDestroyAPIView):
     queryset = Booking.objects.all()
     serializer_class = BookingDetailSerializer
     permission_classes = (IsAuthenticated, SafelistPermission,IsBookingOwnerOrStaff, IsVerifiedUser)
@@ -75,10 +108,56 @@ class BookingDetailView(RetrieveUpdateDestroyAPIView):
             raise e   
     
 
-class MyBookingListView(ListAPIView):
+class MyBookingListView(SerializerMetricsMixin, ListAPIView):
     serializer_class = BookingListSerializer
     permission_classes = (IsAuthenticated, SafelistPermission, IsVerifiedUser, )
+    pagination_class = BookingKeysetPagination
     
     def get_queryset(self):
         user = self.request.user
-        return Booking.objects.filter(user=user)
+        # the partyroom is joined instead of loaded per booking
+        return Booking.objects.filter(user=user).select_related('partyroom')
+
+
+class PartyRoomBookingsMixin:
+    queryset = PartyRoom.objects.all()
+    permission_classes = (IsAuthenticated, SafelistPermission, IsVerifiedUser, IsPartyRoomOwnerOrStaff)
+    lookup_field = 'uid'
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Http404):
+            return Response({'error_code_list': [BOOKING_PARTYROOM_DOES_NOT_EXIST_ERROR]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return super().handle_exception(exc)
+
+
+class BookingImportView(PartyRoomBookingsMixin, GenericAPIView):
+    """create the bookings of a CSV or JSON lines body for the partyroom of its owner
+
+    The whole file is rejected when a row is invalid or overlaps an existing
+    booking or another row.
+    """
+    parser_classes = (BookingCSVParser, BookingJSONLinesParser)
+
+    def post(self, request, *args, **kwargs):
+        partyroom = self.get_object()
+        try:
+            created = import_bookings(partyroom, request.data, request.user, settings.BOOKING_IMPORT_MAX_ROWS)
+        except BookingImportError as error:
+            return Response(error.as_data(), status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+
+
+class BookingExportView(PartyRoomBookingsMixin, GenericAPIView):
+    """stream the bookings of the partyroom on the given dates as CSV or JSON lines"""
+    def get(self, request, *args, **kwargs):
+        partyroom = self.get_object()
+        query_serializer = BookingExportQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        data = query_serializer.validated_data
+        lines = export_bookings(partyroom, data['start_date'], data['end_date'], data['file_format'])
+        content_type = 'text/csv' if data['file_format'] == 'csv' else 'application/jsonl'
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = (f'attachment; filename="{partyroom.uid}_{data["start_date"]}_'
+                                           f'{data["end_date"]}.{data["file_format"]}"')
+        return response
@@ -61,10 +61,14 @@ PARTY_ROOM_DOES_NOT_EXIST_ERROR = 'ERROR-4200'
 PARTY_ROOM_UID_DOES_NOT_INCLUDE_ERROR = 'ERROR-4201'
 PARTY_ROOM_UID_FIELD_EMPTY_ERROR = 'ERROR-4202'
 PARTY_ROOM_UID_NOT_IN_USER_FAVOURITES_ERROR = 'ERROR-4203'
+PARTY_ROOM_SEARCH_QUERY_EMPTY_ERROR = 'ERROR-4204'
+PARTY_ROOM_TOO_MANY_UIDS_ERROR = 'ERROR-4205'
+PARTY_ROOM_IMAGE_SIZE_INVALID_ERROR = 'ERROR-4206'
 
 # Booking Error
 BOOKING_PARTYROOM_DOES_NOT_EXIST_ERROR = 'ERROR-4300'
 BOOKING_DATE_INVALID_ERROR = 'ERROR-4301'
+BOOKING_DATE_RANGE_TOO_LONG_ERROR = 'ERROR-4302'
 BOOKING_START_TIME_GTE_END_TIME_ERROR = 'ERROR-4310'
 BOOKING_START_TIME_INVALID_ERROR = 'ERROR-4311'
 BOOKING_END_TIME_INVALID_ERROR = 'ERROR-4312'
@@ -88,9 +92,21 @@ BOOKING_CHECK_TIME_PARAMETER_MISSING_ERROR = 'ERROR-4399'
 BOOKING_UID_DOES_NOT_EXIST_ERROR = 'ERROR-4350'
 BOOKING_UID_TYPE_ERROR = 'ERROR-4351'
 
+# Booking Import Error
+BOOKING_IMPORT_ROWS_INVALID_ERROR = 'ERROR-4360'
+BOOKING_IMPORT_TOO_MANY_ROWS_ERROR = 'ERROR-4361'
+BOOKING_IMPORT_ROW_INVALID_ERROR = 'ERROR-4362'
+BOOKING_IMPORT_USER_DOES_NOT_EXIST_ERROR = 'ERROR-4363'
+BOOKING_IMPORT_ROW_CONFLICTS_ERROR = 'ERROR-4364'
+BOOKING_FILE_FORMAT_INVALID_ERROR = 'ERROR-4365'
+BOOKING_IMPORT_STATUS_INVALID_ERROR = 'ERROR-4366'
+
 # Authorization
 CREDENTIALS_INVALID_ERRORS = 'ERROR-4400'
 
+# Rate Limit
+REQUEST_THROTTLED_ERROR_CODE = 'ERROR-4600'
+
 # Review
 SINGLE_REVIEW_ONLY_ERROR_CODE = 'ERROR-4500'
 REVIEW_BOOKING_DOES_NOT_EXIST_ERROR_CODE = 'ERROR-4501'
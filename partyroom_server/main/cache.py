@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework.response import Response
+
+logger = getLogger(__name__)
+
+GENERATION_KEY = 'partyroom:catalogue:generation'
+
+
+class CatalogueCache:
+    """LRU cache with a timeout of the serialized catalogue responses
+
+    The entries live in the memory of the process. With a shared Django cache
+    the entries are also stored there, and clearing bumps a generation number
+    so that the other processes drop their entries too.
+    """
+    def __init__(self, max_entries: int, timeout: int, shared_cache: Optional[str] = None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        self.lock = threading.Lock()
+        # key -> (expire time, value), least recently used first
+        self.entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.generation = 0
+        self.hits = self.misses = self.evictions = self.shared_hits = 0
+
+    def get_shared_key(self, generation: int, key: str) -> str:
+        # the request keys may contain characters that memcached doesn't accept
+        return f'partyroom:catalogue:{generation}:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def _sync_generation(self) -> int:
+        """clear the local entries when another process has cleared the cache"""
+        if self.shared_cache is None:
+            return self.generation
+        generation = self.shared_cache.get_or_set(GENERATION_KEY, 0, None)
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+        return generation
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            generation = self._sync_generation()
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+        value = None
+        if self.shared_cache is not None:
+            value = self.shared_cache.get(self.get_shared_key(generation, key))
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+                self._set_local(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self.lock:
+            self._set_local(key, value)
+            generation = self.generation
+        if self.shared_cache is not None:
+            self.shared_cache.set(self.get_shared_key(generation, key), value, self.timeout)
+
+    def _set_local(self, key: str, value: Any) -> None:
+        self.entries[key] = (time.monotonic() + self.timeout, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            if self.shared_cache is not None:
+                # entries of the old generation are left to expire
+                try:
+                    self.generation = self.shared_cache.incr(GENERATION_KEY)
+                except ValueError:
+                    self.shared_cache.set(GENERATION_KEY, self.generation + 1, None)
+                    self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def create_catalogue_cache() -> CatalogueCache:
+    options = settings.PARTYROOM_CATALOGUE_CACHE
+    return CatalogueCache(options['MAX_ENTRIES'], options['TIMEOUT'], options.get('SHARED_CACHE'))
+
+
+catalogue_cache = create_catalogue_cache()
+
+
+@receiver(setting_changed)
+def reset_catalogue_cache(setting, **kwargs):
+    global catalogue_cache
+    if setting == 'PARTYROOM_CATALOGUE_CACHE':
+        catalogue_cache = create_catalogue_cache()
+
+
+def get_catalogue_cache() -> CatalogueCache:
+    return catalogue_cache
+
+
+def clear_catalogue_cache(using=None) -> None:
+    get_catalogue_cache().clear()
+    # again after commit, a concurrent request may have cached the old rows in between
+    transaction.on_commit(lambda: get_catalogue_cache().clear(), using=using)
+
+
+def get_catalogue_cache_key(request) -> str:
+    # the host is part of the key, the payloads contain absolute urls
+    query = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    return f'{request.get_host()}{request.path}?{query}'
+
+
+class CatalogueCacheMixin:
+    """serve the successful GET responses of the view from the catalogue cache
+    """
+    def get_catalogue_cache_key(self, request) -> str:
+        return get_catalogue_cache_key(request)
+
+    def get(self, request, *args, **kwargs):
+        cache = get_catalogue_cache()
+        key = self.get_catalogue_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+        return response
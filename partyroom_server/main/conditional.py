@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from .models import PartyRoom
+from .utils import get_image_mtime
+
+
+def get_partyroom_validators(request, uid: str) -> Tuple[Optional[str], Optional[datetime]]:
+    """ETag and last modified time of the partyroom detail
+
+    They come from the version counter of the partyroom and the mtime of its
+    cover, without loading or serializing the partyroom. Both are computed once
+    per request.
+
+    Args:
+        request: the request of the detail
+        uid (str): uid of the partyroom
+
+    Returns:
+        Tuple[Optional[str], Optional[datetime]]: (None, None) if the partyroom doesn't exist
+    """
+    validators = getattr(request, '_partyroom_validators', None)
+    if validators is None:
+        row = PartyRoom.objects.filter(uid=uid).values_list('version', 'updated_at').first()
+        if row is None:
+            validators = (None, None)
+        else:
+            version, updated_at = row
+            mtime = get_image_mtime(uid) or 0
+            validators = (f'"{uid}-{version}-{int(mtime)}"',
+                          max(updated_at, datetime.fromtimestamp(mtime, timezone.utc)))
+        request._partyroom_validators = validators
+    return validators
+
+
+def partyroom_etag(request, uid, *args, **kwargs) -> Optional[str]:
+    return get_partyroom_validators(request, uid)[0]
+
+
+def partyroom_last_modified(request, uid, *args, **kwargs) -> Optional[datetime]:
+    return get_partyroom_validators(request, uid)[1]
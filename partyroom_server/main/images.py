@@ -0,0 +1,70 @@
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from PIL import Image
+
+from .cache import clear_catalogue_cache
+from .utils import get_image_cover_path
+
+logger = logging.getLogger(__name__)
+
+# (max width, max height) of each generated size, None serves the uploaded file
+IMAGE_SIZES = {
+    'list': (480, 360),
+    'detail': (1280, 960),
+    'original': None,
+}
+THUMBNAIL_QUALITY = 85
+
+
+def get_thumbnail_path(uid: str, size: str) -> Path:
+    return settings.PARTYROOM_THUMBNAIL_URL / size / f'{uid}.jpg'
+
+
+def generate_thumbnail(uid: str, size: str) -> Optional[Path]:
+    """generate the thumbnail of the given size once and return its path
+
+    The thumbnail is regenerated only when the uploaded cover is newer than it.
+
+    Args:
+        uid (str): uid of the cover image
+        size (str): one of IMAGE_SIZES
+
+    Returns:
+        Optional[Path]: path of the image to serve, None if the cover doesn't exist
+    """
+    source_path = get_image_cover_path(uid)
+    if source_path is None or IMAGE_SIZES[size] is None:
+        return source_path
+
+    thumbnail_path = get_thumbnail_path(uid, size)
+    try:
+        if thumbnail_path.stat().st_mtime >= source_path.stat().st_mtime:
+            return thumbnail_path
+    except FileNotFoundError:
+        pass
+
+    thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temp file first so that a concurrent request never serves a partial image
+    temp_path = thumbnail_path.with_name(f'{thumbnail_path.stem}.{os.getpid()}.tmp')
+    with Image.open(source_path) as image:
+        image = image.convert('RGB')
+        image.thumbnail(IMAGE_SIZES[size])
+        image.save(temp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(temp_path, thumbnail_path)
+    # a new cover, the cached catalogue still has the old image_cover_last_mt
+    clear_catalogue_cache()
+    logger.debug('generated %s thumbnail of %s', size, uid)
+    return thumbnail_path
+
+
+def generate_thumbnails(uid: str) -> None:
+    for size in IMAGE_SIZES:
+        generate_thumbnail(uid, size)
+
+
+def compute_image_etag(uid: str, size: str, mtime: float) -> str:
+    return f'"{uid}-{size}-{int(mtime)}"'
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.images import generate_thumbnails
+from main.models import PartyRoom
+from main.utils import DEFAULT_IMAGE_UID
+
+
+class Command(BaseCommand):
+    help = 'Generate the thumbnails of the partyroom covers that are missing or outdated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('uids', nargs='*', help='partyroom uids, all partyrooms if not given')
+
+    def handle(self, *args, **options):
+        uids = options['uids'] or list(PartyRoom.objects.values_list('uid', flat=True))
+        for uid in [DEFAULT_IMAGE_UID, *uids]:
+            generate_thumbnails(uid)
+        self.stdout.write(self.style.SUCCESS(f'Checked the thumbnails of {len(uids)} partyrooms'))
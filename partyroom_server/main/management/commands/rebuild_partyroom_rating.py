@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.cache import clear_catalogue_cache
+from main.models import PartyRoom
+from reviews.models import PartyRoomReview
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating aggregate stored on every partyroom from its reviews'
+
+    def handle(self, *args, **options):
+        reviews = PartyRoomReview.objects.filter(partyroom=OuterRef('pk')).order_by().values('partyroom')
+        rating_sum = reviews.annotate(total=Sum('rating')).values('total')
+        rating_count = reviews.annotate(total=Count('pk')).values('total')
+
+        with transaction.atomic():
+            updated = PartyRoom.objects.update(
+                rating_sum=Coalesce(Subquery(rating_sum, output_field=IntegerField()), 0),
+                rating_count=Coalesce(Subquery(rating_count, output_field=IntegerField()), 0),
+                version=F('version') + 1,
+                updated_at=timezone.now(),
+            )
+            # the update sends no post_save
+            clear_catalogue_cache()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the rating of {updated} partyrooms'))
@@ -3,7 +3,8 @@ import logging
 
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import F
 from django_mysql.models import ListTextField, SizedTextField
 
 from .utils import *
@@ -11,14 +12,8 @@ from .utils import *
 logger = logging.getLogger(__name__)
 
 
-def increment_partyroom_id():
-    last_partyroom = PartyRoom.objects.all().order_by('id').last()
-    return 1 if not last_partyroom else last_partyroom.id + 1
-
-
-
 class PartyRoom(models.Model):
-    id = models.PositiveIntegerField(
+    id = models.AutoField(
         primary_key=True,
         editable=False,
     )
@@ -30,7 +25,7 @@ class PartyRoom(models.Model):
         max_length=20
     )
     uid = models.CharField(
-        max_length=3,
+        max_length=UID_MAX_LENGTH,
         unique=True
     )
     area = models.CharField(
@@ -111,6 +106,24 @@ class PartyRoom(models.Model):
     transportList = models.JSONField(
         default=dict
     )
+    # maintained with the reviews, see reviews.models.update_partyroom_rating
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    # bumped on every change of the detail, part of its ETag (see main/conditional.py)
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
     @property
     def image_cover(self) -> Optional[str]:
         try:
@@ -119,7 +132,7 @@ class PartyRoom(models.Model):
                 with open(image_path, 'rb') as f:
                     return base64.b64encode(f.read()).decode()
             else:
-                temp_image_path = get_image_cover_path('YUX')
+                temp_image_path = get_image_cover_path(DEFAULT_IMAGE_UID)
                 with open(temp_image_path, 'rb') as f:
                     return base64.b64encode(f.read()).decode()
                  
@@ -129,7 +142,9 @@ class PartyRoom(models.Model):
 
     @property
     def rating_stars(self) -> float:
-        return cal_rating(self.id)
+        if self.rating_count == 0:
+            return 0
+        return self.rating_sum / self.rating_count
     
     @property
     def image_cover_last_mt(self) -> datetime:
@@ -139,11 +154,40 @@ class PartyRoom(models.Model):
         return self.name
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        if not self.id:
-            self.id = increment_partyroom_id()
         if not self.uid:
-            self.uid = id_generator()
-            while PartyRoom.objects.filter(uid=self.uid).exists():
-                self.uid = id_generator()
-        super(PartyRoom, self).save(force_insert=False, force_update=False, using=None,
-                                    update_fields=None)
+            from .uids import allocate_partyroom_uids
+            self.uid = allocate_partyroom_uids(1, using or DEFAULT_DB_ALIAS)[0]
+        if update_fields is not None and not update_fields:
+            # nothing is saved
+            return
+        adding = self._state.adding
+        if adding:
+            self.version += 1
+        else:
+            # the ratings bump the version in the database, an instance may hold an old one
+            self.version = F('version') + 1
+        if update_fields:
+            # the version and the Last-Modified of the ETag change with the fields
+            update_fields = {*update_fields, 'version', 'updated_at'}
+        super(PartyRoom, self).save(force_insert=force_insert, force_update=force_update, using=using,
+                                    update_fields=update_fields)
+        if not adding:
+            self.refresh_from_db(using=using, fields=['version', 'updated_at'])
+
+
+class Sequence(models.Model):
+    """named counters that concurrent transactions take distinct values from"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next_values(cls, name: str, count: int = 1, using: str = DEFAULT_DB_ALIAS) -> range:
+        """take the next count values of the sequence, starting from 0"""
+        sequences = cls.objects.using(using)
+        with transaction.atomic(using=using):
+            # the update locks the row until the end of the transaction
+            if not sequences.filter(name=name).update(value=F('value') + count):
+                sequences.get_or_create(name=name)
+                sequences.filter(name=name).update(value=F('value') + count)
+            value = sequences.get(name=name).value
+        return range(value - count, value)
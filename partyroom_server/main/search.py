@@ -0,0 +1,314 @@
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from logging import getLogger
+from typing import Dict, List, Optional, Set
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import PartyRoom
+
+logger = getLogger(__name__)
+
+# a match in the name ranks higher than a match in the description
+NAME_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+MAX_QUERY_TERMS = 10
+SEARCH_FIELDS = ('name', 'shortDesp', 'description', 'venueFaciList', 'boardgameList')
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r'\w+', text.lower())
+
+
+def get_search_document(partyroom) -> Dict[str, str]:
+    """the searchable text of the partyroom, split into the name and the body"""
+    body = [partyroom.shortDesp or '', partyroom.description or '',
+            *(partyroom.venueFaciList or []), *(partyroom.boardgameList or [])]
+    return {'name': partyroom.name or '', 'body': ' '.join(body)}
+
+
+class SearchBackend:
+    """keeps an inverted index of the partyrooms and returns ranked partyroom ids
+
+    Without an index, the partyrooms whose name contains every term of the
+    query are returned by id. Used for the databases without a full-text index
+    of their own, it is the same for all the workers.
+    """
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def setup(self) -> None:
+        pass
+
+    def index(self, partyroom) -> None:
+        pass
+
+    def remove(self, partyroom_id: int) -> None:
+        pass
+
+    def rebuild(self) -> int:
+        return PartyRoom.objects.using(self.using).count()
+
+    def search(self, query: str, limit: int) -> List[int]:
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        partyrooms = PartyRoom.objects.using(self.using)
+        for term in terms:
+            partyrooms = partyrooms.filter(name__icontains=term)
+        return list(partyrooms.order_by('pk').values_list('pk', flat=True)[:limit])
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 virtual table keyed by the partyroom id, ranked by bm25
+    """
+    table = 'main_partyroom_search'
+
+    def setup(self) -> None:
+        connection = connections[self.using]
+        if self.table in connection.introspection.table_names():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE VIRTUAL TABLE {self.table} USING fts5(name, body, tokenize='unicode61')")
+        self.rebuild()
+
+    def index(self, partyroom) -> None:
+        document = get_search_document(partyroom)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [partyroom.pk])
+            cursor.execute(f'INSERT INTO {self.table} (rowid, name, body) VALUES (%s, %s, %s)',
+                           [partyroom.pk, document['name'], document['body']])
+
+    def remove(self, partyroom_id: int) -> None:
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [partyroom_id])
+
+    def rebuild(self) -> int:
+        partyrooms = PartyRoom.objects.using(self.using).only('pk', *SEARCH_FIELDS).iterator()
+        rows = []
+        for partyroom in partyrooms:
+            document = get_search_document(partyroom)
+            rows.append((partyroom.pk, document['name'], document['body']))
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, name, body) VALUES (%s, %s, %s)', rows)
+        return len(rows)
+
+    def search(self, query: str, limit: int) -> List[int]:
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        # every term must match, as a prefix
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                           f'ORDER BY bm25({self.table}, %s, %s) LIMIT %s',
+                           [match, NAME_WEIGHT, BODY_WEIGHT, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLFullTextBackend(SearchBackend):
+    """FULLTEXT indexes on the partyroom table, InnoDB keeps them up to date on write
+    """
+    name_index = 'partyroom_name_fulltext_idx'
+    document_index = 'partyroom_search_fulltext_idx'
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        super().__init__(using)
+        # the words InnoDB doesn't index, read on the first search
+        self.min_token_size: Optional[int] = None
+        self.stopwords: Optional[Set[str]] = None
+
+    def load_ignored_words(self) -> None:
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT @@innodb_ft_min_token_size, @@innodb_ft_enable_stopword, '
+                           '@@innodb_ft_server_stopword_table')
+            min_token_size, stopwords_enabled, stopword_table = cursor.fetchone()
+            stopwords = set()
+            if stopwords_enabled:
+                if stopword_table:
+                    # 'db_name/table_name'
+                    table = '.'.join(connections[self.using].ops.quote_name(name)
+                                     for name in stopword_table.split('/'))
+                else:
+                    table = 'information_schema.INNODB_FT_DEFAULT_STOPWORD'
+                cursor.execute(f'SELECT value FROM {table}')
+                stopwords = {row[0].lower() for row in cursor.fetchall()}
+        self.min_token_size, self.stopwords = min_token_size, stopwords
+
+    def get_match(self, terms: List[str]) -> str:
+        """the boolean mode query, a required word that is not indexed would match nothing"""
+        if self.stopwords is None:
+            self.load_ignored_words()
+        return ' '.join(f'+{term}*' for term in terms
+                        if len(term) >= self.min_token_size and term not in self.stopwords)
+
+    def get_columns(self, fields) -> str:
+        connection = connections[self.using]
+        return ', '.join(connection.ops.quote_name(PartyRoom._meta.get_field(field).column) for field in fields)
+
+    def setup(self) -> None:
+        connection = connections[self.using]
+        table = PartyRoom._meta.db_table
+        with connection.cursor() as cursor:
+            for index, fields in ((self.name_index, ('name',)), (self.document_index, SEARCH_FIELDS)):
+                cursor.execute('SELECT 1 FROM information_schema.statistics '
+                               'WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s',
+                               [table, index])
+                if cursor.fetchone() is None:
+                    cursor.execute(f'ALTER TABLE {connection.ops.quote_name(table)} '
+                                   f'ADD FULLTEXT INDEX {index} ({self.get_columns(fields)})')
+
+    def search(self, query: str, limit: int) -> List[int]:
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        match = self.get_match(terms)
+        if not match:
+            return []
+        connection = connections[self.using]
+        table = connection.ops.quote_name(PartyRoom._meta.db_table)
+        name_columns, document_columns = self.get_columns(('name',)), self.get_columns(SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {table} '
+                           f'WHERE MATCH ({document_columns}) AGAINST (%s IN BOOLEAN MODE) '
+                           f'ORDER BY MATCH ({name_columns}) AGAINST (%s IN BOOLEAN MODE) * %s '
+                           f'+ MATCH ({document_columns}) AGAINST (%s IN BOOLEAN MODE) * %s DESC, id '
+                           f'LIMIT %s',
+                           [match, match, NAME_WEIGHT, match, BODY_WEIGHT, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MemorySearchBackend(SearchBackend):
+    """inverted index in the memory of the process, built on the first search
+
+    Only the saves of this process are applied, used for development on a
+    SQLite without FTS5.
+    """
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        super().__init__(using)
+        self.lock = threading.Lock()
+        self.built = False
+        # partyroom id -> weighted term frequency
+        self.documents: Dict[int, Counter] = {}
+        self.postings: Dict[str, set] = defaultdict(set)
+        # sorted terms for the prefix lookup
+        self.vocabulary: List[str] = []
+
+    def get_term_weights(self, partyroom) -> Counter:
+        document = get_search_document(partyroom)
+        weights = Counter()
+        for term in tokenize(document['name']):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(document['body']):
+            weights[term] += BODY_WEIGHT
+        return weights
+
+    def _remove(self, partyroom_id: int) -> None:
+        for term in self.documents.pop(partyroom_id, ()):
+            self.postings[term].discard(partyroom_id)
+
+    def _index(self, partyroom) -> None:
+        self._remove(partyroom.pk)
+        weights = self.get_term_weights(partyroom)
+        self.documents[partyroom.pk] = weights
+        for term in weights:
+            if not self.postings[term]:
+                index = bisect_left(self.vocabulary, term)
+                if index == len(self.vocabulary) or self.vocabulary[index] != term:
+                    insort(self.vocabulary, term)
+            self.postings[term].add(partyroom.pk)
+
+    def _ensure_built(self) -> None:
+        if not self.built:
+            self.documents.clear()
+            self.postings.clear()
+            self.vocabulary.clear()
+            for partyroom in PartyRoom.objects.using(self.using).only('pk', *SEARCH_FIELDS).iterator():
+                self._index(partyroom)
+            self.built = True
+
+    def index(self, partyroom) -> None:
+        # the index is not transactional, only apply committed changes
+        transaction.on_commit(lambda: self._apply(self._index, partyroom), using=self.using)
+
+    def remove(self, partyroom_id: int) -> None:
+        transaction.on_commit(lambda: self._apply(self._remove, partyroom_id), using=self.using)
+
+    def _apply(self, function, arg) -> None:
+        with self.lock:
+            if self.built:
+                function(arg)
+
+    def rebuild(self) -> int:
+        with self.lock:
+            self.built = False
+            self._ensure_built()
+            return len(self.documents)
+
+    def expand_prefix(self, prefix: str) -> List[str]:
+        terms = []
+        for term in self.vocabulary[bisect_left(self.vocabulary, prefix):]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int) -> List[int]:
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        with self.lock:
+            self._ensure_built()
+            scores, matched = Counter(), None
+            for prefix in terms:
+                ids = set()
+                for term in self.expand_prefix(prefix):
+                    postings = self.postings[term]
+                    idf = math.log(1 + len(self.documents) / len(postings)) if postings else 0
+                    for partyroom_id in postings:
+                        scores[partyroom_id] += self.documents[partyroom_id][term] * idf
+                    ids |= postings
+                # every term must match
+                matched = ids if matched is None else matched & ids
+            return sorted(matched, key=lambda partyroom_id: (-scores[partyroom_id], partyroom_id))[:limit]
+
+
+_backends: Dict[str, SearchBackend] = {}
+
+
+def get_search_backend(using: str = DEFAULT_DB_ALIAS) -> SearchBackend:
+    """the full-text index of the database, the partyroom names if it has none
+
+    A SQLite without FTS5 is a development database, its single process
+    keeps the index in memory.
+    """
+    if using not in _backends:
+        connection = connections[using]
+        if connection.vendor == 'sqlite':
+            backend_class = SQLiteFTSBackend if sqlite_has_fts5(using) else MemorySearchBackend
+        elif connection.vendor == 'mysql':
+            backend_class = MySQLFullTextBackend
+        else:
+            backend_class = SearchBackend
+        _backends[using] = backend_class(using)
+    return _backends[using]
+
+
+def sqlite_has_fts5(using: str) -> bool:
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def search_partyrooms(query: str, limit: int, using: str = DEFAULT_DB_ALIAS) -> List[int]:
+    """ids of the partyrooms matching every term of the query, best match first"""
+    return get_search_backend(using).search(query, limit)
+
+
+def setup_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver that creates the full-text index"""
+    get_search_backend(using).setup()
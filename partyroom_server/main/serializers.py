@@ -1,8 +1,9 @@
+from django.urls import reverse
 from error_code_list import *
 from rest_framework import serializers
 
 from .models import PartyRoom
-from .utils import DISTRICT_CHOICES
+from .utils import DISTRICT_CHOICES, UID_MAX_LENGTH, UID_MIN_LENGTH, get_image_last_update_time
 
 
 class DistrictChoiceField(serializers.ChoiceField):
@@ -23,17 +24,72 @@ class PartyRoomBriefSerializer(serializers.ModelSerializer):
             'name',
         ]
 
-class PartyRoomBriefImageSerializer(serializers.ModelSerializer):
+class ImageCoverURLSerializer(serializers.Serializer):
+    """fields that link to the cover image instead of inlining it in base64
+    """
+    image_cover_url = serializers.SerializerMethodField()
+    image_cover_last_mt = serializers.SerializerMethodField()
+
+    def get_image_cover_url(self, obj) -> str:
+        size = self.context.get('image_cover_size', self.image_cover_size)
+        url = reverse('partyroom_image', kwargs={'uid': obj.uid, 'size': size})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def get_image_cover_last_mt(self, obj):
+        # the context is shared by the whole response, each image is looked up once
+        last_update_times = self.context.setdefault('image_cover_last_mt', {})
+        if obj.uid not in last_update_times:
+            last_modify = get_image_last_update_time(obj.uid)
+            last_update_times[obj.uid] = None if last_modify is None else last_modify.isoformat()
+        return last_update_times[obj.uid]
+
+
+class PartyRoomBriefImageSerializer(ImageCoverURLSerializer, serializers.ModelSerializer):
+    image_cover_size = 'list'
+
     class Meta:
         model = PartyRoom
         fields =(
             'uid',
             'name',
-            'image_cover',
+            'image_cover_url',
+            'image_cover_last_mt',
             )
-        
-class PartyRoomSerializer(serializers.ModelSerializer):
+
+
+class PartyRoomImageURLSerializer(ImageCoverURLSerializer, serializers.ModelSerializer):
+    image_cover_size = 'list'
+
+    class Meta:
+        model = PartyRoom
+        fields = (
+            'uid',
+            'image_cover_url',
+            'image_cover_last_mt',
+        )
+
+
+class PartyRoomCompactSerializer(ImageCoverURLSerializer, serializers.ModelSerializer):
+    # needs the rating annotation, see accounts.views.UserFavouriteListView
+    district = DistrictChoiceField(choices=DISTRICT_CHOICES, read_only=True)
+    rating = serializers.FloatField(read_only=True)
+    image_cover_size = 'list'
+
+    class Meta:
+        model = PartyRoom
+        fields = (
+            'uid',
+            'name',
+            'district',
+            'rating',
+            'image_cover_url',
+        )
+
+
+class PartyRoomSerializer(ImageCoverURLSerializer, serializers.ModelSerializer):
     district = DistrictChoiceField(choices=DISTRICT_CHOICES)
+    image_cover_size = 'list'
 
     class Meta:
         model = PartyRoom
@@ -45,10 +101,11 @@ class PartyRoomSerializer(serializers.ModelSerializer):
             'shortDesp',
             'minNumUsers',
             'maxNumUsers',
-            'image_cover',
+            'image_cover_url',
+            'image_cover_last_mt',
             'rating_stars'
         )
-        read_only_fields = ('image_cover', 'rating_stars',)
+        read_only_fields = ('rating_stars',)
 
 
 class PartyRoomDetailSerializer(serializers.ModelSerializer):
@@ -169,7 +226,7 @@ class PartyRoomFavouriteSerializer(serializers.ModelSerializer):
         fields = ('uid',)
 
 class PartyRoomImageGetSerializer(serializers.ModelSerializer):
-    uid = serializers.CharField(max_length=3, min_length=3, write_only=True)
+    uid = serializers.CharField(max_length=UID_MAX_LENGTH, min_length=UID_MIN_LENGTH, write_only=True)
     class Meta:
         model = PartyRoom
         fields = ('uid', 'image_cover',)
@@ -177,7 +234,8 @@ class PartyRoomImageGetSerializer(serializers.ModelSerializer):
         
     def validate_uid(self, value):
         try:
-            partyroom = PartyRoom.objects.get(uid=value)
+            # kept for the view, the partyroom is only queried once
+            self.partyroom = PartyRoom.objects.get(uid=value)
             return value
         
         except PartyRoom.DoesNotExist:
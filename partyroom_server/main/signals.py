@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import clear_catalogue_cache
+from .models import PartyRoom
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=PartyRoom)
+@receiver(post_delete, sender=PartyRoom)
+def invalidate_catalogue_cache(sender, using, **kwargs):
+    clear_catalogue_cache(using)
+
+
+@receiver(post_save, sender=PartyRoom)
+def index_partyroom(sender, instance, using, **kwargs):
+    get_search_backend(using).index(instance)
+
+
+@receiver(post_delete, sender=PartyRoom)
+def remove_partyroom_from_index(sender, instance, using, **kwargs):
+    get_search_backend(using).remove(instance.pk)
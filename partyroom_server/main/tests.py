@@ -1,14 +1,39 @@
+import atexit
 import json
+import logging
+import sys
+import tempfile
+from datetime import datetime
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
 from accounts.models import CustomUser
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 from error_code_list import *
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.authtoken.models import Token
+from django.test import SimpleTestCase
 from rest_framework.test import APITestCase
 
-from .models import PartyRoom
+from reviews.models import update_partyroom_rating
+from utils.log import JsonFormatter, QueueListenerHandler, RateLimitFilter
+from utils.metrics import registry
+from utils.testing import QueryBudgetTestMixin, Seeder
+
+from .cache import CatalogueCache, get_catalogue_cache
+from .images import generate_thumbnails, get_thumbnail_path
+from .models import PartyRoom, Sequence
+from .search import (MemorySearchBackend, MySQLFullTextBackend, SearchBackend, SQLiteFTSBackend,
+                     get_search_backend)
 from .serializers import PartyRoomSerializer
+from .uids import UID_SEQUENCE, allocate_partyroom_uids, get_uid, permute
 
 small_room_1_data = {"name": "small_room_1",
                 "ratingStars": 10,
@@ -364,3 +389,557 @@ class PartyRoomUnauthorizedTest(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
         response = self.client.post(self.create_url, big_room_1_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PartyRoomImageTests(APITestCase):
+    list_url = reverse('get_all_partyrooms')
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        image_dir = Path(temp_dir.name)
+        settings_override = override_settings(PARTYROOM_IMAGE_URL=image_dir,
+                                              PARTYROOM_THUMBNAIL_URL=image_dir / 'thumbnails')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+        self.partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+        Image.new('RGB', (2000, 1500), 'red').save(image_dir / f'{self.partyroom.uid}.jpg')
+        self.image_url = reverse('partyroom_image', kwargs={'uid': self.partyroom.uid, 'size': 'list'})
+
+    def test_list_partyroom_links_image(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        partyroom_data = response.data['results'][0]
+        self.assertNotIn('image_cover', partyroom_data)
+        self.assertTrue(partyroom_data['image_cover_url'].endswith(self.image_url))
+        self.assertIsNotNone(partyroom_data['image_cover_last_mt'])
+
+    def test_get_thumbnail(self):
+        response = self.client.get(self.image_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with Image.open(get_thumbnail_path(self.partyroom.uid, 'list')) as thumbnail:
+            self.assertLessEqual(thumbnail.width, 480)
+            self.assertLessEqual(thumbnail.height, 360)
+
+        # the client already has the latest image
+        response = self.client.get(self.image_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_original(self):
+        response = self.client.get(reverse('partyroom_image_original', kwargs={'uid': self.partyroom.uid}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age', response['Cache-Control'])
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (2000, 1500))
+
+    def test_batch_images(self):
+        other_partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_2')
+        batch_url = reverse('partyroom_images')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(batch_url, {'uids': f'{other_partyroom.uid},ZZZ,{self.partyroom.uid}',
+                                                   'size': 'detail'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), 1)
+        # in the requested order, without the unknown uid
+        self.assertEqual([image['uid'] for image in response.data], [other_partyroom.uid, self.partyroom.uid])
+        detail_url = reverse('partyroom_image', kwargs={'uid': self.partyroom.uid, 'size': 'detail'})
+        self.assertTrue(response.data[1]['image_cover_url'].endswith(detail_url))
+        self.assertIsNotNone(response.data[1]['image_cover_last_mt'])
+
+    def test_batch_images_invalid(self):
+        batch_url = reverse('partyroom_images')
+        for params, error_code in (({}, PARTY_ROOM_UID_FIELD_EMPTY_ERROR),
+                                   ({'uids': ','.join(['ABC'] * 101)}, PARTY_ROOM_TOO_MANY_UIDS_ERROR),
+                                   ({'uids': 'ABC', 'size': 'huge'}, PARTY_ROOM_IMAGE_SIZE_INVALID_ERROR)):
+            response = self.client.get(batch_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data, {'error_code_list': [error_code]})
+
+    def test_get_thumbnail_invalid(self):
+        response = self.client.get(reverse('partyroom_image', kwargs={'uid': 'ABCD', 'size': 'list'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('partyroom_image', kwargs={'uid': self.partyroom.uid, 'size': 'huge'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PartyRoomPaginationTests(APITestCase):
+    list_url = reverse('get_all_partyrooms')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+        self.partyrooms = [PartyRoom.objects.create(owner=self.user, name=f'small_room_{i}') for i in range(25)]
+
+    def test_cursor_pages(self):
+        uids, url = [], self.list_url
+        while url is not None:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            # no COUNT(*) and no OFFSET
+            self.assertFalse([query for query in context.captured_queries
+                              if 'COUNT' in query['sql'] or 'OFFSET' in query['sql']])
+            uids += [partyroom['uid'] for partyroom in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(uids, [partyroom.uid for partyroom in self.partyrooms])
+
+    def test_legacy_page_number(self):
+        response = self.client.get(self.list_url, {'page': 3})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual([partyroom['uid'] for partyroom in response.data['results']],
+                         [partyroom.uid for partyroom in self.partyrooms[20:]])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.list_url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PartyRoomSearchTests(APITestCase):
+    search_url = reverse('search_partyroom')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+        self.game_room = PartyRoom.objects.create(owner=self.user, name='Switch Party',
+                                                  description='Games for everyone')
+        self.board_room = PartyRoom.objects.create(owner=self.user, name='Cosy room',
+                                                   shortDesp='Karaoke and a switch',
+                                                   boardgameList=['Catan', 'Avalon'])
+        self.karaoke_room = PartyRoom.objects.create(owner=self.user, name='Karaoke box',
+                                                     venueFaciList=['Projector'])
+
+    def search(self, query):
+        response = self.client.get(self.search_url, {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [partyroom['uid'] for partyroom in response.data]
+
+    def test_search_ranked(self):
+        # a match in the name ranks first
+        self.assertEqual(self.search('switch'), [self.game_room.uid, self.board_room.uid])
+        self.assertEqual(self.search('karaoke'), [self.karaoke_room.uid, self.board_room.uid])
+        self.assertEqual(self.search('cat'), [self.board_room.uid])
+        self.assertEqual(self.search('projector karaoke'), [self.karaoke_room.uid])
+        self.assertEqual(self.search('bowling'), [])
+
+    def test_search_reindexed_on_save(self):
+        self.karaoke_room.boardgameList = ['Bowling']
+        self.karaoke_room.save()
+        self.assertEqual(self.search('bowling'), [self.karaoke_room.uid])
+        self.board_room.delete()
+        self.assertEqual(self.search('switch'), [self.game_room.uid])
+
+    def test_search_without_query(self):
+        response = self.client.get(self.search_url, {'q': ' '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error_code_list': [PARTY_ROOM_SEARCH_QUERY_EMPTY_ERROR]})
+
+    def test_sqlite_uses_fts(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+
+    def test_backend_without_full_text(self):
+        with mock.patch.dict('main.search._backends', clear=True), \
+                mock.patch('main.search.sqlite_has_fts5', return_value=False):
+            self.assertIsInstance(get_search_backend(), MemorySearchBackend)
+        with mock.patch.dict('main.search._backends', clear=True), \
+                mock.patch.object(connection, 'vendor', 'postgresql'):
+            backend = get_search_backend()
+        self.assertIs(type(backend), SearchBackend)
+
+    def test_mysql_match_skips_ignored_words(self):
+        backend = MySQLFullTextBackend()
+        backend.min_token_size, backend.stopwords = 3, {'the', 'and'}
+        self.assertEqual(backend.get_match(['the', 'switch', 'and', 'tv', 'box']), '+switch* +box*')
+        self.assertEqual(backend.get_match(['the', 'tv']), '')
+
+    def test_name_backend(self):
+        backend = SearchBackend()
+        self.assertEqual(backend.search('SWITCH', 10), [self.game_room.pk])
+        self.assertEqual(backend.search('oke bo', 10), [self.karaoke_room.pk])
+        self.assertEqual(backend.search('room', 10), [self.board_room.pk])
+        self.assertEqual(backend.search('catan', 10), [])
+        self.assertEqual(backend.search(' ', 10), [])
+
+    def test_memory_backend(self):
+        backend = MemorySearchBackend()
+        self.assertEqual(backend.search('switch', 10), [self.game_room.pk, self.board_room.pk])
+        self.assertEqual(backend.search('ava', 10), [self.board_room.pk])
+
+        # applied once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.karaoke_room.name = 'Switch box'
+            self.karaoke_room.save()
+            backend.index(self.karaoke_room)
+            backend.remove(self.game_room.pk)
+        self.assertEqual(backend.search('switch', 10), [self.karaoke_room.pk, self.board_room.pk])
+
+
+class CatalogueCacheTests(APITestCase):
+    list_url = reverse('get_all_partyrooms')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+        self.partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+
+    def test_list_and_detail_cached(self):
+        detail_url = reverse('detail_partyroom', kwargs={'uid': self.partyroom.uid})
+        # the detail still reads the version of the partyroom for its ETag
+        for url, num_queries in ((self.list_url, 0), (detail_url, 1)):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(context.captured_queries), num_queries)
+        self.assertGreaterEqual(get_catalogue_cache().stats()['hits'], 2)
+
+    def test_cache_invalidated_on_save(self):
+        self.client.get(self.list_url)
+        self.partyroom.name = 'renamed_room'
+        self.partyroom.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['results'][0]['name'], 'renamed_room')
+
+    def test_cache_invalidated_on_rating_rebuild(self):
+        get_catalogue_cache().set('some_key', 'some_value')
+        call_command('rebuild_partyroom_rating', stdout=StringIO())
+        self.assertIsNone(get_catalogue_cache().get('some_key'))
+
+    def test_cache_invalidated_on_new_cover(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        image_dir = Path(temp_dir.name)
+        with override_settings(PARTYROOM_IMAGE_URL=image_dir, PARTYROOM_THUMBNAIL_URL=image_dir / 'thumbnails'):
+            Image.new('RGB', (20, 15), 'red').save(image_dir / f'{self.partyroom.uid}.jpg')
+            get_catalogue_cache().set('some_key', 'some_value')
+            generate_thumbnails(self.partyroom.uid)
+            self.assertIsNone(get_catalogue_cache().get('some_key'))
+
+            # the thumbnails are up to date
+            get_catalogue_cache().set('some_key', 'some_value')
+            generate_thumbnails(self.partyroom.uid)
+            self.assertEqual(get_catalogue_cache().get('some_key'), 'some_value')
+
+    def test_lru_and_timeout(self):
+        cache = CatalogueCache(max_entries=2, timeout=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        # b is the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        expired_cache = CatalogueCache(max_entries=2, timeout=0)
+        expired_cache.set('a', 1)
+        self.assertIsNone(expired_cache.get('a'))
+
+    def test_shared_cache(self):
+        first, second = CatalogueCache(10, 60, 'default'), CatalogueCache(10, 60, 'default')
+        first.set('a', 1)
+        self.assertEqual(second.get('a'), 1)
+        self.assertEqual(second.stats()['shared_hits'], 1)
+        # clearing in one process drops the entries of the others
+        first.clear()
+        self.assertIsNone(second.get('a'))
+
+    def test_stats_staff_only(self):
+        stats_url = reverse('catalogue_cache_stats')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(stats_url).status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(stats_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('misses', response.data)
+
+
+class PartyRoomConditionalGetTests(APITestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.image_dir = Path(temp_dir.name)
+        settings_override = override_settings(PARTYROOM_IMAGE_URL=self.image_dir,
+                                              PARTYROOM_THUMBNAIL_URL=self.image_dir / 'thumbnails')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+        self.partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+        Image.new('RGB', (20, 15), 'red').save(self.image_dir / f'{self.partyroom.uid}.jpg')
+        self.detail_url = reverse('detail_partyroom', kwargs={'uid': self.partyroom.uid})
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # only the version is read
+        self.assertEqual(len(context.captured_queries), 1)
+
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.partyroom.name = 'renamed_room'
+        self.partyroom.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'renamed_room')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_modified_update_fields(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.partyroom.name = 'renamed_room'
+        self.partyroom.save(update_fields=['name'])
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'renamed_room')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_modified_stale_instance(self):
+        # the rating bumps the version in the database, not in self.partyroom
+        update_partyroom_rating(self.partyroom.pk, 5, 1)
+        etag = self.client.get(self.detail_url)['ETag']
+        self.partyroom.name = 'renamed_room'
+        self.partyroom.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'renamed_room')
+        self.assertEqual(self.partyroom.version, 3)
+
+    def test_detail_unknown_partyroom(self):
+        response = self.client.get(reverse('detail_partyroom', kwargs={'uid': 'ZZZ'}), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_image_cover_not_modified(self):
+        image_cover_url = reverse('partyroom-get_image_cover')
+        response = self.client.post(image_cover_url, {'uid': self.partyroom.uid}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['image_cover'])
+
+        response = self.client.post(image_cover_url, {'uid': self.partyroom.uid}, format='json',
+                                    HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SafelistPermissionTests(APITestCase):
+    list_url = reverse('get_all_partyrooms')
+
+    def test_prefix_of_safe_ip_is_not_allowed(self):
+        # 192.168.1.2 is in SAFE_IPS
+        self.assertEqual(self.client.get(self.list_url, REMOTE_ADDR='192.168.1.2').status_code, status.HTTP_200_OK)
+        response = self.client.get(self.list_url, REMOTE_ADDR='192.168.1.25')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(SAFE_IPS=['10.0.0.0/8', '2001:db8::/32', '172.16.0.1'])
+    def test_networks(self):
+        for address, code in (('10.1.2.3', status.HTTP_200_OK),
+                              ('11.0.0.1', status.HTTP_403_FORBIDDEN),
+                              ('172.16.0.1', status.HTTP_200_OK),
+                              ('172.16.0.2', status.HTTP_403_FORBIDDEN),
+                              ('2001:db8::1', status.HTTP_200_OK),
+                              ('2001:db9::1', status.HTTP_403_FORBIDDEN),
+                              ('::ffff:10.0.0.1', status.HTTP_200_OK),
+                              ('invalid', status.HTTP_403_FORBIDDEN)):
+            with self.subTest(address=address):
+                self.assertEqual(self.client.get(self.list_url, REMOTE_ADDR=address).status_code, code)
+
+    @override_settings(SAFE_IPS=['10.0.0.0/8'], SAFE_IPS_TRUSTED_PROXIES=['127.0.0.1', '192.168.0.0/16'])
+    def test_forwarded_for_trusted_proxies(self):
+        response = self.client.get(self.list_url, HTTP_X_FORWARDED_FOR='10.0.0.5, 192.168.1.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the client can put anything before its own address
+        response = self.client.get(self.list_url, HTTP_X_FORWARDED_FOR='10.0.0.5, 8.8.8.8, 192.168.1.1')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        # X-Forwarded-For of an untrusted client is ignored
+        response = self.client.get(self.list_url, REMOTE_ADDR='8.8.8.8', HTTP_X_FORWARDED_FOR='10.0.0.5')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class LoggingTests(SimpleTestCase):
+    def make_record(self, msg='booking %s failed', args=('A1',), name='booking.views', **kwargs):
+        return logging.makeLogRecord({'name': name, 'levelname': 'WARNING', 'levelno': logging.WARNING,
+                                      'msg': msg, 'args': args, **kwargs})
+
+    def test_rate_limit_window(self):
+        log_filter = RateLimitFilter(rate=2, period=60)
+        with mock.patch('utils.log.time.monotonic', return_value=1000):
+            self.assertEqual([log_filter.filter(self.make_record(args=(i,))) for i in range(5)],
+                             [True, True, False, False, False])
+            # other templates and loggers have their own windows
+            self.assertTrue(log_filter.filter(self.make_record(msg='other %s')))
+            self.assertTrue(log_filter.filter(self.make_record(name='main.views')))
+        with mock.patch('utils.log.time.monotonic', return_value=1059):
+            self.assertFalse(log_filter.filter(self.make_record()))
+        with mock.patch('utils.log.time.monotonic', return_value=1060):
+            record = self.make_record()
+            self.assertTrue(log_filter.filter(record))
+            # the dropped records of the last window
+            self.assertEqual(record.suppressed, 4)
+            record = self.make_record()
+            self.assertTrue(log_filter.filter(record))
+            self.assertFalse(hasattr(record, 'suppressed'))
+
+    def test_queue_full_drops_records(self):
+        handler = QueueListenerHandler([logging.NullHandler()], queue_size=2)
+        # nothing takes the records from the queue
+        handler.listener.stop()
+        atexit.unregister(handler.listener.stop)
+        for i in range(5):
+            handler.handle(self.make_record(args=(i,)))
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual(handler.queue.get_nowait().msg, 'booking 0 failed')
+
+    def test_json_formatter(self):
+        try:
+            raise ValueError('bad time')
+        except ValueError:
+            exc_info = sys.exc_info()
+        record = self.make_record(exc_info=exc_info, partyroom='ABC', queries=3, started=datetime(2030, 1, 1))
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['message'], 'booking A1 failed')
+        self.assertEqual(data['level'], 'WARNING')
+        self.assertEqual(data['logger'], 'booking.views')
+        self.assertEqual((data['partyroom'], data['queries'], data['started']), ('ABC', 3, '2030-01-01 00:00:00'))
+        self.assertIn('ValueError: bad time', data['exception'])
+        self.assertNotIn('exc_info', data)
+        self.assertNotIn('args', data)
+
+
+class RequestMetricsTests(APITestCase):
+    list_url = reverse('get_all_partyrooms')
+    metrics_url = reverse('metrics')
+
+    def setUp(self):
+        registry.clear()
+        # a new catalogue cache, its counters would hold the requests of the other tests
+        settings_override = override_settings(PARTYROOM_CATALOGUE_CACHE=settings.PARTYROOM_CATALOGUE_CACHE)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+        PartyRoom.objects.create(owner=self.user, name='small_room_1')
+
+    def test_metrics(self):
+        self.client.get(self.list_url)
+        admin = CustomUser.objects.create(username='admin', password='some_password',
+                                          phone_number='+85291234512', email='admin@test.com', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(self.metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('partyroom_request_duration_seconds_count{method="GET",status="200",view="get_all_partyrooms"} 1',
+                      text)
+        self.assertIn('partyroom_request_queries_bucket{view="get_all_partyrooms",le="+Inf"} 1', text)
+        self.assertIn('partyroom_response_bytes_count{view="get_all_partyrooms"} 1', text)
+        self.assertIn('partyroom_catalogue_cache_misses_total 1', text)
+
+    def test_serializer_time(self):
+        self.client.get(self.list_url)
+        text = registry.render()
+        self.assertIn('partyroom_request_serializer_duration_seconds_count{view="get_all_partyrooms"} 1', text)
+        self.assertNotIn('partyroom_request_serializer_duration_seconds_sum{view="get_all_partyrooms"} 0\n', text)
+        # only the views with the mixin are timed
+        self.assertIs(PartyRoomSerializer.data, serializers.Serializer.data)
+
+    def test_metrics_requires_admin(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(REQUEST_METRICS={'QUERY_BUDGET': 0})
+    def test_query_budget(self):
+        with self.assertLogs('utils.middleware', 'WARNING') as logs:
+            self.client.get(self.list_url)
+        self.assertIn('the budget is 0', logs.output[0])
+        self.assertIn('partyroom_query_budget_exceeded_total{view="get_all_partyrooms"} 1', registry.render())
+
+
+class PartyRoomQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        self.seeder = Seeder()
+
+    def test_get_all_partyrooms(self):
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('get_all_partyrooms')),
+                               self.seeder.partyrooms)
+
+    def test_filter_partyroom(self):
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('filter_partyroom'), {'district': 'KT'}),
+                               self.seeder.partyrooms)
+
+
+class PartyRoomUidTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user2@example.com',
+                                              is_roomer=True)
+
+    def test_permutation(self):
+        self.assertEqual(sorted(permute(value, 1000) for value in range(1000)), list(range(1000)))
+
+    def test_every_3_letter_uid_then_4_letters(self):
+        uids = {get_uid(value) for value in range(26 ** 3)}
+        self.assertEqual(len(uids), 26 ** 3)
+        self.assertTrue(all(len(uid) == 3 and uid.isalpha() and uid.isupper() for uid in uids))
+        self.assertEqual(len(get_uid(26 ** 3)), 4)
+
+    def test_create_in_constant_queries(self):
+        # the first one creates the sequence
+        PartyRoom.objects.create(owner=self.user, name='small_room_0')
+        for i in range(1, 5):
+            with CaptureQueriesContext(connection) as context:
+                PartyRoom.objects.create(owner=self.user, name=f'small_room_{i}')
+            queries = [query['sql'] for query in context.captured_queries
+                       if not query['sql'].startswith(('BEGIN', 'SAVEPOINT', 'RELEASE'))]
+            # sequence update and read, uid check, insert and the search index
+            self.assertEqual(len(queries), 6, queries)
+        self.assertEqual(PartyRoom.objects.values('uid').distinct().count(), 5)
+
+    def test_skip_taken_uids(self):
+        # the random uids of the rooms created before the sequence
+        for value in range(3):
+            PartyRoom.objects.create(owner=self.user, name='old_room', uid=get_uid(value))
+        uids = allocate_partyroom_uids(2)
+        self.assertEqual(uids, [get_uid(3), get_uid(4)])
+        self.assertEqual(Sequence.objects.get(name=UID_SEQUENCE).value, 5)
+
+    def test_uid_of_4_letters(self):
+        Sequence.objects.create(name=UID_SEQUENCE, value=26 ** 3)
+        partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+        self.assertEqual(len(partyroom.uid), 4)
+        response = self.client.get(reverse('detail_partyroom', args=[partyroom.uid]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
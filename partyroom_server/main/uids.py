@@ -0,0 +1,75 @@
+import hashlib
+import string
+from typing import List
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import PartyRoom, Sequence
+from .utils import DEFAULT_IMAGE_UID, UID_MAX_LENGTH, UID_MIN_LENGTH
+
+UID_ALPHABET = string.ascii_uppercase
+UID_SEQUENCE = 'partyroom_uid'
+# codes that must not be given to a partyroom
+RESERVED_UIDS = {DEFAULT_IMAGE_UID}
+FEISTEL_ROUNDS = 4
+# changing the key reorders the codes, the allocated ones are then skipped as taken
+FEISTEL_KEY = b'partyroom-uid'
+
+
+def feistel(value: int, half_bits: int, key: bytes = FEISTEL_KEY) -> int:
+    """a permutation of [0, 2 ** (2 * half_bits))"""
+    mask = (1 << half_bits) - 1
+    left, right = value >> half_bits, value & mask
+    for round_number in range(FEISTEL_ROUNDS):
+        digest = hashlib.blake2b(right.to_bytes(8, 'big'), digest_size=8,
+                                 key=key, salt=round_number.to_bytes(8, 'big')).digest()
+        left, right = right, left ^ (int.from_bytes(digest, 'big') & mask)
+    return (left << half_bits) | right
+
+
+def permute(value: int, size: int) -> int:
+    """a permutation of [0, size), by cycle walking the feistel permutation of the next power of 4"""
+    half_bits = max((size - 1).bit_length() + 1, 2) // 2
+    value = feistel(value, half_bits)
+    while value >= size:
+        value = feistel(value, half_bits)
+    return value
+
+
+def encode_uid(number: int, length: int) -> str:
+    letters = []
+    for _ in range(length):
+        number, letter = divmod(number, len(UID_ALPHABET))
+        letters.append(UID_ALPHABET[letter])
+    return ''.join(reversed(letters))
+
+
+def get_uid(value: int) -> str:
+    """the code of the nth allocation
+
+    The values go through all the 3 letter codes in a scrambled order, then
+    all the 4 letter codes and so on, so that every value has its own code.
+    """
+    length = UID_MIN_LENGTH
+    while value >= len(UID_ALPHABET) ** length:
+        value -= len(UID_ALPHABET) ** length
+        length += 1
+    if length > UID_MAX_LENGTH:
+        raise ValueError('all the partyroom uids are allocated')
+    return encode_uid(permute(value, len(UID_ALPHABET) ** length), length)
+
+
+def allocate_partyroom_uids(count: int, using: str = DEFAULT_DB_ALIAS) -> List[str]:
+    """free uids for new partyrooms, in a constant number of queries
+
+    The codes of concurrent allocations never collide as they come from
+    different sequence values. Only the codes taken before the sequence was
+    used (the random codes of the old rooms) need another value.
+    """
+    uids = []
+    with transaction.atomic(using=using):
+        while len(uids) < count:
+            codes = [get_uid(value) for value in Sequence.next_values(UID_SEQUENCE, count - len(uids), using)]
+            taken = set(PartyRoom.objects.using(using).filter(uid__in=codes).values_list('uid', flat=True))
+            uids += [code for code in codes if code not in taken and code not in RESERVED_UIDS]
+    return uids
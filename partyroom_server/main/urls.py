@@ -11,5 +11,10 @@ urlpatterns = [
     path("create/", views.PartyRoomCreateView.as_view(), name='create_partyroom'),
     path("detail/<str:uid>", views.PartyRoomUIdDetail.as_view(), name='detail_partyroom'),
     path("filter/", views.PartyRoomFilterView.as_view(), name='filter_partyroom'),
+    path("cache_stats/", views.CatalogueCacheStatsView.as_view(), name='catalogue_cache_stats'),
+    path("search/", views.PartyRoomSearchView.as_view(), name='search_partyroom'),
+    path("image/<str:uid>", views.PartyRoomImageView.as_view(), name='partyroom_image_original'),
+    path("image/<str:uid>/<str:size>", views.PartyRoomImageView.as_view(), name='partyroom_image'),
+    path("images/", views.PartyRoomImageBatchView.as_view(), name='partyroom_images'),
     path('', include(router.urls))
 ]
@@ -1,11 +1,8 @@
-import random
-import string
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, Optional
 
 from django.conf import settings
-from reviews.models import PartyRoomReview
 
 DISTRICT_CHOICES = (
     ('CW', 'Central and Western'),
@@ -41,6 +38,10 @@ MAX_NUM_BOARDGAME = 30
 MAX_NUM_ADDITIONAL_SERVICE = 30
 MAX_NUM_BOOKING_METHOD = 15
 MAX_SHORT_DESCRIPTION_LENGTH = 100
+DEFAULT_IMAGE_UID = 'YUX'
+# the partyroom uids are 3 letters, longer once all of them are allocated (main/uids.py)
+UID_MIN_LENGTH = 3
+UID_MAX_LENGTH = 6
 
 
 def convert_querystring_to_dict(request) -> Dict:
@@ -53,45 +54,34 @@ def convert_querystring_to_dict(request) -> Dict:
     return query_dict
 
 
-def id_generator(size=3, chars=string.ascii_uppercase) -> str:
-    return ''.join(random.choice(chars) for _ in range(size))
-
-
 def convert_to_district_shortcut(district: str) -> Optional[str]:
     for key, val in DISTRICT_CHOICES:
         if val == district:
             return key
     return None
 
-def get_image_cover_path(uid) -> Path:
+def get_image_cover_path(uid) -> Optional[Path]:
     path = settings.PARTYROOM_IMAGE_URL / f'{uid}.jpg'
     return path if path.is_file() else None
 
 def mtime_to_iso(mtime):
     return datetime.fromtimestamp(mtime, timezone(timedelta(hours=8)))
- 
-def get_image_last_update_time(uid):
-    image_path = get_image_cover_path(uid)
-    last_modify = None
-    if image_path.is_file():
-        last_modify = image_path.stat().st_mtime
-        last_modify = mtime_to_iso(last_modify)
-    return last_modify
 
+def resolve_image_uid(uid) -> Optional[str]:
+    # partyroom without cover uses the default cover
+    for image_uid in (uid, DEFAULT_IMAGE_UID):
+        if get_image_cover_path(image_uid) is not None:
+            return image_uid
+    return None
 
-def get_relative_review(partyroom_id: int):
-    return PartyRoomReview.objects.filter(partyroom=partyroom_id)
+def get_image_mtime(uid) -> Optional[float]:
+    image_uid = resolve_image_uid(uid)
+    if image_uid is None:
+        return None
+    return get_image_cover_path(image_uid).stat().st_mtime
 
-def cal_rating(partyroom_id: int) -> float:
-    reviews = get_relative_review(partyroom_id)
-    reviews_count = len(reviews)
-    if reviews_count == 0:
-        return 0
-    
-    rating_sum = 0
-    for review in reviews:
-        rating_sum += review.rating
-        
-    return rating_sum / reviews_count
-    
-    
+def get_image_last_update_time(uid):
+    last_modify = get_image_mtime(uid)
+    if last_modify is not None:
+        last_modify = mtime_to_iso(last_modify)
+    return last_modify
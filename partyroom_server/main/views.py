@@ -2,33 +2,50 @@ import logging
 
 from accounts.models import CustomUser
 from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from error_code_list import *
 from rest_framework import generics, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
+from utils.metrics import SerializerMetricsMixin
+from utils.pagination import PartyRoomKeysetPagination
 from utils.permissions import *
 
+from .cache import CatalogueCacheMixin, get_catalogue_cache
+from .conditional import (get_partyroom_validators, partyroom_etag,
+                          partyroom_last_modified)
 from .filters import PartyRoomFilter, PartyRoomUidFilter
+from .images import IMAGE_SIZES, compute_image_etag, generate_thumbnail
 from .models import PartyRoom
+from .search import search_partyrooms
 from .serializers import (PartyRoomDetailSerializer,
-                          PartyRoomImageGetSerializer, PartyRoomSerializer)
-from .utils import convert_querystring_to_dict, convert_to_district_shortcut
+                          PartyRoomImageGetSerializer,
+                          PartyRoomImageURLSerializer, PartyRoomSerializer)
+from .utils import (convert_querystring_to_dict, convert_to_district_shortcut,
+                    get_image_mtime, resolve_image_uid)
 
 logger = logging.getLogger(__name__)
 
 
-class PartyRoomList(generics.ListAPIView):
+class PartyRoomList(CatalogueCacheMixin, SerializerMetricsMixin, generics.ListAPIView):
     # view for listing partyroom
     queryset = PartyRoom.objects.all()
     authentication_classes = ()
     permission_classes = (SafelistPermission,)
     serializer_class = PartyRoomSerializer
-    pagination_class = PageNumberPagination
-    # TODO UnorderedObjectListWarning: Pagination may yield inconsistent results with an unordered object_list: <class 'main.models.PartyRoom'> QuerySet.
+    pagination_class = PartyRoomKeysetPagination
 
 class PartyRoomCreateView(generics.CreateAPIView):
     # view for creating partyroom
@@ -41,17 +58,38 @@ class PartyRoomCreateView(generics.CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class PartyRoomFilterView(generics.ListAPIView):
+class PartyRoomFilterView(CatalogueCacheMixin, SerializerMetricsMixin, generics.ListAPIView):
     queryset = PartyRoom.objects.all()
     authentication_classes = ()
     permission_classes = (SafelistPermission,)  
     serializer_class = PartyRoomSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = PartyRoomFilter
-    pagination_class = PageNumberPagination
+    pagination_class = PartyRoomKeysetPagination
 
 
-class PartyRoomUIdDetail(generics.RetrieveAPIView):
+class PartyRoomSearchView(SerializerMetricsMixin, generics.ListAPIView):
+    # ranked full-text search over the name, descriptions, facilities and boardgames
+    authentication_classes = ()
+    permission_classes = (SafelistPermission,)
+    serializer_class = PartyRoomSerializer
+
+    @extend_schema(parameters=[OpenApiParameter('q', OpenApiTypes.STR, required=True)])
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error_code_list': [PARTY_ROOM_SEARCH_QUERY_EMPTY_ERROR]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        partyroom_ids = search_partyrooms(query, settings.PARTYROOM_SEARCH_MAX_RESULTS)
+        partyrooms = PartyRoom.objects.in_bulk(partyroom_ids)
+        # keep the order of the ranking
+        ranked = [partyrooms[partyroom_id] for partyroom_id in partyroom_ids if partyroom_id in partyrooms]
+        serializer = self.get_serializer(ranked, many=True)
+        return Response(serializer.data)
+
+
+class PartyRoomUIdDetail(CatalogueCacheMixin, SerializerMetricsMixin, generics.RetrieveAPIView):
     # Search by partyroom uid
     queryset = PartyRoom.objects.all()
     authentication_classes = ()
@@ -59,6 +97,24 @@ class PartyRoomUIdDetail(generics.RetrieveAPIView):
     serializer_class = PartyRoomDetailSerializer
     lookup_field = 'uid'
 
+    # answer If-None-Match and If-Modified-Since before the partyroom is loaded
+    @method_decorator(condition(etag_func=partyroom_etag, last_modified_func=partyroom_last_modified))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_catalogue_cache_key(self, request) -> str:
+        # the cover is not covered by the cache invalidation, a new image changes the key
+        etag = get_partyroom_validators(request, self.kwargs['uid'])[0]
+        return f'{super().get_catalogue_cache_key(request)}{etag}'
+
+
+class CatalogueCacheStatsView(APIView):
+    # hit and miss counters of the catalogue cache of this process, for sizing it
+    permission_classes = (IsAuthenticated, IsAdminUser, SafelistPermission)
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_catalogue_cache().stats())
+
 
 class PartyRoomImageCoverView(GenericViewSet):
     queryset = PartyRoom.objects.all()
@@ -66,13 +122,89 @@ class PartyRoomImageCoverView(GenericViewSet):
     permission_classes = (SafelistPermission,)
     serializer_class = PartyRoomImageGetSerializer
     
+    # replaced by GET image/<uid> and images/
+    @extend_schema(deprecated=True)
     @action(methods=['post'], detail=False, url_name='get_image_cover')
     def image_cover(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-                
-        partyroom = PartyRoom.objects.get(uid=serializer.validated_data.get('uid'))
-        read_serializer = self.get_serializer(partyroom)
-        
-        return Response(read_serializer.data, status=status.HTTP_200_OK)
-    
\ No newline at end of file
+
+        uid = serializer.validated_data.get('uid')
+        image_uid = resolve_image_uid(uid)
+        etag = None if image_uid is None else compute_image_etag(image_uid, 'original', get_image_mtime(image_uid))
+        if etag is not None and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            # the client has this image already, skip reading and encoding it
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            read_serializer = self.get_serializer(serializer.partyroom)
+            response = Response(read_serializer.data, status=status.HTTP_200_OK)
+        if etag is not None:
+            response['ETag'] = etag
+        return response
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    # the image is always a jpeg, error responses are always json
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix):
+        return (renderers[0], renderers[0].media_type)
+
+
+class PartyRoomImageView(APIView):
+    """serve the cover of the partyroom in one of the generated sizes, the uploaded image by default
+    """
+    authentication_classes = ()
+    permission_classes = (SafelistPermission,)
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, uid, size='original'):
+        image_uid = resolve_image_uid(uid)
+        if size not in IMAGE_SIZES or image_uid is None or \
+                (image_uid != uid and not PartyRoom.objects.filter(uid=uid).exists()):
+            return Response({'error_code_list': [PARTY_ROOM_DOES_NOT_EXIST_ERROR]},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        mtime = get_image_mtime(image_uid)
+        etag = compute_image_etag(image_uid, size, mtime)
+        response = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+        if response is None:
+            image_path = generate_thumbnail(image_uid, size)
+            response = FileResponse(open(image_path, 'rb'), content_type='image/jpeg')
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(mtime)
+        response['Cache-Control'] = f'max-age={settings.PARTYROOM_IMAGE_MAX_AGE}'
+        return response
+
+
+class PartyRoomImageBatchView(APIView):
+    """urls and modification times of the covers of many partyrooms, e.g. ?uids=ABC,DEF&size=list
+    """
+    authentication_classes = ()
+    permission_classes = (SafelistPermission,)
+
+    @extend_schema(parameters=[OpenApiParameter('uids', OpenApiTypes.STR, required=True),
+                               OpenApiParameter('size', OpenApiTypes.STR, enum=list(IMAGE_SIZES))],
+                   responses=PartyRoomImageURLSerializer(many=True))
+    def get(self, request, *args, **kwargs):
+        uids = [uid for uid in request.query_params.get('uids', '').split(',') if uid]
+        size = request.query_params.get('size', PartyRoomImageURLSerializer.image_cover_size)
+        if not uids:
+            error_code = PARTY_ROOM_UID_FIELD_EMPTY_ERROR
+        elif len(uids) > settings.PARTYROOM_IMAGE_BATCH_MAX_UIDS:
+            error_code = PARTY_ROOM_TOO_MANY_UIDS_ERROR
+        elif size not in IMAGE_SIZES:
+            error_code = PARTY_ROOM_IMAGE_SIZE_INVALID_ERROR
+        else:
+            error_code = None
+        if error_code is not None:
+            return Response({'error_code_list': [error_code]}, status=status.HTTP_400_BAD_REQUEST)
+
+        # one query for all the uids, unknown uids are left out
+        partyrooms = PartyRoom.objects.filter(uid__in=uids).only('uid').in_bulk(field_name='uid')
+        serializer = PartyRoomImageURLSerializer([partyrooms[uid] for uid in dict.fromkeys(uids) if uid in partyrooms],
+                                                 many=True,
+                                                 context={'request': request, 'image_cover_size': size})
+        return Response(serializer.data)
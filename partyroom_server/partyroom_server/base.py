@@ -34,23 +34,37 @@ LOGGING = {
     },
     "root": {
         "handlers": ["console"],
-        "level": "DEBUG",
+        "level": os.environ.get("LOG_LEVEL", "DEBUG"),
     },
     "formatters": {
         "verbose": {
             "format": "{name} {funcName} {levelname} {message} \n",
             "style": "{",
         },
+        "json": {"()": "utils.log.JsonFormatter"},
+    },
+    "filters": {
+        "rate_limit": {"()": "utils.log.RateLimitFilter", "rate": 10, "period": 60},
+    },
+    # the loggers called on every request
+    "loggers": {
+        "permissions": {"filters": ["rate_limit"]},
+        "utils.exception_handlers": {"filters": ["rate_limit"]},
     },
 }
 
 
 ALLOWED_HOSTS = ["192.168.1.14", "localhost", "127.0.0.1"]
 
+# addresses or networks, e.g. "10.0.0.0/8" or "2001:db8::/32"
 SAFE_IPS = [
     "127.0.0.1",
     "192.168.1.2",
 ]
+# proxies whose X-Forwarded-For is used as the client address
+SAFE_IPS_TRUSTED_PROXIES = []
+# log a summary of the safelist checks every n requests
+SAFE_IPS_LOG_EVERY = 1000
 
 # MEDIA_ROOT = BASE_DIR / 'media'
 # MEDIA_URL = '/media/'
@@ -82,16 +96,28 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "utils.exception_handlers.custom_exception_handler",
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_AUTHENTICATION_CLASSES": ("knox.auth.TokenAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("accounts.authentication.CachedTokenAuthentication",),
     "PAGE_SIZE": PARTYROOM_PAGE_SIZE,
 }
+# requests with more database queries than the budget are logged and counted on /metrics
+REQUEST_METRICS = {
+    "QUERY_BUDGET": 20,
+}
 REST_KNOX = {
     #   'TOKEN_TTL': None,
     "USER_SERIALIZER": "accounts.serializers.UserLoginInfoSerializer",
     #   'TOKEN_LIMIT_PER_USER': 2,
     #   'AUTO_REFRESH': False,
 }
+# resolved users of the knox tokens (accounts/authentication.py), by token digest.
+# CACHE names an entry of CACHES, a cache shared by the workers drops a revoked token everywhere
+AUTH_TOKEN_CACHE = {
+    "CACHE": "default",
+    "TIMEOUT": 60,
+}
 MIDDLEWARE = [
+    # first, so that it times the other middlewares too
+    "utils.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -199,5 +225,57 @@ EMAIL_USE_TLS = True
 EMAIL_PORT = 587
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+# the purge_otps command deletes the otps that expired this many seconds ago
+OTP_RETENTION = 24 * 60 * 60
+# emails are queued in accounts.OutboundEmail and sent by the send_queued_emails command,
+# BACKEND None uses EMAIL_BACKEND, retries wait RETRY_DELAY * 2 ** (attempt - 1) seconds
+OUTBOUND_EMAIL = {
+    "BACKEND": None,
+    "MAX_ATTEMPTS": 5,
+    "RETRY_DELAY": 60,
+    "LEASE": 5 * 60,
+}
 
 PARTYROOM_IMAGE_URL = Path("/var/www/on99/partyroom_images")
+# generated thumbnails of the partyroom covers, see main/images.py
+PARTYROOM_THUMBNAIL_URL = PARTYROOM_IMAGE_URL / "thumbnails"
+# seconds that clients may use a cached cover before revalidating it
+PARTYROOM_IMAGE_MAX_AGE = 60 * 60
+# most uids of one batch image request
+PARTYROOM_IMAGE_BATCH_MAX_UIDS = 100
+# most partyrooms returned by one search, best match first (main/search.py)
+PARTYROOM_SEARCH_MAX_RESULTS = 50
+
+# local memory is per process, configure a shared cache when running several workers
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+# serialized partyroom list, filter and detail responses (main/cache.py),
+# SHARED_CACHE names an entry of CACHES shared by the workers
+PARTYROOM_CATALOGUE_CACHE = {
+    "MAX_ENTRIES": 1000,
+    "TIMEOUT": 5 * 60,
+    "SHARED_CACHE": None,
+}
+# token bucket rate limits of the endpoints (utils/throttling.py), by the throttle_scope of the view
+# and the kind of throttle, '<requests>/<period>' allows a burst of <requests> refilled over the period.
+# the buckets live in the memory of each process unless SHARED_CACHE names an entry of CACHES
+RATE_LIMITS = {
+    "SHARED_CACHE": None,
+    "MAX_ENTRIES": 10000,
+    "RATES": {
+        "otp": {"ip": "30/hour", "credential": "10/hour"},
+        "login": {"ip": "30/min", "credential": "5/min"},
+        "reserve": {"ip": "60/min", "user": "10/min"},
+    },
+}
+# per-day availability of a partyroom, invalidated on reserve and cancel (booking/availability.py)
+BOOKING_AVAILABILITY_CACHE_TIMEOUT = 24 * 60 * 60
+# longest date range of one availability request
+BOOKING_AVAILABILITY_MAX_DAYS = 62
+# most rows of a bulk booking import through the api (booking/bulk.py), the command has no limit
+BOOKING_IMPORT_MAX_ROWS = 10000
+# bookings per insert of an import, and per fetch of an export
+BOOKING_IMPORT_BATCH_SIZE = 500
@@ -2,4 +2,9 @@ from .base import *
 
 # Override base.py settings here
 DEBUG = True
-
+# print the queued emails instead of sending them
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# no rate limits for the dev server and the tests, the throttle tests set their own rates
+RATE_LIMITS = {**RATE_LIMITS, "RATES": {}}
+# python manage.py benchmark
+INSTALLED_APPS += ["benchmark.apps.BenchmarkConfig"]
@@ -3,3 +3,14 @@ from partyroom_server.base import *
 # Override base.py settings here
 DEBUG = False
 REST_FRAMEWORK["DEFAULT_PERMISSION_CLASSES"] = ("utils.permissions.SafelistPermission",)
+
+# JSON records, written by a thread so that the requests don't wait for the output
+LOGGING["handlers"]["json"] = {"class": "logging.StreamHandler", "formatter": "json"}
+LOGGING["handlers"]["queue"] = {
+    "class": "utils.log.QueueListenerHandler",
+    "handlers": ["cfg://handlers.json"],
+}
+LOGGING["root"] = {"handlers": ["queue"], "level": os.environ.get("LOG_LEVEL", "WARNING")}
+LOGGING["loggers"]["django"] = {"level": "INFO"}
+# the safelist summaries, every SAFE_IPS_LOG_EVERY requests
+LOGGING["loggers"]["permissions"]["level"] = "INFO"
@@ -23,6 +23,7 @@ from drf_spectacular.views import (
 )
 from django.conf import settings
 from django.conf.urls.static import static
+from utils.views import MetricsView
 
 
 if settings.DEBUG:
@@ -50,6 +51,7 @@ if settings.DEBUG:
     urlpatterns.append(
         path("api/review/", include("reviews.urls"), name="party_room_review")
     )
+    urlpatterns.append(path("metrics", MetricsView.as_view(), name="metrics"))
 
 else:
     urlpatterns = [
@@ -57,4 +59,5 @@ else:
         path("on99/api/partyroom/", include("main.urls")),
         path("on99/api/booking/", include("booking.urls"), name="booking"),
         path("on99/api/review/", include("reviews.urls"), name="party_room_review"),
+        path("on99/metrics", MetricsView.as_view(), name="metrics"),
     ]
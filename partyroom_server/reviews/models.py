@@ -1,10 +1,27 @@
 from django.conf import settings
 from django.core.validators import MaxValueValidator
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
+from django.utils import timezone
 from error_code_list import *
+from main.models import PartyRoom
 from shortuuidfield import ShortUUIDField
 
 
+def update_partyroom_rating(partyroom_id: int, rating_delta: int, count_delta: int = 0) -> None:
+    """apply a review change to the rating aggregate stored on the partyroom
+
+    Args:
+        partyroom_id (int): id of the reviewed partyroom
+        rating_delta (int): change of the sum of the ratings
+        count_delta (int): change of the number of reviews
+    """
+    PartyRoom.objects.filter(pk=partyroom_id).update(rating_sum=F('rating_sum') + rating_delta,
+                                                     rating_count=F('rating_count') + count_delta,
+                                                     version=F('version') + 1,
+                                                     updated_at=timezone.now())
+
+
 class PartyRoomReview(models.Model):
     partyroom = models.ForeignKey(
         to='main.partyroom',
@@ -29,7 +46,44 @@ class PartyRoomReview(models.Model):
     uid = ShortUUIDField(
         unique=True, 
     )
+
+    class Meta:
+        indexes = [
+            # reviews of a partyroom, latest first (ReviewKeysetPagination)
+            models.Index(fields=['partyroom', '-updated_at', '-id'],
+                         name='review_room_updated_idx'),
+        ]
+
+    # the stored partyroom and rating, None when not loaded
+    _loaded_partyroom_id = None
+    _loaded_rating = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored values so that an update only applies the difference
+        instance._loaded_partyroom_id = instance.__dict__.get('partyroom_id')
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        
+        # the aggregate is updated in the same transaction as the review,
+        # deleting a review is handled by reviews.signals
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            adding = self._state.adding
+            loaded_partyroom_id, loaded_rating = self._loaded_partyroom_id, self._loaded_rating
+            if not adding and (loaded_partyroom_id is None or loaded_rating is None):
+                # deferred when the review was loaded
+                loaded_partyroom_id, loaded_rating = PartyRoomReview.objects.using(using) \
+                    .values_list('partyroom_id', 'rating').get(pk=self.pk)
+            super().save(*args, **kwargs)
+            if adding:
+                update_partyroom_rating(self.partyroom_id, self.rating, 1)
+            elif self.partyroom_id != loaded_partyroom_id:
+                # the review moves to another partyroom
+                update_partyroom_rating(loaded_partyroom_id, -loaded_rating, -1)
+                update_partyroom_rating(self.partyroom_id, self.rating, 1)
+            elif self.rating != loaded_rating:
+                update_partyroom_rating(self.partyroom_id, self.rating - loaded_rating)
+        self._loaded_partyroom_id, self._loaded_rating = self.partyroom_id, self.rating
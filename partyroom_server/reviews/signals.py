@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from main.cache import clear_catalogue_cache
+
+from .models import PartyRoomReview, update_partyroom_rating
+
+
+@receiver(post_delete, sender=PartyRoomReview)
+def remove_review_rating(sender, instance, **kwargs):
+    # also called when the review is deleted by cascade, inside the delete transaction
+    update_partyroom_rating(instance.partyroom_id, -instance.rating, -1)
+
+
+@receiver(post_save, sender=PartyRoomReview)
+@receiver(post_delete, sender=PartyRoomReview)
+def invalidate_catalogue_cache(sender, using, **kwargs):
+    # the rating of the partyroom is part of the catalogue
+    clear_catalogue_cache(using)
@@ -1,3 +1,140 @@
+from datetime import timedelta
+from io import StringIO
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from main.models import PartyRoom
+from rest_framework import status
+from rest_framework.test import APITestCase
+from utils.testing import QueryBudgetTestMixin, Seeder
+from utils.utils import now
+
+from .models import PartyRoomReview
+
+
+class PartyRoomRatingTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='roomer',
+                                              password='some_password',
+                                              phone_number='+85291234511',
+                                              email='user1@example.com',
+                                              is_roomer=True)
+        self.partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_1')
+        start_time = now() - timedelta(days=1)
+        self.booking = Booking.objects.create(partyroom=self.partyroom,
+                                              user=self.user,
+                                              start_time=start_time,
+                                              end_time=start_time + timedelta(hours=1),
+                                              status='confirm',
+                                              unit_price=10,
+                                              total_price=10)
+
+    def create_review(self, rating):
+        return PartyRoomReview.objects.create(partyroom=self.partyroom,
+                                              reviewer=self.user,
+                                              booking=self.booking,
+                                              rating=rating)
+
+    def test_rating_follows_reviews(self):
+        self.assertEqual(self.partyroom.rating_stars, 0)
+
+        review = self.create_review(4)
+        self.create_review(2)
+        self.partyroom.refresh_from_db()
+        self.assertEqual((self.partyroom.rating_sum, self.partyroom.rating_count), (6, 2))
+        self.assertEqual(self.partyroom.rating_stars, 3)
+
+        # only the difference is applied when a review is updated
+        review = PartyRoomReview.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        review.save()
+        self.partyroom.refresh_from_db()
+        self.assertEqual((self.partyroom.rating_sum, self.partyroom.rating_count), (7, 2))
+
+        review.delete()
+        self.partyroom.refresh_from_db()
+        self.assertEqual((self.partyroom.rating_sum, self.partyroom.rating_count), (2, 1))
+
+        # reviews deleted by cascade
+        self.booking.delete()
+        self.partyroom.refresh_from_db()
+        self.assertEqual(self.partyroom.rating_stars, 0)
+
+    def test_rating_deferred(self):
+        review = self.create_review(4)
+        review = PartyRoomReview.objects.defer('rating').get(pk=review.pk)
+        review.comments = 'nice room'
+        review.save()
+        review = PartyRoomReview.objects.only('comments').get(pk=review.pk)
+        review.rating = 1
+        review.save()
+        self.partyroom.refresh_from_db()
+        self.assertEqual((self.partyroom.rating_sum, self.partyroom.rating_count), (1, 1))
+
+    def test_review_moved(self):
+        other_partyroom = PartyRoom.objects.create(owner=self.user, name='small_room_2')
+        self.create_review(2)
+        review = PartyRoomReview.objects.get(pk=self.create_review(4).pk)
+        review.partyroom = other_partyroom
+        review.rating = 5
+        review.save()
+        self.partyroom.refresh_from_db()
+        other_partyroom.refresh_from_db()
+        self.assertEqual((self.partyroom.rating_sum, self.partyroom.rating_count), (2, 1))
+        self.assertEqual((other_partyroom.rating_sum, other_partyroom.rating_count), (5, 1))
+
+    def test_rebuild_rating(self):
+        self.create_review(4)
+        self.create_review(3)
+        PartyRoom.objects.update(rating_sum=0, rating_count=0)
+
+        call_command('rebuild_partyroom_rating', stdout=StringIO())
+        self.partyroom.refresh_from_db()
+        self.assertEqual((self.partyroom.rating_sum, self.partyroom.rating_count), (7, 2))
+
+
+class PartyRoomReviewPaginationTests(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username='roomer',
+                                         password='some_password',
+                                         phone_number='+85291234511',
+                                         email='user1@example.com')
+        partyroom = PartyRoom.objects.create(owner=user, name='small_room_1')
+        start_time = now() - timedelta(days=1)
+        booking = Booking.objects.create(partyroom=partyroom,
+                                         user=user,
+                                         start_time=start_time,
+                                         end_time=start_time + timedelta(hours=1),
+                                         status='confirm',
+                                         unit_price=10,
+                                         total_price=10)
+        self.reviews = [PartyRoomReview.objects.create(partyroom=partyroom,
+                                                       reviewer=user,
+                                                       booking=booking,
+                                                       rating=3,
+                                                       comments=f'review {i}') for i in range(15)]
+        # the same update time for half of the reviews, the id breaks the tie
+        PartyRoomReview.objects.filter(pk__lte=self.reviews[7].pk).update(updated_at=now())
+        self.url = reverse('get_review_from_party_room', kwargs={'party_room_id': partyroom.uid})
+
+    def test_cursor_pages(self):
+        comments, url = [], self.url
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            comments += [review['comments'] for review in response.data['results']]
+            url = response.data['next']
+        expected = PartyRoomReview.objects.order_by('-updated_at', '-id').values_list('comments', flat=True)
+        self.assertEqual(comments, list(expected))
+
 
-# Create your tests here.
+class ReviewListQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    def test_get_review_from_party_room(self):
+        seeder = Seeder()
+        partyroom = seeder.partyrooms(1)[0]
+        url = reverse('get_review_from_party_room', args=[partyroom.uid])
+        self.assertQueryBudget(1, lambda: self.client.get(url), lambda count: seeder.reviews(partyroom, count))
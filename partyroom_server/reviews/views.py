@@ -3,10 +3,10 @@ from drf_spectacular.utils import OpenApiExample, extend_schema
 from main.models import PartyRoom
 from rest_framework import generics, status
 from rest_framework.generics import GenericAPIView
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from utils.pagination import ReviewKeysetPagination
 from utils.permissions import IsBookedUser, IsVerifiedUser, SafelistPermission
 from utils.responses import ALLOWED_RESPONSE, REVIEW_DETAIL_NOT_PROVIED_RESPONSE
 
@@ -18,13 +18,14 @@ class PartyRoomReviewListView(generics.ListAPIView):
     queryset = PartyRoomReview.objects.all()
     lookup_field = 'party_room_id'
     serializer_class = PartyRoomReviewSerializer
-    pagination_class = PageNumberPagination
+    pagination_class = ReviewKeysetPagination
     authentication_classes = ()
     permission_classes = (SafelistPermission, )
     
     def get_queryset(self):
         room_id = self.kwargs.get(self.lookup_field)
-        review_list = PartyRoomReview.objects.filter(partyroom__uid=room_id)
+        # the serializer reads the username and icon of the reviewer
+        review_list = PartyRoomReview.objects.filter(partyroom__uid=room_id).select_related('reviewer')
         return review_list
 
 class PartyRoomCreateReviewView(generics.CreateAPIView):
@@ -0,0 +1,49 @@
+from logging import getLogger
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+
+logger = getLogger(__name__)
+
+
+def set_id_start_offset(model, start: int, using: str = DEFAULT_DB_ALIAS) -> None:
+    """make the database assign the primary keys of the model from `start`
+
+    The sequence is only moved forward, so running it again is harmless.
+
+    Args:
+        model: model with an AutoField primary key
+        start (int): the first id to assign
+        using (str): database alias
+    """
+    max_id = model.objects.using(using).aggregate(max_id=Max('pk'))['max_id']
+    if max_id is not None and max_id >= start:
+        # the ids already passed the offset
+        return
+
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # sqlite_sequence stores the last assigned id of each AUTOINCREMENT table
+            cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s',
+                           [start - 1, table, start - 1])
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                           'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                           [table, start - 1, table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(f'ALTER TABLE {connection.ops.quote_name(table)} AUTO_INCREMENT = {int(start)}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT setval(pg_get_serial_sequence(%s, %s), %s, false)',
+                           [table, model._meta.pk.column, start])
+        else:
+            logger.warning('cannot set the id offset of %s on %s', table, connection.vendor)
+
+
+def set_id_start_offsets(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver that applies the ID_START_OFFSET declared on the models of the app
+    """
+    for model in sender.get_models():
+        start = getattr(model, 'ID_START_OFFSET', None)
+        if start is not None:
+            set_id_start_offset(model, start, using)
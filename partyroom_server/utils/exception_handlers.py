@@ -17,6 +17,7 @@ def custom_exception_handler(exc, context):
     """    
     handlers = {
         'ValidationError': _handle_validation_error,
+        'Throttled': _handle_throttled,
     }
     response = exception_handler(exc, context)
     exception_class = exc.__class__.__name__
@@ -38,7 +39,7 @@ def get_error_code(field, detail, error_code_list: List):
         # TODO no hard code
         error_code_list.append(CREDENTIALS_INVALID_ERRORS)
     else:
-        logger.warning(f'Unknown error. {detail=}')  
+        logger.warning('Unknown error. detail=%r', detail)  
         
 def _handle_validation_error(exc, context, response):
     error_code_list = []
@@ -47,18 +48,26 @@ def _handle_validation_error(exc, context, response):
             # nested error
             for value in field[1].values():
                 for detail in value:
-                    logger.debug(f'{exc=} {context=}')
+                    logger.debug('validation error in %s: field=%s detail=%r', context.get('view'), field[0], detail)
                     get_error_code(field, detail, error_code_list)
 
         elif isinstance(field[1], list):            
             for detail in field[1]:  # list of ErrorDetails
-                logger.debug(f'{context=} {field=}  {detail[:]=}')
+                logger.debug('validation error in %s: field=%s detail=%r', context.get('view'), field[0], detail)
                 get_error_code(field, detail, error_code_list)
                 
         else:
-            logger.warning(f'Unknown field type {type(field[1])}')
+            logger.warning('Unknown field type %s', type(field[1]))
               
     response.data = {
         'error_code_list': error_code_list
     }
-    return response
\ No newline at end of file
+    return response
+
+
+def _handle_throttled(exc, context, response):
+    # the Retry-After header of the response is kept
+    response.data = {
+        'error_code_list': [REQUEST_THROTTLED_ERROR_CODE]
+    }
+    return response
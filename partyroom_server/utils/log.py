@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.config import ConvertingList
+from logging.handlers import QueueHandler, QueueListener
+
+# attributes of every LogRecord, the others are the extra fields of the call
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """one JSON object per record, with the extra fields of the call"""
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'function': record.funcName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+        return json.dumps(data, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """put the records in a queue, a thread passes them to the handlers
+
+    The request thread only formats the message. When the queue is full the
+    record is dropped instead of blocking the request.
+
+    Args:
+        handlers: the handlers of the listener, e.g. ['cfg://handlers.console']
+        queue_size: max number of records waiting in the queue
+    """
+    def __init__(self, handlers, queue_size: int = 10000, respect_handler_level: bool = True):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, *self.resolve_handlers(handlers),
+                                      respect_handler_level=respect_handler_level)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    @staticmethod
+    def resolve_handlers(handlers):
+        if not isinstance(handlers, ConvertingList):
+            return handlers
+        # indexing a ConvertingList resolves the cfg:// references
+        return [handlers[i] for i in range(len(handlers))]
+
+    def prepare(self, record):
+        # keep the traceback apart from the message for the JSON formatter
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """pass at most rate records of a message per period seconds
+
+    The records are grouped by logger and message template, so the calls
+    must use %-style arguments. The next record that passes has the number
+    of dropped records in its suppressed field.
+    """
+    def __init__(self, rate: int = 10, period: float = 60):
+        super().__init__()
+        self.rate = rate
+        self.period = period
+        self.lock = threading.Lock()
+        # (logger, message template) -> [window start, passed, suppressed]
+        self.windows = {}
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        current = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or current - window[0] >= self.period:
+                suppressed = window[2] if window is not None else 0
+                if len(self.windows) > 10000:
+                    # too many templates, e.g. messages built with f-strings
+                    self.windows.clear()
+                window = self.windows[key] = [current, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.rate:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
@@ -0,0 +1,167 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from rest_framework import serializers
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """cumulative bucket counts, the sum and the count of the observed values"""
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        total, counts = 0, []
+        for bucket, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            counts.append((str(bucket), total))
+        return counts
+
+
+class MetricsRegistry:
+    """histograms and counters of this process, by name and labels
+
+    Every process keeps its own metrics, the scraper adds them up.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # name -> (type, help)
+        self.descriptions: Dict[str, Tuple[str, str]] = {}
+        # name -> labels -> Histogram or count
+        self.values: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+
+    def describe(self, name: str, metric_type: str, help_text: str) -> None:
+        self.descriptions[name] = (metric_type, help_text)
+        self.values.setdefault(name, {})
+
+    def observe(self, name: str, value: float, buckets: Sequence[float], **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            histograms = self.values.setdefault(name, {})
+            if key not in histograms:
+                histograms[key] = Histogram(buckets)
+            histograms[key].observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counters = self.values.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + amount
+
+    def clear(self) -> None:
+        with self.lock:
+            for values in self.values.values():
+                values.clear()
+
+    def render(self) -> str:
+        """the metrics in the Prometheus text format"""
+        lines = []
+        with self.lock:
+            for name, values in self.values.items():
+                metric_type, help_text = self.descriptions.get(name, ('untyped', ''))
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in values.items():
+                    if isinstance(value, Histogram):
+                        for bucket, count in value.cumulative_counts():
+                            lines.append(f'{name}_bucket{format_labels((*labels, ("le", bucket)))} {count}')
+                        lines.append(f'{name}_sum{format_labels(labels)} {value.sum}')
+                        lines.append(f'{name}_count{format_labels(labels)} {value.count}')
+                    else:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+registry = MetricsRegistry()
+registry.describe('partyroom_request_duration_seconds', 'histogram', 'Wall time of the requests')
+registry.describe('partyroom_request_queries', 'histogram', 'Database queries per request')
+registry.describe('partyroom_request_db_duration_seconds', 'histogram', 'Database time per request')
+registry.describe('partyroom_request_serializer_duration_seconds', 'histogram', 'Serializer time per request')
+registry.describe('partyroom_response_bytes', 'histogram', 'Size of the response bodies')
+registry.describe('partyroom_query_budget_exceeded_total', 'counter', 'Requests with more queries than the budget')
+
+
+class RequestMetrics:
+    """the counters of the current request"""
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        # serializers accessed inside serializer.data are not counted twice
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """the execute_wrapper of the database connections"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+current_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('current_request_metrics', default=None)
+
+
+def timed_data(data_property):
+    def data(self):
+        metrics = current_request_metrics.get()
+        if metrics is None:
+            return data_property.fget(self)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return data_property.fget(self)
+        finally:
+            metrics.serializer_depth -= 1
+            if metrics.serializer_depth == 0:
+                metrics.serializer_time += time.perf_counter() - start
+    return property(data)
+
+
+@lru_cache(maxsize=None)
+def get_timed_serializer_class(serializer_class):
+    """a subclass of the serializer class whose serializer.data is timed, the many=True list included"""
+    attrs = {'__module__': serializer_class.__module__, '__doc__': serializer_class.__doc__,
+             'data': timed_data(serializer_class.data)}
+    if not issubclass(serializer_class, serializers.ListSerializer):
+        meta = getattr(serializer_class, 'Meta', object)
+        list_serializer_class = getattr(meta, 'list_serializer_class', serializers.ListSerializer)
+        attrs['Meta'] = type('Meta', (meta,),
+                             {'list_serializer_class': get_timed_serializer_class(list_serializer_class)})
+    return type(serializer_class.__name__, (serializer_class,), attrs)
+
+
+class SerializerMetricsMixin:
+    # time serializer.data of the serializers of get_serializer, the queries of lazy relations included,
+    # only for the views with the mixin, the serializers themselves are left untouched
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        # the schema generation and the requests outside the middleware see the serializer class
+        if current_request_metrics.get() is not None:
+            serializer_class = get_timed_serializer_class(serializer_class)
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
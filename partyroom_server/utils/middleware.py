@@ -0,0 +1,55 @@
+import time
+from contextlib import ExitStack
+from logging import getLogger
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import (BYTES_BUCKETS, QUERY_BUCKETS, TIME_BUCKETS, RequestMetrics,
+                      current_request_metrics, registry)
+
+logger = getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """record the wall time, queries, database time, serializer time and
+    response size of each request by view
+
+    The serializer time is recorded for the views with SerializerMetricsMixin.
+
+    A request with more queries than REQUEST_METRICS['QUERY_BUDGET'] is
+    logged, usually an N+1 query in a serializer.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unknown'
+        registry.observe('partyroom_request_duration_seconds', duration, TIME_BUCKETS,
+                         view=view, method=request.method, status=response.status_code)
+        registry.observe('partyroom_request_queries', metrics.queries, QUERY_BUCKETS, view=view)
+        registry.observe('partyroom_request_db_duration_seconds', metrics.db_time, TIME_BUCKETS, view=view)
+        registry.observe('partyroom_request_serializer_duration_seconds', metrics.serializer_time,
+                         TIME_BUCKETS, view=view)
+        if not response.streaming:
+            registry.observe('partyroom_response_bytes', len(response.content), BYTES_BUCKETS, view=view)
+
+        budget = settings.REQUEST_METRICS['QUERY_BUDGET']
+        if metrics.queries > budget:
+            registry.increment('partyroom_query_budget_exceeded_total', view=view)
+            logger.warning('%s %s ran %d queries, the budget is %d',
+                           request.method, request.path, metrics.queries, budget)
+        return response
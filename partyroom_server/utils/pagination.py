@@ -0,0 +1,118 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """forward pagination on a unique ordering, without COUNT(*) and OFFSET
+
+    The cursor holds the ordering values of the last item, the next page is
+    the items after it, e.g. (a, b) > (last_a, last_b). Requests with ?page=
+    are still served by page number pagination on the same ordering.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    # must end with a unique field
+    ordering = ('id',)
+    legacy_pagination_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.order_by(*self.ordering)
+        self.legacy_paginator = None
+        if self.legacy_pagination_class.page_query_param in request.query_params:
+            self.legacy_paginator = self.legacy_pagination_class()
+            return self.legacy_paginator.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(self.get_after_filter(cursor))
+            except (TypeError, ValueError, ValidationError):
+                # values of the wrong type
+                raise NotFound(self.invalid_cursor_message)
+
+        # one more item tells whether there is a next page
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_after_filter(self, cursor: List) -> Q:
+        """items after the cursor in the ordering"""
+        after, equal = Q(), {}
+        for field, value in zip(self.ordering, cursor):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return after
+
+    def decode_cursor(self, request) -> Optional[List]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, list) or len(cursor) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, item) -> str:
+        values = [getattr(item, field.lstrip('-')) for field in self.ordering]
+        # keep the microseconds, a truncated datetime would repeat or skip items
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if self.legacy_paginator is not None:
+            return self.legacy_paginator.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class PartyRoomKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class BookingKeysetPagination(KeysetPagination):
+    # bookings of the same start time in id order
+    ordering = ('start_time', 'id')
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    # latest reviews first
+    ordering = ('-updated_at', '-id')
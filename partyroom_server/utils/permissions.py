@@ -1,11 +1,7 @@
-from logging import getLogger
-
-from django.conf import settings
 from rest_framework import permissions
+from utils.safelist import get_safelist
 from utils.utils import check_write_review_permissions
 
-logger = getLogger('permissions')
-
 class IsBookedUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return check_write_review_permissions(request)
@@ -44,6 +40,11 @@ class IsBookingOwnerOrStaff(permissions.BasePermission):
         return request.user == obj.user or request.user.is_staff
 
 
+class IsPartyRoomOwnerOrStaff(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return request.user == obj.owner or request.user.is_staff
+
+
 class IsRoomerOrStaff(permissions.BasePermission):
     def has_permission(self, request, view):
         # permission check when create
@@ -51,13 +52,6 @@ class IsRoomerOrStaff(permissions.BasePermission):
 
 
 class SafelistPermission(permissions.BasePermission):
+    """allow the requests from the networks in settings.SAFE_IPS"""
     def has_permission(self, request, view):
-        remote_addr = request.META['REMOTE_ADDR']
-        for valid_ip in settings.SAFE_IPS:
-            if remote_addr == valid_ip or remote_addr.startswith(valid_ip):
-                logger.info(f'request from {remote_addr} is allowed')
-                return True
-        else:
-            logger.info(f'request from {remote_addr} is NOT allowed')
-
-        return False
+        return get_safelist().is_allowed(request)
@@ -0,0 +1,115 @@
+import ipaddress
+import threading
+from bisect import bisect_right
+from logging import getLogger
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = getLogger('permissions')
+
+
+class IPNetworkSet:
+    """set of ip networks, the lookup is a binary search over the merged address ranges
+    """
+    def __init__(self, networks: Iterable[str]):
+        parsed = {4: [], 6: []}
+        for network in networks:
+            try:
+                # a single address is a /32 or /128 network
+                network = ipaddress.ip_network(network.strip(), strict=False)
+            except ValueError:
+                raise ImproperlyConfigured(f'invalid ip address or network {network!r}')
+            parsed[network.version].append(network)
+
+        # version -> sorted (first address, last address) of the merged networks
+        self.ranges: Dict[int, Tuple[List[int], List[int]]] = {}
+        for version, version_networks in parsed.items():
+            collapsed = list(ipaddress.collapse_addresses(version_networks))
+            self.ranges[version] = ([int(network.network_address) for network in collapsed],
+                                    [int(network.broadcast_address) for network in collapsed])
+
+    def __contains__(self, address) -> bool:
+        if isinstance(address, str):
+            try:
+                address = ipaddress.ip_address(address)
+            except ValueError:
+                return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            # ::ffff:a.b.c.d from a dual stack socket
+            address = address.ipv4_mapped
+        starts, ends = self.ranges[address.version]
+        index = bisect_right(starts, int(address)) - 1
+        return index >= 0 and int(address) <= ends[index]
+
+
+class Safelist:
+    """the client ip check of SafelistPermission
+
+    The client ip is REMOTE_ADDR, or the address in X-Forwarded-For that comes
+    before the trusted proxies when the request is from a trusted proxy.
+    """
+    def __init__(self, safe_ips: Iterable[str], trusted_proxies: Iterable[str] = (), log_every: int = 1000):
+        self.safe_ips = IPNetworkSet(safe_ips)
+        self.trusted_proxies = IPNetworkSet(trusted_proxies)
+        self.log_every = log_every
+        self.lock = threading.Lock()
+        self.allowed = self.denied = 0
+
+    def get_client_ip(self, request) -> Optional[str]:
+        address = request.META.get('REMOTE_ADDR')
+        if address is None or address not in self.trusted_proxies:
+            return address
+        forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        # the right most address is added by the closest proxy
+        for forwarded in reversed([ip.strip() for ip in forwarded_for.split(',') if ip.strip()]):
+            if forwarded not in self.trusted_proxies:
+                return forwarded
+            address = forwarded
+        return address
+
+    def is_allowed(self, request) -> bool:
+        address = self.get_client_ip(request)
+        allowed = address is not None and address in self.safe_ips
+        self.record(address, allowed)
+        return allowed
+
+    def record(self, address: Optional[str], allowed: bool) -> None:
+        # a log line per request is too much, log a summary every log_every requests
+        with self.lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.denied += 1
+            total = self.allowed + self.denied
+            if total % self.log_every:
+                logger.debug('request from %s is %s', address, 'allowed' if allowed else 'NOT allowed')
+                return
+            allowed_count, denied_count = self.allowed, self.denied
+        logger.info('safelist allowed %d and denied %d requests, the last one from %s',
+                    allowed_count, denied_count, address)
+
+
+def create_safelist() -> Safelist:
+    return Safelist(settings.SAFE_IPS, settings.SAFE_IPS_TRUSTED_PROXIES, settings.SAFE_IPS_LOG_EVERY)
+
+
+_safelist: Optional[Safelist] = None
+
+
+@receiver(setting_changed)
+def reset_safelist(setting, **kwargs):
+    global _safelist
+    if setting.startswith('SAFE_IPS'):
+        _safelist = None
+
+
+def get_safelist() -> Safelist:
+    """the safelist of the settings, parsed on the first request"""
+    global _safelist
+    if _safelist is None:
+        _safelist = create_safelist()
+    return _safelist
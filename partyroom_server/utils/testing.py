@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from typing import Callable, List, Sequence
+
+from accounts.models import CustomUser
+from booking.models import Booking
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from main.models import PartyRoom
+from reviews.models import PartyRoomReview
+
+from utils.utils import utc8
+
+SEED_START_TIME = datetime(2020, 1, 1, 12, tzinfo=utc8)
+
+
+class QueryBudgetTestMixin:
+    """assert that an endpoint runs a fixed number of queries, whatever the number of items
+
+    The request is repeated after seeding more items each time, an N+1 query
+    shows up as a query count that grows with the items.
+    """
+    query_budget_sizes = (1, 5, 10)
+
+    def count_queries(self, request: Callable):
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        return [query['sql'] for query in context.captured_queries]
+
+    def assertQueryBudget(self, budget: int, request: Callable, seed: Callable[[int], None],
+                          sizes: Sequence[int] = None):
+        """
+        Args:
+            budget (int): max number of queries of a request
+            request (Callable): sends the request and returns the response
+            seed (Callable[[int], None]): creates the given number of more items
+            sizes (Sequence[int]): numbers of seeded items to request with
+        """
+        counts, seeded = {}, 0
+        for size in sizes or self.query_budget_sizes:
+            seed(size - seeded)
+            seeded = size
+            queries = self.count_queries(request)
+            counts[size] = len(queries)
+            self.assertLessEqual(len(queries), budget,
+                                 f'{len(queries)} queries with {size} items, the budget is {budget}:\n'
+                                 + '\n'.join(queries))
+        self.assertEqual(len(set(counts.values())), 1,
+                         f'the number of queries grows with the items: {counts}')
+
+
+def create_user(index: int, **kwargs) -> CustomUser:
+    return CustomUser.objects.create(username=f'seed_user_{index}',
+                                     password='some_password',
+                                     phone_number=f'+8529{index:07d}',
+                                     email=f'seed_user_{index}@test.com',
+                                     **{'is_verified': True, **kwargs})
+
+
+class Seeder:
+    """creates numbered partyrooms, bookings, reviews and favourites for the query budget tests"""
+    def __init__(self, owner: CustomUser = None):
+        self.users = 0
+        self.owner = owner or self.create_user(is_roomer=True)
+
+    def create_user(self, **kwargs) -> CustomUser:
+        self.users += 1
+        return create_user(self.users, **kwargs)
+
+    def partyrooms(self, count: int) -> List[PartyRoom]:
+        start = PartyRoom.objects.count()
+        return [PartyRoom.objects.create(owner=self.owner, name=f'seed_room_{start + i}')
+                for i in range(count)]
+
+    def bookings(self, user: CustomUser, count: int, partyrooms: List[PartyRoom] = None) -> List[Booking]:
+        partyrooms = partyrooms or self.partyrooms(1)
+        start = Booking.objects.filter(user=user).count()
+        return [Booking.objects.create(partyroom=partyrooms[i % len(partyrooms)],
+                                       user=user,
+                                       start_time=SEED_START_TIME + timedelta(hours=start + i),
+                                       end_time=SEED_START_TIME + timedelta(hours=start + i, minutes=30),
+                                       status='confirm',
+                                       unit_price=10,
+                                       total_price=10) for i in range(count)]
+
+    def reviews(self, partyroom: PartyRoom, count: int) -> List[PartyRoomReview]:
+        # one reviewer per review, like the api allows
+        reviews = []
+        for _ in range(count):
+            reviewer = self.create_user()
+            booking = self.bookings(reviewer, 1, [partyroom])[0]
+            reviews.append(PartyRoomReview.objects.create(partyroom=partyroom, reviewer=reviewer,
+                                                          booking=booking, rating=4, comments='good'))
+        return reviews
+
+    def favourites(self, user: CustomUser, count: int) -> List[PartyRoom]:
+        partyrooms = self.partyrooms(count)
+        user.favourites.add(*partyrooms)
+        return partyrooms
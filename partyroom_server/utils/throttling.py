@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.throttling import BaseThrottle
+
+from utils.metrics import registry
+from utils.safelist import get_safelist
+
+logger = getLogger('permissions')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+GENERATION_KEY = 'throttle:generation'
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """'<tokens>/<period>', e.g. '5/m' or '100/hour', as (tokens, seconds)"""
+    tokens, period = rate.split('/')
+    return int(tokens), PERIODS[period[0]]
+
+
+def take_token(bucket: Optional[Tuple[float, float]], capacity: int, period: int,
+               current_time: float) -> Tuple[Tuple[float, float], float]:
+    """take a token from a bucket of (tokens, updated at) that refills capacity tokens per period
+
+    Returns:
+        Tuple[Tuple[float, float], float]: the bucket after the request, the seconds
+            to wait for the next token, 0 when a token was taken
+    """
+    tokens, updated_at = bucket if bucket is not None else (capacity, current_time)
+    tokens = min(capacity, tokens + (current_time - updated_at) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, current_time), 0
+    return (tokens, current_time), (1 - tokens) * period / capacity
+
+
+class LocalBuckets:
+    """token buckets in the memory of the process, least recently used dropped first"""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    def take(self, key: str, capacity: int, period: int) -> float:
+        with self.lock:
+            self.buckets[key], wait = take_token(self.buckets.get(key), capacity, period, time.time())
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBuckets:
+    """token buckets in a Django cache shared by the workers
+
+    The bucket is read and written back without a lock, concurrent requests
+    of the same key may take the same token. The limits are not exact, but a
+    burst still runs out of tokens after a few requests. The keys carry a
+    generation number, clearing bumps it for all the workers.
+    """
+    def __init__(self, cache_name: str):
+        self.cache = caches[cache_name]
+
+    def take(self, key: str, capacity: int, period: int) -> float:
+        key = f'{self.cache.get_or_set(GENERATION_KEY, 0, None)}:{key}'
+        bucket, wait = take_token(self.cache.get(key), capacity, period, time.time())
+        # an untouched bucket is full again after a period
+        self.cache.set(key, bucket, period)
+        return wait
+
+    def clear(self) -> None:
+        # buckets of the old generation are left to expire
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.cache.set(GENERATION_KEY, 1, None)
+
+
+def create_buckets():
+    options = settings.RATE_LIMITS
+    if options.get('SHARED_CACHE'):
+        return CacheBuckets(options['SHARED_CACHE'])
+    return LocalBuckets(options['MAX_ENTRIES'])
+
+
+_buckets = None
+
+
+@receiver(setting_changed)
+def reset_buckets(setting, **kwargs):
+    global _buckets
+    if setting == 'RATE_LIMITS':
+        _buckets = None
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        _buckets = create_buckets()
+    return _buckets
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """limit the requests of a view by settings.RATE_LIMITS['RATES'][view.throttle_scope][kind]
+
+    A view without the scope or a scope without a rate of this kind is not
+    limited. The counters are kept out of the database.
+    """
+    kind = None
+
+    def get_ident(self, request, view) -> Optional[str]:
+        raise NotImplementedError('.get_ident() must be overridden')
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        scope = getattr(view, 'throttle_scope', None)
+        rate = settings.RATE_LIMITS['RATES'].get(scope, {}).get(self.kind)
+        if rate is None:
+            return True
+        ident = self.get_ident(request, view)
+        if ident is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        wait = get_buckets().take(f'throttle:{scope}:{self.kind}:{ident}', capacity, period)
+        if not wait:
+            return True
+        self.wait_time = wait
+        registry.increment('partyroom_throttled_requests_total', scope=scope, kind=self.kind)
+        logger.warning('throttled %s request by %s, rate %s', scope, self.kind, rate)
+        return False
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    """by client ip, behind the trusted proxies of the safelist"""
+    kind = 'ip'
+
+    def get_ident(self, request, view):
+        return get_safelist().get_client_ip(request)
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    """by authenticated user, anonymous requests are left to the ip throttle"""
+    kind = 'user'
+
+    def get_ident(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return str(request.user.pk)
+        return None
+
+
+class CredentialRateThrottle(TokenBucketThrottle):
+    """by the account named in the request body, e.g. the username of a login
+
+    view.throttle_credential is the dotted path of the field in request.data,
+    e.g. 'user.email'.
+    """
+    kind = 'credential'
+
+    def get_ident(self, request, view):
+        value = request.data
+        for field in view.throttle_credential.split('.'):
+            if not hasattr(value, 'get'):
+                return None
+            value = value.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return value.strip().lower()
+
+
+registry.describe('partyroom_throttled_requests_total', 'counter', 'Requests rejected by the rate limits')
@@ -21,7 +21,7 @@ def check_write_review_permissions(request):
         uid = request.data['partyroom_uid']
         partyroom = PartyRoom.objects.get(uid=uid)
     except PartyRoom.DoesNotExist:
-        logger.error(f"partyroom with {uid=} doesn't exist")
+        logger.error("partyroom with uid=%r doesn't exist", uid)
         return False
     except KeyError:
         logger.error('uid haven"t provided')
@@ -34,7 +34,7 @@ def check_write_review_permissions(request):
 
     if not bookings.exists():
         # User does not booked this room before
-        logger.info(f"user does not booked this room before")
+        logger.info("user does not booked this room before")
         return False
     else:
         latest_booking_id = bookings.first().id
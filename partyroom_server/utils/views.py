@@ -0,0 +1,36 @@
+from main.cache import get_catalogue_cache
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import registry
+from .permissions import SafelistPermission
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data
+        # errors of the permission checks
+        return '\n'.join(f'# {key}: {value}' for key, value in data.items()) + '\n'
+
+
+class MetricsView(APIView):
+    """the request metrics and the catalogue cache stats of this process, in the Prometheus text format"""
+    permission_classes = (IsAuthenticated, IsAdminUser, SafelistPermission)
+    renderer_classes = (PrometheusTextRenderer,)
+
+    def get(self, request, *args, **kwargs):
+        lines = [registry.render()]
+        for key, value in get_catalogue_cache().stats().items():
+            if key in ('size', 'max_entries'):
+                name, metric_type = f'partyroom_catalogue_cache_{key}', 'gauge'
+            else:
+                name, metric_type = f'partyroom_catalogue_cache_{key}_total', 'counter'
+            lines.append(f'# TYPE {name} {metric_type}\n{name} {value}\n')
+        return Response(''.join(lines))